@@ -11,13 +11,16 @@ Les requêtes sont effectuées de manière répartie sur un intervalle de 1 heur
 Détails :
 - Le script effectue une requête GET sur un URL Amazon pour récupérer les informations de l'offre principale, 
   et utilise des requêtes AJAX pour récupérer les offres supplémentaires.
-- À chaque itération, les nouvelles données sont ajoutées dans un fichier Parquet ('amazon_offers.parquet').
+- Les nouvelles offres sont ajoutées au dataset Parquet commun (offer_records.OFFERS_DATASET, partition pfid=AMAZ),
+  au schéma commun à toutes les plateformes (prix en centimes, horodatage epoch), tous les FLUSH_PRODUCTS ASINs
+  et en fin de cycle.
 - Les requêtes sont effectuées de manière aléatoire pour éviter le blocage, en utilisant un intervalle défini de temps entre chaque produit.
+- Les ASINs suivis, leurs idsmartphone et noms de téléphone viennent du registre produits (product_registry.tracked) ;
+  un ASIN partagé par plusieurs téléphones est scrapé une fois et ses offres sont enregistrées pour chacun.
 - Une fois que tous les produits de la liste sont scrappés, le script attend quelques minutes et recommence à l'infini.
 
 Variables :
-- EXCEL_FILE : Chemin vers le fichier Excel contenant les ASINs, ids, et noms des produits.
-- PARQUET_FILE : Nom du fichier Parquet où les offres seront enregistrées.
+- PARQUET_FILE : Ancien fichier Parquet des offres (historique, n'est plus alimenté).
 - SCRAPE_INTERVAL : Interval entre chaque cycle de scraping
 
 Auteur : Vanessa KENNICHE SANOCKA, Thomas FERNANDES
@@ -35,6 +38,12 @@ import os
 import time
 import re
 import math
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from offer_records import FLUSH_PRODUCTS, OfferBatchBuilder
+from offer_snapshot import save_offers
+from product_registry import get_registry
 
 BASE_URL_TEMPLATE = 'https://www.amazon.fr/dp/{asin}'
 MAIN_OFFER_URL_TEMPLATE = 'https://www.amazon.fr/gp/product/ajax/ref=dp_aod_ALL_mbc?asin={asin}&m=&qid=&smid=&sourcecustomerorglistid=&sourcecustomerorglistitemid=&sr=&pc=dp&experienceId=aodAjaxMain'
@@ -46,7 +55,6 @@ HEADERS = {
 }
 SCRAPE_INTERVAL = 1 * 60 * 60  # 1 heure en secondes
 MAX_RETRY = 5
-EXCEL_FILE = './../lien.xlsx'
 PARQUET_FILE = "amazon_offers.parquet"
 ZIP_FILE = "JSON_Amazon.zip"
 
@@ -62,8 +70,7 @@ def clean_text(text):
         return re.sub(r'\s+', ' ', text.strip())
     return 'N/A'
 
-def scrape_main_offer(asin, idsmartphone, phone_name):
-    offers = []
+def scrape_main_offer(asin, idsmartphone, phone_name, offers):
     main_offer_url = MAIN_OFFER_URL_TEMPLATE.format(asin=asin)
     logging.info(f"Scraping main offer for ASIN {asin}")
 
@@ -73,7 +80,7 @@ def scrape_main_offer(asin, idsmartphone, phone_name):
         response = session.get(main_offer_url, timeout=10)
     except Exception as e:
         logging.error(f"Erreur lors de la requête principale pour ASIN {asin} : {e}")
-        return offers
+        return
 
     logging.info(f"Main offer response status code: {response.status_code}")
 
@@ -121,31 +128,21 @@ def scrape_main_offer(asin, idsmartphone, phone_name):
 
         product_state = 'Neuf'
 
-        offer_details = {
-            'pfid': "AMAZ",
-            'idsmartphone': idsmartphone,
-            'url': BASE_URL_TEMPLATE.format(asin=asin),
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'Price': price_value,
-            'shipcost': pd.NA,
-            'seller': seller_name,
-            'rating': pd.NA,
-            'ratingnb': pd.NA,
-            'offertype': product_state,
-            'offerdetails': pd.NA,
-            'shipcountry': pd.NA,
-            'sellercountry': pd.NA,
-            'descriptsmartphone': phone_name
-        }
-        offers.append(offer_details)
+        offers.append(
+            idsmartphone=idsmartphone,
+            url=BASE_URL_TEMPLATE.format(asin=asin),
+            timestamp=datetime.now(),
+            price=price_value,
+            seller=seller_name,
+            offertype=product_state,
+            descriptsmartphone=phone_name
+        )
         logging.info("Main offer retrieved")
     else:
         logging.error(f"Error retrieving main offer for ASIN {asin}: {response.status_code}")
         logging.debug(f"Response content: {response.text}")
 
-    return offers
-
-def scrape_amazon_offers(asin, idsmartphone, phone_name, start_page=1, max_pages=20):
+def scrape_amazon_offers(asin, idsmartphone, phone_name, offers, start_page=1, max_pages=20):
     """
     Scrape les offres supplémentaires pour un produit Amazon.
 
@@ -153,13 +150,10 @@ def scrape_amazon_offers(asin, idsmartphone, phone_name, start_page=1, max_pages
     - asin (str): L'ASIN du produit.
     - idsmartphone (str): L'identifiant unique du smartphone.
     - phone_name (str): Le nom du smartphone.
+    - offers (OfferBatchBuilder): Le lot dans lequel les offres trouvées sont ajoutées.
     - start_page (int): La page de départ pour le scraping (par défaut 1).
     - max_pages (int): Le nombre maximum de pages à scraper (par défaut 20).
-
-    Returns:
-    - offers (list): Une liste de dictionnaires contenant les détails des offres.
     """
-    offers = []
     page = start_page
 
     while True:
@@ -261,23 +255,17 @@ def scrape_amazon_offers(asin, idsmartphone, phone_name, start_page=1, max_pages
                     ratingnb = pd.NA
                     logging.info(f"Vendeur '{seller_name}' contient 'amazon', donc ratingnb ignoré.")
 
-                offer_details = {
-                    'pfid': "AMAZ",
-                    'idsmartphone': idsmartphone,
-                    'url': BASE_URL_TEMPLATE.format(asin=asin),
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'Price': price_value,
-                    'shipcost': pd.NA,
-                    'seller': seller_name,
-                    'rating': seller_rating,
-                    'ratingnb': ratingnb,
-                    'offertype': product_state,
-                    'offerdetails': pd.NA,
-                    'shipcountry': pd.NA,
-                    'sellercountry': pd.NA,
-                    'descriptsmartphone': phone_name
-                }
-                offers.append(offer_details)
+                offers.append(
+                    idsmartphone=idsmartphone,
+                    url=BASE_URL_TEMPLATE.format(asin=asin),
+                    timestamp=datetime.now(),
+                    price=price_value,
+                    seller=seller_name,
+                    rating=seller_rating,
+                    ratingnb=ratingnb,
+                    offertype=product_state,
+                    descriptsmartphone=phone_name
+                )
                 logging.info("Other offers retrieved")
 
                 offers_on_page += 1
@@ -294,8 +282,6 @@ def scrape_amazon_offers(asin, idsmartphone, phone_name, start_page=1, max_pages
             logging.debug(f"Response content: {response.text}")
             break
 
-    return offers
-
 def extract_ratingnb(offer_block, seller_name):
     """
     Extrait le nombre d'évaluations du vendeur à partir du bloc d'offre.
@@ -327,69 +313,36 @@ def extract_ratingnb(offer_block, seller_name):
     logging.info(f"Aucun ratingnb trouvé pour vendeur {seller_name}.")
     return pd.NA
 
-def save_offers_to_parquet(offers, filename='AMAZON.parquet'):
-    if not offers:
-        logging.info("Aucune offre à enregistrer.")
-        return
-
-    df = pd.DataFrame(offers)
+def scrape_amazon_product(asin, idsmartphones, offers):
+    """
+    Ajoute au lot 'offers' les offres d'un ASIN (offre principale puis pages d'offres),
+    une fois pour chacun des téléphones suivis sur cette page.
+    """
+    registry = get_registry()
+    product_offers = OfferBatchBuilder("AMAZ")
+    scrape_main_offer(asin, idsmartphones[0], registry.name(idsmartphones[0]), product_offers)
+    time.sleep(1)
+    scrape_amazon_offers(asin, idsmartphones[0], registry.name(idsmartphones[0]), product_offers)
 
-    if 'ratingnb' in df.columns:
-        df['ratingnb'] = df['ratingnb'].astype('Int64')
-    if 'Price' in df.columns:
-        df['Price'] = pd.to_numeric(df['Price'], errors='coerce')
-    if 'rating' in df.columns:
-        df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+    logging.info(f"Total des offres collectées pour ASIN {asin}: {len(product_offers)}")
+    for idsmartphone in idsmartphones:
+        offers.extend(product_offers, idsmartphone=idsmartphone, descriptsmartphone=registry.name(idsmartphone))
 
+def flush_offers(offers):
+    """Enregistre les offres accumulées (un fichier et une publication de l'instantané par appel)."""
     try:
-        if os.path.isfile(filename):
-            existing_df = pd.read_parquet(filename, engine='pyarrow')
-            combined_df = pd.concat([existing_df, df], ignore_index=True)
-            combined_df.to_parquet(filename, engine='pyarrow', index=False)
-        else:
-            df.to_parquet(filename, engine='pyarrow', index=False)
-        logging.info(f"Les données ont été ajoutées au fichier Parquet '{filename}' avec succès.")
+        save_offers(offers)
     except Exception as e:
         logging.error(f"Erreur lors de la sauvegarde en Parquet : {e}")
 
-def scrape_amazon_product(asin, idsmartphone, phone_name):
-    main_offers = scrape_main_offer(asin, idsmartphone, phone_name)
-    time.sleep(1)
-    other_offers = scrape_amazon_offers(asin, idsmartphone, phone_name)
-
-    if main_offers is None:
-        main_offers = []
-        logging.warning(f"scrape_main_offer a retourné None pour ASIN {asin}.")
-    if other_offers is None:
-        other_offers = []
-        logging.warning(f"scrape_amazon_offers a retourné None pour ASIN {asin}.")
-
-    all_offers = main_offers + other_offers
-    logging.info(f"Total des offres collectées pour ASIN {asin}: {len(all_offers)}")
-
-    save_offers_to_parquet(all_offers, PARQUET_FILE)
-
 if __name__ == "__main__":
     while True:
         try:
             try:
-                excel_data = pd.read_excel(EXCEL_FILE, sheet_name='AMAZON', dtype={"idsmartphone": str})
-                
-                if 'Link_ID' in excel_data.columns:
-                    excel_data.rename(columns={'Link_ID': 'ASIN'}, inplace=True)
-                else:
-                    time.sleep(600)
-                    continue
-                
-                required_columns = {'ASIN', 'idsmartphone', 'Phone'}
-                if not required_columns.issubset(excel_data.columns):
-                    logging.error(f"Le fichier Excel doit contenir les colonnes suivantes : {required_columns}")
-                    time.sleep(600)
-                    continue
-                asins = excel_data[['ASIN', 'idsmartphone', 'Phone']].dropna().values.tolist()
-                logging.info(f"{len(asins)} ASINs chargés depuis le fichier Excel.")
+                asins = get_registry(reload=True).tracked("AMAZ")
+                logging.info(f"{len(asins)} ASINs chargés depuis le registre produits.")
             except Exception as e:
-                logging.error(f"Erreur lors de la lecture du fichier Excel: {e}")
+                logging.error(f"Erreur lors du chargement du registre produits: {e}")
                 asins = []
 
             if asins:
@@ -397,13 +350,17 @@ if __name__ == "__main__":
                 sleep_time = math.ceil(SCRAPE_INTERVAL / num_asins)
                 logging.info(f"Temps d'attente entre chaque ASIN: {sleep_time} secondes.")
 
-                for idx, (asin, idsmartphone, phone_name) in enumerate(asins):
-                    logging.info(f"Traitement de l'ASIN {asin} ({idx+1}/{num_asins}) avec l'ID {idsmartphone} et le téléphone {phone_name}")
-                    scrape_amazon_product(asin, idsmartphone, phone_name)
+                offers = OfferBatchBuilder("AMAZ")
+                for idx, (asin, _, idsmartphones) in enumerate(asins):
+                    logging.info(f"Traitement de l'ASIN {asin} ({idx+1}/{num_asins}) pour {', '.join(idsmartphones)}")
+                    scrape_amazon_product(asin, idsmartphones, offers)
+                    if (idx + 1) % FLUSH_PRODUCTS == 0:
+                        flush_offers(offers)
 
                     if idx < num_asins - 1:
                         logging.info(f"Attente de {sleep_time} secondes avant le prochain ASIN.")
                         time.sleep(sleep_time)
+                flush_offers(offers)
 
                 logging.info("Fin d'un cycle de scraping pour tous les ASINs. Recommence après une pause de 5 minutes.")
                 time.sleep(300)
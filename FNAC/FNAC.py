@@ -10,9 +10,12 @@ De plus, les fichiers JSON sont archivés dans un fichier ZIP pour garder une tr
 
 Détails :
 - Le script effectue une requête GET sur un URL FNAC et parse le contenu pour récupérer les informations du produit.
-- À chaque itération, les nouvelles données sont ajoutées dans un fichier Parquet ('fnac_offers.parquet').
+- Les nouvelles offres sont ajoutées au dataset Parquet commun (offer_records.OFFERS_DATASET, partition pfid=FNAC),
+  tous les FLUSH_PRODUCTS produits et en fin de cycle.
 - Les fichiers JSON générés sont archivés dans un fichier ZIP ('JSON_FNAC.zip').
 - Les requêtes sont effectuées de manière répartie sur un intervalle de 2 heures.
+- Les pages suivies et leurs idsmartphone viennent du registre produits (product_registry.tracked) ;
+  une page partagée par plusieurs téléphones est scrapée une fois et ses offres sont enregistrées pour chacun.
 - Le script parcourt tous les produits de la liste une fois, puis recommence la liste à l'infini pour chaque produit à nouveau.
 
 Auteur : Vanessa KENNICHE SANOCKA, Thomas FERNANDES
@@ -28,23 +31,22 @@ import requests
 import json
 import pandas as pd
 import os
+import sys
 import zipfile
 from datetime import datetime
 from bs4 import BeautifulSoup
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from offer_records import FLUSH_PRODUCTS, OfferBatchBuilder
+from offer_snapshot import save_offers
+from product_registry import get_registry
+
 # CONSTANTS
-EXCEL_FILE = './../lien.xlsx'
-PARQUET_FILE = "FNAC.parquet"
+PARQUET_FILE = "FNAC.parquet"  # Ancien fichier des offres (historique, n'est plus alimenté)
 ZIP_FILE = "JSON_FNAC.zip"
 SCRAPE_INTERVAL = 2 * 60 * 60  # 2 heures en secondes
 MAX_RETRY = 5
 
-# Charger les données depuis le fichier Excel
-excel_data = pd.read_excel(EXCEL_FILE, sheet_name="FNAC", dtype={"idsmartphone": str})
-links = excel_data["Link"].tolist()
-phones = excel_data["Phone"].tolist()
-idsmartphones = excel_data["idsmartphone"].tolist()
-
 # Liste de User-Agents, pour éviter le blocage
 user_agents = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36",
@@ -59,7 +61,7 @@ logging.basicConfig(
 )
 
 # FUNCTIONS
-def scrape_fnac_product_info(url, phone_name, idsmartphone):
+def scrape_fnac_product_info(url, idsmartphones, offers):
     retry_count = 0
     while retry_count < MAX_RETRY:
         try:
@@ -107,7 +109,10 @@ def scrape_fnac_product_info(url, phone_name, idsmartphone):
                     # Extraire ratingnb depuis le HTML
                     seller_ratings = extract_seller_ratings(soup)
 
-                    convert_offers_to_parquet(json_data, timestamp, phone_name, idsmartphone, url, user_rating, seller_ratings)
+                    registry = get_registry()
+                    for idsmartphone in idsmartphones:
+                        offers.extend(build_offers_batch(json_data, timestamp, registry.name(idsmartphone), idsmartphone,
+                                                         url, user_rating, seller_ratings))
                 else:
                     logging.error("Le script avec id 'digitalData' n'a pas été trouvé.")
                 break  # Sort de la boucle si la requête est un succès
@@ -168,65 +173,49 @@ def normalize_string(s):
     """
     return ''.join(s.lower().split())
 
-def convert_offers_to_parquet(json_data, timestamp, phone_name, idsmartphone, page_url, user_rating, seller_ratings):
+def build_offers_batch(json_data, timestamp, phone_name, idsmartphone, page_url, user_rating, seller_ratings):
+    """
+    Construit le lot des offres (OfferBatchBuilder) à partir du JSON 'digitalData' d'une page produit.
+    Le lot est vide si la page ne contient aucune offre.
+    Cette fonction n'écrit rien sur disque : elle est partagée entre le scraping et le retraitement de l'archive ZIP.
+    """
+    product_data = json_data['product'][0]
+    offers = product_data['attributes'].get('offer', [])
+
+    offers_batch = OfferBatchBuilder("FNAC")
+    for offer in offers:
+        # Extraction des données disponibles
+        shipcost = offer['price'].get('shipping', 0.0)
+        # Assurer que shipcost est numérique
+        if not isinstance(shipcost, (int, float)):
+            try:
+                shipcost = float(shipcost)
+            except ValueError:
+                shipcost = 0.0  # Valeur par défaut si conversion échoue
+
+        seller_name = offer.get('seller', 'N/A')
+        normalized_seller_name = normalize_string(seller_name)
+
+        offers_batch.append(
+            idsmartphone=idsmartphone,  # idsmartphone du registre produits
+            url=page_url,
+            timestamp=timestamp,
+            price=offer['price'].get('basePrice'),
+            shipcost=shipcost,
+            seller=seller_name,
+            rating=user_rating,
+            ratingnb=seller_ratings.get(normalized_seller_name),  # Nombre d'avis extrait du HTML
+            offertype=offer.get('condition'),
+            sellercountry=offer.get('sellerLocation'),
+            descriptsmartphone=phone_name
+        )
+
+    return offers_batch
+
+def flush_offers(offers):
+    """Enregistre les offres accumulées (un fichier et une publication de l'instantané par appel)."""
     try:
-        product_data = json_data['product'][0]
-        offers = product_data['attributes'].get('offer', [])
-        
-        offers_list = []
-        for offer in offers:
-            # Extraction des données disponibles
-            shipcost = offer['price'].get('shipping', 0.0)
-            # Assurer que shipcost est numérique
-            if not isinstance(shipcost, (int, float)):
-                try:
-                    shipcost = float(shipcost)
-                except ValueError:
-                    shipcost = 0.0  # Valeur par défaut si conversion échoue
-
-            seller_name = offer.get('seller', 'N/A')
-            normalized_seller_name = normalize_string(seller_name)
-            rating_nb = seller_ratings.get(normalized_seller_name, pd.NA)
-            
-            offer_details = {
-                "pfid": "FNAC",
-                "idsmartphone": idsmartphone,  # Utilisation de 'idsmartphone' depuis Excel
-                "url": page_url,
-                "timestamp": timestamp,
-                "Price": offer['price'].get('basePrice', pd.NA),
-                "shipcost": shipcost,
-                "seller": seller_name,
-                "rating": user_rating,
-                "ratingnb": rating_nb,  # Nombre d'avis extrait du HTML
-                "offertype": offer.get('condition', pd.NA),
-                "offerdetails": pd.NA,  # Laisser vide pour le moment
-                "shipcountry": pd.NA,    # Laisser vide pour le moment
-                "sellercountry": offer.get('sellerLocation', pd.NA),
-                "descriptsmartphone": phone_name
-            }
-            offers_list.append(offer_details)
-
-        if offers_list:
-            offers_df = pd.DataFrame(offers_list)
-            
-            # Convertir les colonnes en types appropriés
-            if 'ratingnb' in offers_df.columns:
-                offers_df['ratingnb'] = offers_df['ratingnb'].astype('Int64')  # Nullable integer
-
-            # Vérifier si le fichier Parquet existe déjà
-            if os.path.isfile(PARQUET_FILE):
-                # Charger le fichier existant
-                existing_df = pd.read_parquet(PARQUET_FILE, engine='pyarrow')
-                # Concatenation des DataFrames
-                combined_df = pd.concat([existing_df, offers_df], ignore_index=True)
-                # Écrire le DataFrame combiné dans le fichier Parquet
-                combined_df.to_parquet(PARQUET_FILE, engine='pyarrow', index=False)
-            else:
-                # Écrire directement le DataFrame dans un nouveau fichier Parquet
-                offers_df.to_parquet(PARQUET_FILE, engine='pyarrow', index=False)
-            
-            logging.info(f"Les données ont été ajoutées au fichier Parquet '{PARQUET_FILE}' avec succès.")
-    
+        save_offers(offers)
     except Exception as e:
         logging.error(f"Erreur lors de la conversion en Parquet : {e}")
 
@@ -234,19 +223,26 @@ def convert_offers_to_parquet(json_data, timestamp, phone_name, idsmartphone, pa
 if __name__ == "__main__":
     while True:
         try:
-            num_links = len(links)
+            # Pages produit 'a<numéro>' seulement : les liens de recherche de ID_EXCEL.xlsx n'ont pas de digitalData produit
+            pages = [(url, idsmartphones) for key, url, idsmartphones in get_registry(reload=True).tracked("FNAC")
+                     if key.isdigit()]
+            num_links = len(pages)
             if num_links == 0:
-                logging.warning("Aucun lien trouvé dans le fichier Excel. Attente de 2 heures avant de réessayer.")
+                logging.warning("Aucun lien FNAC dans le registre produits. Attente de 2 heures avant de réessayer.")
                 time.sleep(SCRAPE_INTERVAL)
                 continue
 
             # Calculer l'intervalle entre chaque requête pour répartir uniformément sur 2 heures
             interval_between_requests = SCRAPE_INTERVAL / num_links
             
-            for i, link in enumerate(links):
-                scrape_fnac_product_info(link, phones[i], idsmartphones[i])
+            offers = OfferBatchBuilder("FNAC")
+            for i, (link, idsmartphones) in enumerate(pages):
+                scrape_fnac_product_info(link, idsmartphones, offers)
+                if (i + 1) % FLUSH_PRODUCTS == 0:
+                    flush_offers(offers)
                 logging.info(f"Attente de {interval_between_requests:.2f} secondes avant la prochaine requête...")
                 time.sleep(interval_between_requests)
+            flush_offers(offers)
 
             logging.info(f"Cycle complet terminé, reprise dans {SCRAPE_INTERVAL} secondes...")
         except Exception as e:
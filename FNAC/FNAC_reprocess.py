@@ -0,0 +1,314 @@
+"""
+Retraitement de l'historique FNAC depuis l'archive JSON
+-------------------------------------------------------
+
+Ce script reconstruit les offres FNAC du dataset commun (offer_records.OFFERS_DATASET, partition pfid=FNAC)
+à partir de tous les fichiers 'digitalData' archivés dans 'JSON_FNAC.zip', en appliquant la logique de conversion
+actuelle de FNAC.py (build_offers_batch, schéma commun de offer_records). Il permet de régénérer l'historique après
+une modification de la conversion (nouvelles colonnes, corrections de bugs).
+
+Détails :
+- Les membres de l'archive sont lus en flux, sans extraction sur disque.
+- Si le répertoire central du ZIP est absent (archive tronquée pendant une écriture), les membres
+  sont relus directement à partir de leurs en-têtes locaux.
+- Les JSON sont répartis sur un pool de processus (un par cœur par défaut), avec un nombre borné
+  de tâches en vol pour garder une mémoire constante.
+- FNAC.py archive chaque page avant d'en enregistrer les offres : l'archive couvre l'historique FNAC entre
+  le premier et le dernier membre lus. Le résultat est écrit sous des noms ignorés par les lecteurs ('_reprocess-*'),
+  puis renommé en 'reprocess-*.parquet'. Dans les fichiers de la partition présents au démarrage (offres du scraper,
+  retraitement précédent), seules les offres de cette période sont remplacées ; les autres sont conservées.
+  Dans l'ancien fichier FNAC.parquet, seules les offres de cette période ne sont plus relues par scan_offers
+  (période enregistrée dans LEGACY_SUPERSEDED).
+- Si l'archive est incomplète (répertoire central absent, lecture des en-têtes locaux arrêtée avant la fin),
+  rien n'est remplacé : le retraitement est abandonné.
+  Sinon l'instantané partagé des offres (offer_snapshot) est republié.
+- Une page suivie pour plusieurs téléphones (même identifiant FNAC dans les fichiers) donne des offres pour chacun,
+  comme au scraping.
+- Le nombre d'avis vendeur (ratingnb) provient du HTML, qui n'est pas archivé : il est repris des offres remplacées
+  de même horodatage et vendeur, et reste vide sinon.
+
+Utilisation :
+    python FNAC_reprocess.py [archive.zip] [dossier_dataset] [nb_processus]
+
+"""
+
+import glob
+import json
+import logging
+import os
+import re
+import struct
+import sys
+import time
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from FNAC import ZIP_FILE, build_offers_batch, normalize_string
+from offer_records import OFFERS_DATASET, TIMESTAMP_FORMATS, partition_dir, to_epoch, write_legacy_superseded
+from offer_snapshot import publish_snapshot
+from product_registry import get_registry
+
+# CONSTANTS
+PFID = "FNAC"
+STAGING_PREFIX = "_reprocess-"  # Fichiers en cours d'écriture, ignorés par les lecteurs du dataset
+BATCH_ROWS = 50_000  # Nombre de lignes accumulées avant écriture d'un fragment Parquet
+MAX_IN_FLIGHT_PER_WORKER = 4
+MEMBER_NAME_PATTERN = re.compile(r"fnac_digitalData_(\d{8}_\d{6})\.json$")
+
+LOCAL_HEADER_SIGNATURE = 0x04034b50
+LOCAL_HEADER_FORMAT = "<IHHHHHIIIHH"
+LOCAL_HEADER_SIZE = struct.calcsize(LOCAL_HEADER_FORMAT)
+
+# Table de correspondance productID FNAC -> [(Phone, idsmartphone, Link), ...], initialisée dans chaque processus
+_product_lookup = {}
+# Nombre d'avis vendeur des offres remplacées : epoch -> {vendeur normalisé: ratingnb}
+_known_ratings = {}
+
+# FUNCTIONS
+def build_product_lookup(registry):
+    """
+    Associe l'identifiant produit FNAC (ex : '19813597' pour 'a19813597') aux téléphones suivis sur cette page :
+    nom du téléphone, idsmartphone et lien suivi, à partir du registre produits.
+    """
+    lookup = {}
+    for idsmartphone, key, url in registry.products("FNAC"):
+        lookup.setdefault(key, []).append((registry.name(idsmartphone), idsmartphone, url))
+    return lookup
+
+def known_seller_ratings(files):
+    """Nombre d'avis vendeur (lu dans le HTML au scraping) des offres des fichiers 'files', par horodatage et vendeur."""
+    ratings = {}
+    if not files:
+        return ratings
+    table = ds.dataset(files, format="parquet").to_table(
+        columns=["timestamp", "seller", "ratingnb"], filter=pc.field("ratingnb").is_valid()
+    )
+    for timestamp, seller, ratingnb in zip(*(table[name].to_pylist() for name in table.column_names)):
+        if seller is not None:
+            ratings.setdefault(timestamp, {})[normalize_string(seller)] = ratingnb
+    return ratings
+
+def init_worker(product_lookup, known_ratings):
+    global _product_lookup, _known_ratings
+    _product_lookup = product_lookup
+    _known_ratings = known_ratings
+
+def iter_archive_members(zip_path, status=None):
+    """
+    Génère (nom, contenu) pour chaque fichier JSON de l'archive, sans rien extraire sur disque.
+    status["complete"] passe à False si le répertoire central est absent : les membres sont alors relus
+    à partir des en-têtes locaux, sans garantie d'avoir lu toute l'archive.
+    """
+    status = {} if status is None else status
+    status["complete"] = True
+    try:
+        with zipfile.ZipFile(zip_path) as zipf:
+            for info in zipf.infolist():
+                if info.filename.endswith(".json"):
+                    yield info.filename, zipf.read(info)
+    except zipfile.BadZipFile:
+        logging.warning(f"Répertoire central introuvable dans '{zip_path}', lecture des en-têtes locaux.")
+        status["complete"] = False
+        yield from iter_local_headers(zip_path)
+
+def iter_local_headers(zip_path):
+    """
+    Relit une archive ZIP membre par membre à partir des en-têtes locaux.
+    S'arrête proprement sur le premier membre incomplet (fin de fichier tronquée).
+    """
+    with open(zip_path, "rb") as f:
+        while True:
+            header = f.read(LOCAL_HEADER_SIZE)
+            if len(header) < LOCAL_HEADER_SIZE:
+                return
+            (signature, _, flags, method, _, _, _, compressed_size, _,
+             name_length, extra_length) = struct.unpack(LOCAL_HEADER_FORMAT, header)
+            if signature != LOCAL_HEADER_SIGNATURE:
+                return
+            if flags & 0x08:
+                # Taille inconnue dans l'en-tête local (data descriptor) : impossible de continuer sans répertoire central
+                logging.warning("Membre avec data descriptor rencontré, arrêt de la lecture des en-têtes locaux.")
+                return
+            filename = f.read(name_length).decode("utf-8", errors="replace")
+            f.seek(extra_length, os.SEEK_CUR)
+            payload = f.read(compressed_size)
+            if len(payload) < compressed_size:
+                logging.warning(f"Membre '{filename}' tronqué, fin de la lecture de l'archive.")
+                return
+            if method == zipfile.ZIP_DEFLATED:
+                payload = zlib.decompress(payload, -15)
+            elif method != zipfile.ZIP_STORED:
+                logging.warning(f"Méthode de compression {method} non gérée pour '{filename}', membre ignoré.")
+                continue
+            if filename.endswith(".json"):
+                yield filename, payload
+
+def process_member(filename, payload):
+    """
+    Convertit un fichier JSON archivé en table Arrow avec la logique de conversion actuelle.
+    Retourne (nom, table ou None, message d'erreur ou None).
+    """
+    try:
+        match = MEMBER_NAME_PATTERN.search(filename)
+        if not match:
+            return filename, None, "nom de fichier sans horodatage"
+        timestamp = match.group(1)
+
+        json_data = json.loads(payload)
+        product_data = json_data["product"][0]
+        product_id = str(product_data.get("productInfo", {}).get("productID", ""))
+        user_rating = product_data.get("attributes", {}).get("userRating", pd.NA)
+        seller_ratings = _known_ratings.get(to_epoch(timestamp, TIMESTAMP_FORMATS[PFID]), {})
+
+        batches = []
+        for phone_name, idsmartphone, page_url in _product_lookup.get(product_id, [(pd.NA, pd.NA, pd.NA)]):
+            if pd.isna(page_url):
+                page_url = product_data.get("productInfo", {}).get("productURL", pd.NA)
+            offers_batch = build_offers_batch(json_data, timestamp, phone_name, idsmartphone, page_url, user_rating, seller_ratings)
+            if len(offers_batch):
+                batches.append(offers_batch.to_record_batch())
+        if not batches:
+            return filename, None, None
+        return filename, pa.Table.from_batches(batches), None
+    except Exception as e:
+        return filename, None, str(e)
+
+def write_batch(tables, dataset_dir, batch_index):
+    table = pa.concat_tables(tables, promote_options="default")
+    pq.write_to_dataset(
+        table,
+        root_path=dataset_dir,
+        partition_cols=["pfid"],
+        basename_template=f"{STAGING_PREFIX}{batch_index:05d}-{{i}}.parquet",
+    )
+    return table.num_rows
+
+def partition_files(dataset_dir):
+    """Fichiers visibles de la partition FNAC (hors migration des CSV historiques)."""
+    return sorted(
+        path for path in glob.glob(os.path.join(partition_dir(PFID, dataset_dir), "*.parquet"))
+        if not os.path.basename(path).startswith(("_", ".", "legacy-"))
+    )
+
+def staged_files(dataset_dir):
+    return sorted(glob.glob(os.path.join(partition_dir(PFID, dataset_dir), f"{STAGING_PREFIX}*.parquet")))
+
+def outside_period(files, start, end):
+    """Offres des fichiers 'files' hors de la période [start, end] (epoch) couverte par l'archive."""
+    timestamp = pc.field("timestamp")
+    return ds.dataset(files, format="parquet").to_table(
+        filter=timestamp.is_null() | (timestamp < start) | (timestamp > end)
+    )
+
+def replace_partition(replaced, dataset_dir, start, end):
+    """
+    Rend visibles les fichiers retraités et remplace, dans les fichiers 'replaced' et l'ancien FNAC.parquet,
+    les offres de la période [start, end] (epoch) couverte par l'archive.
+    """
+    if replaced:
+        kept = outside_period(replaced, start, end)
+        if kept.num_rows:
+            pq.write_table(kept, os.path.join(partition_dir(PFID, dataset_dir), f"{STAGING_PREFIX}kept.parquet"))
+    run = time.time_ns()
+    for path in staged_files(dataset_dir):
+        name = os.path.basename(path)[len(STAGING_PREFIX):]
+        os.replace(path, os.path.join(os.path.dirname(path), f"reprocess-{run}-{name}"))
+    for path in replaced:
+        os.remove(path)
+    write_legacy_superseded(PFID, start, end, dataset_dir)
+
+def reprocess_archive(zip_path=ZIP_FILE, dataset_dir=OFFERS_DATASET, max_workers=None):
+    """
+    Reconstruit la partition FNAC du dataset commun à partir de l'archive JSON.
+    Retourne un dictionnaire de statistiques (membres lus, lignes écrites, erreurs, durée).
+    """
+    start_time = time.time()
+    max_workers = max_workers or os.cpu_count() or 1
+    product_lookup = build_product_lookup(get_registry())
+
+    for path in staged_files(dataset_dir):  # Restes d'un retraitement interrompu
+        os.remove(path)
+    replaced = partition_files(dataset_dir)
+    known_ratings = known_seller_ratings(replaced)
+
+    stats = {"members": 0, "rows": 0, "errors": 0, "empty": 0, "aborted": False}
+    archive_status = {}
+    period = []  # Horodatages (epoch) des membres lus
+    pending_tables, pending_rows, batch_index = [], 0, 0
+    max_in_flight = max_workers * MAX_IN_FLIGHT_PER_WORKER
+
+    def collect(done):
+        nonlocal pending_rows
+        for future in done:
+            filename, table, error = future.result()
+            stats["members"] += 1
+            if error:
+                stats["errors"] += 1
+                logging.error(f"Erreur lors du retraitement de '{filename}' : {error}")
+            elif table is None:
+                stats["empty"] += 1
+            else:
+                pending_tables.append(table)
+                pending_rows += table.num_rows
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(product_lookup, known_ratings)) as executor:
+        in_flight = set()
+        for filename, payload in iter_archive_members(zip_path, archive_status):
+            match = MEMBER_NAME_PATTERN.search(filename)
+            epoch = to_epoch(match.group(1), TIMESTAMP_FORMATS[PFID]) if match else None
+            if epoch is not None:
+                period = [min(period[0], epoch), max(period[1], epoch)] if period else [epoch, epoch]
+            in_flight.add(executor.submit(process_member, filename, payload))
+            if len(in_flight) >= max_in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            if pending_rows >= BATCH_ROWS:
+                stats["rows"] += write_batch(pending_tables, dataset_dir, batch_index)
+                pending_tables, pending_rows, batch_index = [], 0, batch_index + 1
+
+        done, _ = wait(in_flight)
+        collect(done)
+
+    if pending_tables:
+        stats["rows"] += write_batch(pending_tables, dataset_dir, batch_index)
+
+    if not archive_status["complete"] or not period:
+        # Une archive incomplète ne couvre pas toute sa période : les offres existantes sont gardées
+        for path in staged_files(dataset_dir):
+            os.remove(path)
+        for directory in (partition_dir(PFID, dataset_dir), dataset_dir):  # Créés pour les fichiers retirés
+            if os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+        stats["aborted"] = True
+        stats["duration"] = time.time() - start_time
+        logging.error(f"Archive '{zip_path}' incomplète ou vide : retraitement abandonné, aucune offre remplacée.")
+        return stats
+
+    replace_partition(replaced, dataset_dir, *period)
+    if dataset_dir == OFFERS_DATASET:
+        publish_snapshot(dataset_dir)
+
+    stats["duration"] = time.time() - start_time
+    logging.info(
+        f"Retraitement terminé : {stats['members']} fichiers JSON, {stats['rows']} offres écrites dans '{dataset_dir}' "
+        f"({len(replaced)} fichiers remplacés), "
+        f"{stats['errors']} erreurs, {stats['empty']} pages sans offre, en {stats['duration']:.2f}s avec {max_workers} processus."
+    )
+    return stats
+
+# MAIN
+if __name__ == "__main__":
+    zip_path = sys.argv[1] if len(sys.argv) > 1 else ZIP_FILE
+    dataset_dir = sys.argv[2] if len(sys.argv) > 2 else OFFERS_DATASET
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    result = reprocess_archive(zip_path, dataset_dir, workers)
+    print(f"{result['members']} fichiers traités, {result['rows']} offres écrites, "
+          f"{result['errors']} erreurs en {result['duration']:.2f}s"
+          f"{' (abandonné : archive incomplète)' if result['aborted'] else ''}.")
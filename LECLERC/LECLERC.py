@@ -1,12 +1,31 @@
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
 from webdriver_manager.chrome import ChromeDriverManager
+import os
+import re
+import sys
 import time
+import statistics
+from functools import partial
 from bs4 import BeautifulSoup
 import csv
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from browser_pool import DriverPool
+from browser_setup import configure_options, enable_resource_blocking
+from browser_waits import wait_until_ready, wait_stats_summary
+from snapshot_store import snapshot_page
+
+# Réutiliser un seul navigateur pour toute la liste d'URLs (False : un navigateur par URL, ancien comportement)
+REUSE_DRIVER = True
+# Écrire le HTML de la dernière page dans un fichier (débogage uniquement ;
+# toutes les pages sont de toute façon archivées dans snapshot_store)
+SAVE_HTML_SNAPSHOT = False
+HTML_SNAPSHOT_FILE = "page_content.html"
+
 HTML_SELECTORS = {
     "Product Name": ".product-content-title.clamp.clamp-2",
     "Price": ".price-unit.ng-star-inserted",
@@ -18,22 +37,41 @@ HTML_SELECTORS = {
     "Product State": "p[class^='mb-0 state-text fw-500 ng-tns-c183-']",
 }
 
-def fetch_html(url, html="page_content.html"):
+def create_driver(driver_path):
     options = Options()
     options.add_argument('--headless')
     options.add_argument('--disable-gpu')
     options.add_argument('--no-sandbox')
+    configure_options(options, "leclerc")
 
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+    driver = webdriver.Chrome(service=Service(driver_path), options=options)
     driver.set_window_size(1920, 1080)
-    driver.get(url)
-    time.sleep(5)
-    html_content = driver.page_source
-    with open(html, 'w', encoding='utf-8') as file:
-        file.write(html_content)
-    print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Contenu HTML sauvegardé pour l'URL: {url}")
-
-    driver.quit()
+    enable_resource_blocking(driver, "leclerc")
+    return driver
+
+def fetch_html(url, driver=None, driver_path=None, html=None):
+    """
+    Charge l'URL et retourne le HTML de la page, en mémoire.
+    Si aucun driver n'est fourni, un navigateur est lancé puis fermé pour cette seule URL.
+    Le HTML n'est écrit sur disque que si un chemin 'html' est fourni.
+    """
+    own_driver = driver is None
+    if own_driver:
+        driver = create_driver(driver_path or ChromeDriverManager().install())
+
+    try:
+        driver.get(url)
+        wait_until_ready(driver, (By.CSS_SELECTOR, HTML_SELECTORS["Price"]), timeout=15, fallback=5, label="leclerc_fetch_html")
+        html_content = driver.page_source
+    finally:
+        if own_driver:
+            driver.quit()
+
+    if html:
+        with open(html, 'w', encoding='utf-8') as file:
+            file.write(html_content)
+        print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Contenu HTML sauvegardé pour l'URL: {url}")
+
     return html_content
 
 def get_sellers(soup):
@@ -125,7 +163,7 @@ def write_to_csv(products):
         writer.writerow(["------------------------------------------------------------------------------------------------------------------------------------"])
     print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Détails des produits écrits dans le CSV.")
 
-def main():
+def main(pool=None, driver_path=None):
     urls = [
         "https://www.e.leclerc/of/apple-iphone-16-15-5-cm-6-1-double-sim-ios-18-5g-usb-type-c-512-go-noir-0195949823763",
         "https://www.e.leclerc/of/apple-iphone-16-15-5-cm-6-1-double-sim-ios-18-5g-usb-type-c-256-go-noir-0195949822865",
@@ -141,29 +179,56 @@ def main():
         "https://www.e.leclerc/of/smartphone-apple-iphone-14-256go-noir-midnight-0194253409908"
     ]
 
+    snapshot = HTML_SNAPSHOT_FILE if SAVE_HTML_SNAPSHOT else None
+    latencies = []
+
     for url in urls:
         print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Traitement de l'URL: {url}")
 
-        fetch_html(url)
-        filepath = "page_content.html"
+        start_time = time.perf_counter()
+        if pool:
+            with pool.driver() as driver:
+                html_content = fetch_html(url, driver=driver, html=snapshot)
+        else:
+            html_content = fetch_html(url, driver_path=driver_path, html=snapshot)
+        latencies.append(time.perf_counter() - start_time)
+        ean = re.search(r"(\d{13})", url)
+        snapshot_page("leclerc", ean.group(1) if ean else url, html_content)
 
-        with open(filepath, 'r', encoding='utf-8') as file:
-            html_content = file.read()
         soup = BeautifulSoup(html_content, 'html.parser')
 
         products = extract_info(soup)
         write_to_csv(products)
 
+    report_latencies(latencies, "navigateur partagé" if pool else "un navigateur par URL")
+    for line in wait_stats_summary():
+        print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] {line}")
+
+def report_latencies(latencies, mode):
+    if not latencies:
+        return
+    print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Latence par URL ({mode}) : "
+          f"moyenne {statistics.mean(latencies):.2f}s, médiane {statistics.median(latencies):.2f}s, "
+          f"max {max(latencies):.2f}s sur {len(latencies)} URLs.")
+
 def run_indefinitely(cycle_interval=600):
-    while True:
-        try:
-            print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Début d'un nouveau cycle.")
-            main()
-            print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Cycle terminé. En attente de {cycle_interval/60} minutes.")
-        except Exception as e:
-            print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Une erreur est survenue: {e}")
-        
-        time.sleep(cycle_interval)
+    # Résolution unique du binaire chromedriver pour toute la durée du script
+    driver_path = ChromeDriverManager().install()
+    pool = DriverPool(partial(create_driver, driver_path), size=1) if REUSE_DRIVER else None
+
+    try:
+        while True:
+            try:
+                print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Début d'un nouveau cycle.")
+                main(pool, driver_path)
+                print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Cycle terminé. En attente de {cycle_interval/60} minutes.")
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%d/%m/%Y %H:%M:%S')}] Une erreur est survenue: {e}")
+
+            time.sleep(cycle_interval)
+    finally:
+        if pool:
+            pool.close()
 
 if __name__ == "__main__":
     run_indefinitely()
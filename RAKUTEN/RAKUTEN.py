@@ -10,15 +10,15 @@ puis extrait et enregistre les données dans un fichier Parquet. Les requêtes s
 uniformément dans un intervalle défini.
 
 Fonctionnalités :
-- Charge un fichier Excel contenant des identifiants et des URL de produits.
+- Charge les identifiants et URL des produits depuis le registre produits (product_registry, ID_EXCEL.xlsx).
 - Pour chaque produit, envoie une requête pour récupérer les données JSON et extrait les informations
   pertinentes telles que le prix, le coût de livraison et l'état de l'offre.
 - Récupère les ratings des vendeurs en scrappant les pages des boutiques des vendeurs.
 - Utilise un cache pour stocker les informations des vendeurs et éviter des requêtes redondantes.
-- Enregistre les données scrappées dans un fichier Parquet ('Rakuten_data.parquet').
+- Enregistre les offres dans le dataset Parquet commun (offer_records.OFFERS_DATASET, partition pfid=RAK),
+  au schéma commun à toutes les plateformes, tous les FLUSH_PRODUCTS produits et en fin de cycle, ainsi que dans 'Rakuten_data.csv' (lu par le visualiseur).
 - Utilise un fichier de log ('log_rakuten.log') pour suivre les erreurs et les informations de suivi.
 - Gère les délais et les intervalles entre les requêtes pour minimiser le risque de blocage.
-- Sauvegarde de secours en CSV en cas d'échec de la sauvegarde en Parquet.
 
 Configuration :
 - Les chemins des fichiers et les paramètres de scraping peuvent être ajustés dans la section de configuration.
@@ -39,12 +39,20 @@ import time
 import re
 from urllib.parse import urlparse, parse_qs
 import random
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from offer_records import FLUSH_PRODUCTS, OfferBatchBuilder
+from offer_snapshot import save_offers
+from product_registry import get_registry
 
 # -----------------------------------------------------------------------------
 # Configuration des fichiers et paramètres
 # -----------------------------------------------------------------------------
-EXCEL_FILE = "../ID_EXCEL.xlsx"
-PARQUET_FILE = "Rakuten_data.parquet"
+PARQUET_FILE = "Rakuten_data.parquet"  # Ancien fichier des offres (historique, n'est plus alimenté)
+CSV_FILE = "Rakuten_data.csv"
+CSV_COLUMNS = ["pfid", "idsmartphone", "url", "timestamp", "price", "shipcost", "rating", "ratingnb",
+               "offertype", "offerdetails", "shipcountry", "sellercountry", "seller"]
 LOG_FILE = "log_rakuten.log"
 SELLER_CACHE_FILE = "seller_cache.parquet"
 INTERVAL = 60 * 30  # 30 minutes
@@ -127,115 +135,37 @@ def clean_seller_cache(df_cache):
 # Fonctions de gestion des données Excel et Parquet
 # -----------------------------------------------------------------------------
 def load_excel_data():
-    """Charge les données depuis le fichier Excel."""
+    """Charge les produits suivis sur Rakuten (idsmartphone, URL) depuis le registre produits (ID_EXCEL.xlsx)."""
     try:
-        df = pd.read_excel(EXCEL_FILE, skiprows=7)
-        logging.debug(f"Excel chargé avec {len(df)} lignes.")
-        df_selected = df.iloc[:, [2, 14]].dropna()
-        logging.debug(f"{len(df_selected)} enregistrements valides après suppression des NA.")
+        registry = get_registry(reload=True)
+        df_selected = pd.DataFrame(
+            [(idsmartphone, url) for idsmartphone, _, url in registry.products("RAK") if url],
+            columns=["idsmartphone", "url"]
+        )
+        logging.debug(f"{len(df_selected)} produits Rakuten chargés depuis le registre.")
         return df_selected
     except Exception as e:
-        logging.error(f"Erreur lors de la lecture du fichier Excel : {e}")
+        logging.error(f"Erreur lors du chargement du registre produits : {e}")
         return pd.DataFrame()
 
-def save_to_parquet_old(data, filename=PARQUET_FILE):
-    """Enregistre les données dans un fichier Parquet avec gestion des types."""
-    try:
-        if not data:
-            logging.info("Aucune donnée à enregistrer pour ce cycle.")
-            return
-
-        df_new = pd.DataFrame(data)
-        logging.debug(f"{len(df_new)} nouvelles offres à enregistrer dans le Parquet.")
-
-        # Définir les types de données
-        dtypes = {
-            'pfid': 'string',
-            'idsmartphone': 'string',
-            'url': 'string',
-            'timestamp': 'string',
-            'price': 'float64',
-            'shipcost': 'float64',
-            'rating': 'float64',
-            'ratingnb': 'Int64',
-            'offertype': 'string',
-            'offerdetails': 'string',
-            'shipcountry': 'string',
-            'sellercountry': 'string',
-            'seller': 'string'
-        }
-
-        # Appliquer les types de données
-        for col, dtype in dtypes.items():
-            if col in df_new.columns:
-                try:
-                    if dtype == 'string':
-                        df_new[col] = df_new[col].astype('string')
-                    elif dtype == 'float64':
-                        df_new[col] = pd.to_numeric(df_new[col], errors='coerce')
-                    elif dtype == 'Int64':
-                        df_new[col] = pd.to_numeric(df_new[col], errors='coerce').astype('Int64')
-                except Exception as e:
-                    logging.warning(f"Erreur lors de la conversion de la colonne {col} : {e}")
-                    if dtype == 'float64':
-                        df_new[col] = pd.to_numeric(df_new[col], errors='coerce')
-                    elif dtype == 'Int64':
-                        df_new[col] = pd.to_numeric(df_new[col], errors='coerce').astype('Int64')
-                    else:
-                        df_new[col] = df_new[col].astype('string')
-
-        # Charger les données existantes si le fichier existe
-        if os.path.exists(filename):
-            logging.debug(f"Fichier Parquet existant trouvé : {filename}")
-            try:
-                df_existing = pd.read_parquet(filename)
-                logging.debug(f"{len(df_existing)} offres existantes chargées.")
-                df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-            except Exception as e:
-                logging.error(f"Erreur lors du chargement du fichier Parquet existant : {e}")
-                df_combined = df_new
-        else:
-            df_combined = df_new
-            logging.debug(f"Création d'un nouveau fichier Parquet avec {len(df_combined)} offres.")
-
-        # Sauvegarder les données combinées
-        df_combined.to_parquet(filename, engine='pyarrow', index=False, compression='snappy')
-        logging.info(f"Données sauvegardées avec succès dans {filename}")
-    except Exception as e:
-        logging.error(f"Erreur lors de l'enregistrement en Parquet : {e}")
-        try:
-            backup_file = filename.replace('.parquet', '_backup.csv')
-            df_new.to_csv(backup_file, index=False)
-            logging.info(f"Sauvegarde de secours effectuée dans {backup_file}")
-        except Exception as backup_err:
-            logging.error(f"Échec de la sauvegarde de secours : {backup_err}")
-
-def save_to_csv(data, filename="Rakuten_data.csv"):
-    """Enregistre les données dans un fichier CSV."""
+def save_to_csv(offers_batch, filename=CSV_FILE):
+    """
+    Ajoute les offres du lot à la fin du fichier CSV, dans son format historique
+    (prix en euros, horodatage '%Y/%m/%d %H:%M').
+    """
     try:
-        if not data:
+        if len(offers_batch) == 0:
             logging.info("Aucune donnée à enregistrer pour ce cycle.")
             return
 
-        df_new = pd.DataFrame(data)
-        logging.debug(f"{len(df_new)} nouvelles offres à enregistrer dans le CSV.")
+        df_new = offers_batch.to_record_batch().to_pandas()
+        df_new["price"] = df_new["price"] / 100
+        df_new["shipcost"] = df_new["shipcost"] / 100
+        df_new["timestamp"] = df_new["timestamp"].map(lambda t: datetime.fromtimestamp(t).strftime("%Y/%m/%d %H:%M"))
+        df_new["ratingnb"] = df_new["ratingnb"].astype("Int64")
+        df_new = df_new[CSV_COLUMNS]
 
-        # Charger les données existantes si le fichier existe
-        if os.path.exists(filename):
-            logging.debug(f"Fichier CSV existant trouvé : {filename}")
-            try:
-                df_existing = pd.read_csv(filename)
-                logging.debug(f"{len(df_existing)} offres existantes chargées.")
-                df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-            except Exception as e:
-                logging.error(f"Erreur lors du chargement du fichier CSV existant : {e}")
-                df_combined = df_new
-        else:
-            df_combined = df_new
-            logging.debug(f"Création d'un nouveau fichier CSV avec {len(df_combined)} offres.")
-
-        # Sauvegarder les données combinées
-        df_combined.to_csv(filename, index=False, encoding='utf-8')
+        df_new.to_csv(filename, mode="a", header=not os.path.exists(filename), index=False, encoding='utf-8')
         logging.info(f"Données sauvegardées avec succès dans {filename}")
     except Exception as e:
         logging.error(f"Erreur lors de l'enregistrement en CSV : {e}")
@@ -432,42 +362,40 @@ def get_seller_info(seller_name, session, df_cache):
 
     return seller_info, df_cache
 
-def scrape_main_page(data_json, idsmartphone):
-    """Scrape les offres depuis la page principale."""
+def scrape_main_page(data_json, idsmartphone, offers_batch, sellers_info):
+    """
+    Ajoute au lot les offres de la page principale, complétées par les informations des vendeurs
+    ('sellers_info' : nom du vendeur -> rating, ratingnb, shipcountry, sellercountry).
+    Retourne le nombre d'offres ajoutées.
+    """
     offers = data_json.get("offers", {}).get("offers", [])
-    product_url = data_json.get("url", pd.NA)
-    timestamp = datetime.now().strftime("%Y/%m/%d %H:%M")
+    product_url = data_json.get("url")
+    timestamp = datetime.now()
 
     logging.debug(f"{len(offers)} offres trouvées sur la page principale pour le produit {idsmartphone}.")
 
     if not offers:
         logging.warning(f"Aucune offre trouvée sur la page principale pour le produit {idsmartphone}.")
 
-    processed_offers = []
-
     for offer in offers:
-        seller_info = offer.get("seller", {})
-        seller_name = seller_info.get("name", pd.NA)
-        row_data = {
-            "pfid": "RAK",
-            "idsmartphone": idsmartphone,
-            "url": product_url,
-            "timestamp": timestamp,
-            "price": offer.get("price", pd.NA),
-            "shipcost": offer.get("shippingDetails", {}).get("shippingRate", {}).get("value", pd.NA),
-            "rating": pd.NA,
-            "ratingnb": pd.NA,
-            "offertype": offer.get("itemCondition", pd.NA),
-            "offerdetails": pd.NA,
-            "shipcountry": pd.NA,
-            "sellercountry": pd.NA,
-            "seller": seller_name
-        }
-        processed_offers.append(row_data)
-        logging.debug(f"Offre traitée pour {idsmartphone} : {row_data}")
-
-    logging.debug(f"{len(processed_offers)} offres traitées sur la page principale pour {idsmartphone}.")
-    return processed_offers
+        seller_name = offer.get("seller", {}).get("name")
+        seller_info = sellers_info.get(seller_name, {})
+        offers_batch.append(
+            idsmartphone=idsmartphone,
+            url=product_url,
+            timestamp=timestamp,
+            price=offer.get("price"),
+            shipcost=offer.get("shippingDetails", {}).get("shippingRate", {}).get("value"),
+            seller=seller_name,
+            rating=seller_info.get("rating"),
+            ratingnb=seller_info.get("ratingnb"),
+            offertype=offer.get("itemCondition"),
+            shipcountry=seller_info.get("shipcountry"),
+            sellercountry=seller_info.get("sellercountry")
+        )
+
+    logging.debug(f"{len(offers)} offres traitées sur la page principale pour {idsmartphone}.")
+    return len(offers)
 
 # -----------------------------------------------------------------------------
 # Fonction principale du script de scraping
@@ -497,6 +425,8 @@ def main():
             continue
 
         request_interval = INTERVAL / num_telephones
+        cycle_offers = OfferBatchBuilder("RAK")
+        scraped_products = 0
         logging.debug(f"Intervalle entre chaque requête principale : {request_interval:.2f} secondes.")
 
         for index, row in df_links.iterrows():
@@ -527,37 +457,29 @@ def main():
                         try:
                             data_json = json.loads(script_tag.string)
                             logging.debug(f"Données JSON parsées pour {url}.")
-
-                            main_offers = scrape_main_page(data_json, idsmartphone)
-                            total_offers = len(main_offers)
-                            logging.debug(f"Nombre total d'offres trouvées : {total_offers}")
                         except json.JSONDecodeError as je:
                             logging.error(f"Erreur de décodage JSON pour {url} : {je}")
-                            main_offers = []
-                            total_offers = 0
+                            data_json = {}
+
+                        sellers_processed = {}
+                        for offer in data_json.get("offers", {}).get("offers", []):
+                            seller_name = offer.get("seller", {}).get("name")
+                            if seller_name and seller_name not in sellers_processed:
+                                seller_info, df_seller_cache = get_seller_info(seller_name, session, df_seller_cache)
+                                sellers_processed[seller_name] = seller_info
+                                logging.debug(f"Informations mises à jour pour le vendeur '{seller_name}': {seller_info}")
+
+                        offers_batch = OfferBatchBuilder("RAK")
+                        total_offers = scrape_main_page(data_json, idsmartphone, offers_batch, sellers_processed)
+                        logging.debug(f"Nombre total d'offres trouvées : {total_offers}")
 
                         if total_offers > 0:
-                            sellers_processed = {}
-
-                            for offer in main_offers:
-                                seller_name = offer.get("seller", pd.NA)
-                                if not pd.isna(seller_name):
-                                    if seller_name not in sellers_processed:
-                                        seller_info, df_seller_cache = get_seller_info(seller_name, session, df_seller_cache)
-                                        sellers_processed[seller_name] = seller_info
-                                        logging.debug(f"Informations mises à jour pour le vendeur '{seller_name}': {seller_info}")
-
-                                    seller_info = sellers_processed[seller_name]
-                                    offer["rating"] = seller_info.get("rating", pd.NA)
-                                    offer["ratingnb"] = seller_info.get("ratingnb", pd.NA)
-                                    offer["shipcountry"] = seller_info.get("shipcountry", pd.NA)
-                                    offer["sellercountry"] = seller_info.get("sellercountry", pd.NA)
-                                else:
-                                    logging.debug(f"Aucun vendeur valide pour l'offre: {offer}")
-
-                            if main_offers:
-                                save_to_csv(main_offers)
-                                logging.info(f"Données sauvegardées pour {idsmartphone} avec {len(main_offers)} offres")
+                            save_to_csv(offers_batch)
+                            cycle_offers.extend(offers_batch)
+                            scraped_products += 1
+                            logging.info(f"Offres collectées pour {idsmartphone} : {total_offers}")
+                            if scraped_products % FLUSH_PRODUCTS == 0:
+                                save_offers(cycle_offers)
 
                     else:
                         logging.warning(f"Balise script JSON non trouvée pour {url}")
@@ -574,6 +496,11 @@ def main():
             logging.debug(f"Temps de scraping: {elapsed_time:.2f}s. Pause de {sleep_time:.2f}s avant la suite.")
             time.sleep(sleep_time)
 
+        try:
+            save_offers(cycle_offers)
+        except Exception as e:
+            logging.error(f"Erreur lors de l'enregistrement des offres du cycle : {e}")
+
         # Nettoyer et sauvegarder le cache des vendeurs
         df_seller_cache = clean_seller_cache(df_seller_cache)
         save_seller_cache(df_seller_cache)
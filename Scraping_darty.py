@@ -6,15 +6,19 @@ from datetime import datetime
 from bs4 import BeautifulSoup
 import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from browser_pool import DriverPool
+from browser_waits import wait_until_ready, wait_stats_summary
+from product_registry import get_registry
+from snapshot_store import snapshot_page
 
 # CONSTANTS
 
 CHROME_DATA_DIR = "/home/laura/.config/google-chrome/Default"
 SCRAPE_INTERVAL = 60 # En secondes
+DRIVER_POOL_SIZE = 1
+DRIVER_MAX_PAGES = 30 # Recyclage du navigateur après N pages
+DRIVER_MAX_MEMORY_MB = 1500 # Recyclage du navigateur au-delà de ce plafond mémoire
 
-URL = "https://www.darty.com/nav/extra/offres?codic=7663854"
 
 CSV_FILE = "darty_offers.csv"
 
@@ -137,7 +141,7 @@ def simulate_human_behavior(driver):
     except Exception as e:
         logging.error(f"Erreur lors de la simulation de comportement humain : {e}")
 
-def scrape_darty_product_info(url):
+def scrape_darty_product_info(driver, url):
     """
     Scrapes product information from a given Darty product page.
 
@@ -146,24 +150,27 @@ def scrape_darty_product_info(url):
     and delivery date. It returns a list of dictionaries, each containing the extracted information
     for a product offer.
 
+    The driver is borrowed from the DriverPool and is not closed here, so the same warm
+    browser can be reused for the next iteration.
+
     Args:
+        driver (webdriver.Chrome): The WebDriver instance used to interact with the browser.
         url (str): The URL of the Darty product page to scrape.
 
     Returns:
         list of dict: A list of dictionaries, each containing information about a product offer.
     """
-    driver = get_driver()
-    time.sleep(10)
     driver.get(url)
+    wait_until_ready(driver, (By.CLASS_NAME, "mkp_item"), timeout=30, fallback=10, label="darty_offers_page")
     logging.info("Page chargée")
 
     verify_detection(driver)
     simulate_human_behavior(driver)
 
     try:
-        WebDriverWait(driver, 30).until(EC.presence_of_element_located((By.CLASS_NAME, "mkp_item")))
-
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        html = driver.page_source
+        snapshot_page("darty", url, html)
+        soup = BeautifulSoup(html, 'html.parser')
         products = soup.select(".mkp_item")
         logging.info(f"{len(products)} offres trouvées")
 
@@ -223,19 +230,48 @@ def scrape_darty_product_info(url):
     except Exception as e:
         logging.error(f"Erreur lors du scraping : {e}")
         return []
-    finally:
-        try:
-            driver.quit()
-            logging.info("Navigateur fermé")
-        except Exception as e:
-            logging.error(f"Erreur lors de la fermeture du navigateur : {e}")
+
+def tracked_offer_pages():
+    """
+    Returns the Darty offer pages to scrape, from the product registry.
+
+    Only the 'offres?codic=' pages of lien.xlsx are kept: the product pages of ID_EXCEL.xlsx
+    do not list the marketplace offers. A page shared by several phones appears once.
+
+    Returns:
+        list of tuple: (url, idsmartphones) for each offer page.
+    """
+    return [(url, idsmartphones) for key, url, idsmartphones in get_registry(reload=True).tracked("DART")
+            if key.isdigit()]
+
+def last_header(filename, first_column):
+    """
+    Returns the last header row written in a CSV file.
+
+    Args:
+        filename (str): The CSV file.
+        first_column (str): The first column name, which identifies header rows.
+
+    Returns:
+        list or None: The columns of the last header row, None if the file has none.
+    """
+    header = None
+    try:
+        with open(filename, newline='', encoding='utf-8') as file:
+            for row in csv.reader(file):
+                if row and row[0] == first_column:
+                    header = row
+    except FileNotFoundError:
+        pass
+    return header
 
 def save_to_csv(data, filename):
     """
     Saves scraped product information to a CSV file.
 
-    This function appends the provided data to a CSV file. If the file does not exist or is empty,
-    it writes a header row based on the keys of the data dictionaries.
+    This function appends the provided data to a CSV file. If the file has no header row matching
+    the keys of the data dictionaries (new file, or rows written before a column was added),
+    it writes one first, as migrate_legacy_csv reads each row with the last header of its width.
 
     Args:
         data (list of dict): The list of dictionaries containing product information to save.
@@ -244,10 +280,11 @@ def save_to_csv(data, filename):
     Returns:
         None
     """
-    keys = data[0].keys() if data else []
+    keys = list(data[0].keys()) if data else []
+    write_header = keys and last_header(filename, keys[0]) != keys
     with open(filename, mode='a', newline='', encoding='utf-8') as file:
         writer = csv.DictWriter(file, fieldnames=keys)
-        if file.tell() == 0:
+        if write_header:
             writer.writeheader()
         writer.writerows(data)
     logging.info(f"Données enregistrées dans {filename}")
@@ -255,24 +292,31 @@ def save_to_csv(data, filename):
 # MAIN
 
 def main():
-    while True:
-        try:
-            product_info_list = scrape_darty_product_info(URL)
-            if product_info_list:
-                save_to_csv(product_info_list, CSV_FILE)
-
-            driver = get_driver()
-            driver.get(URL)
-            simulate_human_behavior(driver)
-            time.sleep(SCRAPE_INTERVAL)
-            driver.quit()
-
-            logging.info(f"Attente de {SCRAPE_INTERVAL} secondes avant le prochain scraping...")
-            time.sleep(SCRAPE_INTERVAL)
-
-        except Exception as e:
-            logging.error(f"Erreur dans le main : {e}")
-            break
+    pool = DriverPool(get_driver, size=DRIVER_POOL_SIZE, max_pages=DRIVER_MAX_PAGES, max_memory_mb=DRIVER_MAX_MEMORY_MB)
+    try:
+        while True:
+            try:
+                for url, idsmartphones in tracked_offer_pages():
+                    # Un seul emprunt par produit : la page déjà chargée sert aussi à la simulation de navigation
+                    with pool.driver() as driver:
+                        product_info_list = scrape_darty_product_info(driver, url)
+                        simulate_human_behavior(driver)
+                    # Une page partagée par plusieurs téléphones : ses offres sont enregistrées pour chacun
+                    rows = [dict(info, idsmartphone=idsmartphone) for idsmartphone in idsmartphones for info in product_info_list]
+                    if rows:
+                        save_to_csv(rows, CSV_FILE)
+                    time.sleep(SCRAPE_INTERVAL)
+
+                logging.info(f"Attente de {SCRAPE_INTERVAL} secondes avant le prochain scraping...")
+                time.sleep(SCRAPE_INTERVAL)
+
+            except Exception as e:
+                logging.error(f"Erreur dans le main : {e}")
+                break
+    finally:
+        for line in wait_stats_summary():
+            logging.info(line)
+        pool.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,188 @@
+"""
+Pool de navigateurs WebDriver réutilisables
+-------------------------------------------
+
+Ce module garde des instances Chrome « chaudes » entre les itérations des scrapers Selenium,
+au lieu de lancer (et de fermer) un navigateur à chaque page.
+
+Fonctionnement :
+- Les navigateurs sont créés à la demande par une fonction fabrique (ex : get_driver de Scraping_darty.py).
+- À chaque emprunt et à chaque restitution, le navigateur est vérifié (réponse à un script JS) ;
+  un navigateur qui ne répond plus est remplacé (ex : Chrome tombé pendant qu'il attendait dans le pool).
+- Un navigateur est recyclé (fermé puis recréé) après MAX_PAGES utilisations ou lorsque la mémoire
+  de ses processus (Chrome + chromedriver) dépasse MAX_MEMORY_MB.
+- La mesure mémoire utilise psutil s'il est installé ; sinon, seul le recyclage par nombre de pages s'applique.
+
+Utilisation :
+    pool = DriverPool(get_driver, size=1)
+    with pool.driver() as driver:
+        driver.get(url)
+    pool.close()
+"""
+
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# CONSTANTS
+MAX_PAGES = 50  # Nombre d'utilisations avant recyclage d'un navigateur
+MAX_MEMORY_MB = 1500  # Plafond mémoire (RSS cumulée des processus du navigateur)
+
+
+class DriverPool:
+    """
+    Pool borné de WebDriver réutilisables avec vérification de santé et recyclage.
+
+    Args:
+        factory (callable): Fonction sans argument qui crée et retourne un WebDriver.
+        size (int): Nombre maximum de navigateurs ouverts simultanément.
+        max_pages (int): Nombre d'utilisations au-delà duquel un navigateur est recyclé.
+        max_memory_mb (float): Mémoire au-delà de laquelle un navigateur est recyclé.
+    """
+
+    def __init__(self, factory, size=1, max_pages=MAX_PAGES, max_memory_mb=MAX_MEMORY_MB):
+        self.factory = factory
+        self.size = size
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self._idle = queue.LifoQueue()
+        self._pages = {}
+        self._created = 0
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "recycled": 0, "unhealthy": 0}
+
+        if psutil is None:
+            logging.warning("psutil n'est pas installé : le recyclage par plafond mémoire est désactivé.")
+
+    def acquire(self, timeout=None):
+        """Retourne un navigateur disponible et en état de marche, en le créant si le pool n'est pas plein."""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_create = self._created < self.size
+                    if can_create:
+                        self._created += 1
+
+                if can_create:
+                    return self._create()
+                driver = self._idle.get(timeout=timeout)
+
+            if self.is_healthy(driver):
+                self.stats["reused"] += 1
+                return driver
+            logging.info("Recyclage du navigateur (ne répond plus à l'emprunt).")
+            self.stats["unhealthy"] += 1
+            self.stats["recycled"] += 1
+            self._retire(driver)
+
+    def release(self, driver, pages=1):
+        """Restitue un navigateur au pool, ou le recycle s'il est en mauvais état ou trop usé."""
+        self._pages[id(driver)] = self._pages.get(id(driver), 0) + pages
+
+        reason = None
+        if not self.is_healthy(driver):
+            reason = "ne répond plus"
+            self.stats["unhealthy"] += 1
+        elif self._pages[id(driver)] >= self.max_pages:
+            reason = f"{self._pages[id(driver)]} pages chargées"
+        else:
+            memory_mb = self.memory_usage_mb(driver)
+            if memory_mb is not None and memory_mb > self.max_memory_mb:
+                reason = f"{memory_mb:.0f} Mo utilisés"
+
+        if reason:
+            logging.info(f"Recyclage du navigateur ({reason}).")
+            self.stats["recycled"] += 1
+            self._retire(driver)
+            return
+
+        self._idle.put(driver)
+
+    @contextmanager
+    def driver(self, timeout=None):
+        """Gestionnaire de contexte : acquiert un navigateur et le restitue à la sortie du bloc."""
+        driver = self.acquire(timeout=timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    def is_healthy(self, driver):
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception as e:
+            logging.warning(f"Vérification de santé du navigateur échouée : {e}")
+            return False
+
+    def memory_usage_mb(self, driver):
+        """Mémoire RSS cumulée (en Mo) du chromedriver, du navigateur et de leurs sous-processus."""
+        if psutil is None:
+            return None
+
+        pids = set()
+        browser_pid = getattr(driver, "browser_pid", None)
+        if browser_pid:
+            pids.add(browser_pid)
+        service_process = getattr(getattr(driver, "service", None), "process", None)
+        if service_process is not None:
+            pids.add(service_process.pid)
+
+        total = 0
+        seen = set()
+        for pid in pids:
+            try:
+                root = psutil.Process(pid)
+                for process in [root] + root.children(recursive=True):
+                    if process.pid not in seen:
+                        seen.add(process.pid)
+                        total += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return total / (1024 * 1024) if seen else None
+
+    def close(self):
+        """Ferme tous les navigateurs inactifs du pool."""
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+        with self._lock:
+            self._created = 0
+        logging.info(f"Pool de navigateurs fermé : {self.stats}")
+
+    def _create(self):
+        start_time = time.time()
+        try:
+            driver = self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        self._pages[id(driver)] = 0
+        self.stats["created"] += 1
+        logging.info(f"Nouveau navigateur lancé en {time.time() - start_time:.2f}s.")
+        return driver
+
+    def _retire(self, driver):
+        """Ferme un navigateur emprunté et libère sa place dans le pool."""
+        self._discard(driver)
+        with self._lock:
+            self._created -= 1
+
+    def _discard(self, driver):
+        self._pages.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.error(f"Erreur lors de la fermeture du navigateur : {e}")
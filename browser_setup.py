@@ -0,0 +1,187 @@
+"""
+Configuration commune des navigateurs Selenium : blocage des ressources inutiles
+--------------------------------------------------------------------------------
+
+Les scrapers Selenium (Carrefour, Leclerc) ne lisent que le texte des panneaux d'offres,
+mais chargent par défaut les images, polices, vidéos, publicités et traceurs de chaque page.
+Ce module bloque ces ressources via le Chrome DevTools Protocol (Network.setBlockedURLs).
+
+Fonctionnement :
+- Chaque site a sa configuration dans SITE_BLOCKING : types de ressources à bloquer
+  (traduits en motifs d'URL, et en préférence Chrome pour les images) et domaines à bloquer (pubs, traceurs).
+- configure_options(options, site) s'applique aux Options avant la création du driver.
+- enable_resource_blocking(driver, site) s'applique au driver une fois créé.
+- compare_page_load(driver, url, site) charge la page sans puis avec blocage et rapporte
+  le temps de chargement et les octets transférés (mesurés à partir des logs de performance Chrome).
+
+Utilisation en ligne de commande (rapport de comparaison) :
+    python browser_setup.py carrefour https://www.carrefour.fr/
+"""
+
+import json
+import logging
+import sys
+import time
+
+# CONSTANTS
+RESOURCE_BLOCKING_ENABLED = True
+
+# Extensions correspondant à chaque type de ressource CDP
+RESOURCE_TYPE_EXTENSIONS = {
+    "Image": ["png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico"],
+    "Font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "Media": ["mp4", "webm", "m3u8", "mp3"],
+}
+
+# Motifs d'URL par type : l'extension en fin d'URL ou suivie d'une query string (CDNs d'images : ".jpg?w=300")
+RESOURCE_TYPE_PATTERNS = {
+    resource_type: [pattern for extension in extensions for pattern in (f"*.{extension}", f"*.{extension}?*")]
+    for resource_type, extensions in RESOURCE_TYPE_EXTENSIONS.items()
+}
+
+# Publicités et traceurs communs aux sites marchands (les bandeaux de consentement ne sont pas bloqués)
+COMMON_BLOCKED_URLS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*facebook.net*",
+    "*hotjar.com*",
+    "*criteo.com*",
+    "*criteo.net*",
+    "*contentsquare.net*",
+    "*tiktok.com*",
+    "*pinterest.com*",
+    "*bing.com*",
+]
+
+SITE_BLOCKING = {
+    "carrefour": {
+        "resource_types": ["Image", "Font", "Media"],
+        "urls": COMMON_BLOCKED_URLS + ["*batch.com*", "*kameleoon*", "*adsrvr.org*"],
+    },
+    "leclerc": {
+        "resource_types": ["Image", "Font", "Media"],
+        "urls": COMMON_BLOCKED_URLS + ["*abtasty.com*", "*tagcommander.com*", "*commander1.com*"],
+    },
+    "default": {
+        "resource_types": ["Image", "Font", "Media"],
+        "urls": COMMON_BLOCKED_URLS,
+    },
+}
+
+# FUNCTIONS
+def get_site_blocking(site):
+    return SITE_BLOCKING.get(site, SITE_BLOCKING["default"])
+
+def get_blocked_urls(site):
+    """Liste complète des motifs d'URL bloqués pour un site (types de ressources + domaines)."""
+    config = get_site_blocking(site)
+    patterns = []
+    for resource_type in config["resource_types"]:
+        patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, []))
+    patterns.extend(config["urls"])
+    return patterns
+
+def configure_options(options, site):
+    """
+    Complète les Options Chrome avant la création du driver :
+    désactive le chargement des images si le site le demande et active les logs de performance
+    (nécessaires à la mesure des octets transférés). Les préférences déjà définies par l'appelant sont conservées.
+    """
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    if RESOURCE_BLOCKING_ENABLED and "Image" in get_site_blocking(site)["resource_types"]:
+        prefs = dict(options.experimental_options.get("prefs", {}))
+        prefs["profile.managed_default_content_settings.images"] = 2
+        options.add_experimental_option("prefs", prefs)
+    return options
+
+def enable_resource_blocking(driver, site):
+    """Active le blocage des URLs du site via CDP sur un driver déjà créé."""
+    if not RESOURCE_BLOCKING_ENABLED:
+        return
+    patterns = get_blocked_urls(site)
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        logging.info(f"Blocage de {len(patterns)} motifs d'URL activé pour '{site}'.")
+    except Exception as e:
+        logging.error(f"Impossible d'activer le blocage des ressources pour '{site}' : {e}")
+
+def disable_resource_blocking(driver):
+    try:
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+    except Exception as e:
+        logging.error(f"Impossible de désactiver le blocage des ressources : {e}")
+
+def read_network_stats(driver):
+    """
+    Vide les logs de performance du driver et retourne (octets transférés, requêtes terminées, requêtes bloquées)
+    depuis la dernière lecture.
+    """
+    transferred, finished, blocked = 0, 0, 0
+    try:
+        entries = driver.get_log("performance")
+    except Exception as e:
+        logging.warning(f"Logs de performance indisponibles : {e}")
+        return None, None, None
+
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        method = message.get("method")
+        if method == "Network.loadingFinished":
+            transferred += message["params"].get("encodedDataLength", 0)
+            finished += 1
+        elif method == "Network.loadingFailed" and message["params"].get("blockedReason"):
+            blocked += 1
+    return transferred, finished, blocked
+
+def measure_page_load(driver, url):
+    """Charge une URL (cache vidé) et retourne le temps de chargement et le volume réseau associé."""
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+    except Exception as e:
+        logging.warning(f"Impossible de vider le cache du navigateur : {e}")
+    read_network_stats(driver)
+
+    start_time = time.perf_counter()
+    driver.get(url)
+    load_time = time.perf_counter() - start_time
+
+    transferred, finished, blocked = read_network_stats(driver)
+    return {"load_time": load_time, "bytes": transferred, "requests": finished, "blocked": blocked}
+
+def compare_page_load(driver, url, site):
+    """Mesure le chargement d'une page sans puis avec blocage et journalise la différence."""
+    disable_resource_blocking(driver)
+    without_blocking = measure_page_load(driver, url)
+    enable_resource_blocking(driver, site)
+    with_blocking = measure_page_load(driver, url)
+
+    for label, result in (("sans blocage", without_blocking), ("avec blocage", with_blocking)):
+        size = f"{result['bytes'] / 1024:.0f} Ko" if result["bytes"] is not None else "n/d"
+        logging.info(f"{url} {label} : {result['load_time']:.2f}s, {size}, "
+                     f"{result['requests']} requêtes, {result['blocked']} bloquées.")
+    return without_blocking, with_blocking
+
+# MAIN
+if __name__ == "__main__":
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    site = sys.argv[1] if len(sys.argv) > 1 else "default"
+    url = sys.argv[2] if len(sys.argv) > 2 else "https://www.e.leclerc/"
+
+    # Les images ne sont bloquées que par CDP ici, pour que la mesure « sans blocage » reste représentative
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    driver = webdriver.Chrome(options=chrome_options)
+    try:
+        compare_page_load(driver, url, site)
+    finally:
+        driver.quit()
@@ -0,0 +1,183 @@
+"""
+Attentes événementielles pour les scrapers Selenium
+---------------------------------------------------
+
+Remplace les time.sleep() fixes des scrapers par des attentes qui se terminent dès que la page est prête :
+- l'élément cible (sélecteur des offres, bouton, titre) est présent dans le DOM ;
+- le réseau est au repos : plus de MAX_INFLIGHT_IDLE requêtes en cours pendant IDLE_TIME secondes.
+
+Le repos réseau est suivi à partir des événements CDP Network (requestWillBeSent, loadingFinished,
+loadingFailed) remontés par les logs de performance Chrome (capability 'goog:loggingPrefs', activée
+par browser_setup.configure_options). Sans ces logs (ex : undetected_chromedriver), le repos est détecté
+par la stabilité du nombre d'entrées de window.performance.
+La pause fixe d'origine n'est utilisée qu'en dernier recours, si aucun signal n'est exploitable.
+
+Chaque attente est enregistrée sous un libellé avec le temps gagné par rapport à la pause fixe d'origine ;
+wait_stats_summary() retourne le bilan.
+"""
+
+import json
+import logging
+import time
+from collections import deque
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+# CONSTANTS
+IDLE_TIME = 0.5  # Durée (s) sans activité réseau pour considérer la page comme chargée
+MAX_INFLIGHT_IDLE = 2  # Requêtes longues tolérées (websockets, beacons)
+POLL_INTERVAL = 0.1
+RESPONSE_BUFFER_SIZE = 500  # Réponses réseau conservées par navigateur pour url_cache
+
+# Statistiques par libellé : nombre d'attentes, temps attendu, temps gagné, attentes en repli
+WAIT_STATS = {}
+
+# Événements Network.responseReceived lus dans les logs de performance, par navigateur (id(driver)).
+# Les logs sont vidés à chaque lecture : ils sont conservés ici pour que url_cache puisse les exploiter.
+RESPONSE_EVENTS = {}
+
+# FUNCTIONS
+def record_wait(label, elapsed, fallback, used_fallback=False):
+    stats = WAIT_STATS.setdefault(label, {"count": 0, "waited": 0.0, "saved": 0.0, "fallbacks": 0})
+    stats["count"] += 1
+    stats["waited"] += elapsed
+    stats["saved"] += fallback - elapsed
+    if used_fallback:
+        stats["fallbacks"] += 1
+
+def wait_stats_summary():
+    """Retourne une ligne de bilan par libellé d'attente, plus le total gagné."""
+    lines = []
+    total_saved = 0.0
+    for label, stats in sorted(WAIT_STATS.items()):
+        total_saved += stats["saved"]
+        lines.append(f"{label} : {stats['count']} attentes, {stats['waited']:.1f}s attendues, "
+                     f"{stats['saved']:.1f}s gagnées, {stats['fallbacks']} pauses fixes de repli")
+    lines.append(f"Temps total gagné sur les pauses fixes : {total_saved:.1f}s")
+    return lines
+
+def read_network_events(driver):
+    """
+    Vide les logs de performance du navigateur et retourne les messages CDP Network (None si indisponibles).
+    Les réponses reçues sont mises de côté dans RESPONSE_EVENTS.
+    """
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return None
+
+    messages = []
+    responses = RESPONSE_EVENTS.setdefault(id(driver), deque(maxlen=RESPONSE_BUFFER_SIZE))
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        if message.get("method") == "Network.responseReceived":
+            responses.append(message.get("params", {}))
+        messages.append(message)
+    return messages
+
+def _drain_network_events(driver, inflight):
+    """
+    Lit les événements CDP Network depuis les logs de performance et met à jour les requêtes en cours.
+    Retourne True si une activité a été observée, None si les logs sont indisponibles.
+    """
+    messages = read_network_events(driver)
+    if messages is None:
+        return None
+
+    activity = False
+    for message in messages:
+        method = message.get("method", "")
+        params = message.get("params", {})
+        if method == "Network.requestWillBeSent":
+            inflight.add(params.get("requestId"))
+            activity = True
+        elif method in ("Network.loadingFinished", "Network.loadingFailed"):
+            inflight.discard(params.get("requestId"))
+            activity = True
+    return activity
+
+def _resource_count(driver):
+    return driver.execute_script(
+        "return document.readyState === 'complete' ? performance.getEntriesByType('resource').length : -1;"
+    )
+
+def wait_for_network_idle(driver, timeout=10, idle_time=IDLE_TIME):
+    """
+    Attend que le réseau soit au repos. Retourne True si le repos a été atteint avant le délai.
+    """
+    start_time = time.perf_counter()
+    last_activity = start_time
+    inflight = set()
+    use_network_events = _drain_network_events(driver, inflight) is not None
+    last_count = None
+
+    while time.perf_counter() - start_time < timeout:
+        now = time.perf_counter()
+        if use_network_events:
+            if _drain_network_events(driver, inflight):
+                last_activity = now
+            idle = len(inflight) <= MAX_INFLIGHT_IDLE
+        else:
+            count = _resource_count(driver)
+            if count != last_count or count < 0:
+                last_count = count
+                last_activity = now
+            idle = count >= 0
+
+        if idle and now - last_activity >= idle_time:
+            return True
+        time.sleep(POLL_INTERVAL)
+    return False
+
+def wait_until_ready(driver, locator=None, timeout=15, fallback=5, label="page", condition=EC.presence_of_element_located):
+    """
+    Attend que l'élément 'locator' soit présent puis que le réseau soit au repos.
+    'fallback' est la pause fixe remplacée : elle n'est appliquée que si aucun signal n'a pu être observé.
+    Retourne True si la page est prête, False sinon.
+    """
+    start_time = time.perf_counter()
+    ready = True
+    try:
+        if locator:
+            WebDriverWait(driver, timeout).until(condition(locator))
+        remaining = max(timeout - (time.perf_counter() - start_time), IDLE_TIME)
+        if not wait_for_network_idle(driver, remaining) and not locator:
+            ready = False
+    except TimeoutException:
+        logging.warning(f"Attente '{label}' : élément {locator} absent après {timeout}s.")
+        ready = False
+    except Exception as e:
+        logging.warning(f"Attente '{label}' impossible ({e}), pause fixe de {fallback}s.")
+        time.sleep(fallback)
+        record_wait(label, time.perf_counter() - start_time, fallback, used_fallback=True)
+        return False
+
+    record_wait(label, time.perf_counter() - start_time, fallback)
+    return ready
+
+def wait_after_click(driver, previous_url, locator=None, timeout=10, fallback=2, label="click"):
+    """
+    Attend la fin d'une navigation déclenchée par un clic : changement d'URL (ou apparition de 'locator'),
+    puis repos réseau.
+    Sans 'locator', un clic qui ne change pas l'URL (panneau dans la page, repli en JavaScript) n'est attendu
+    que 'fallback' secondes, la durée de la pause fixe remplacée, avant l'attente du repos réseau.
+    """
+    start_time = time.perf_counter()
+    try:
+        WebDriverWait(driver, timeout if locator is not None else min(timeout, fallback)).until(
+            lambda d: d.current_url != previous_url or (locator is not None and d.find_elements(*locator))
+        )
+    except TimeoutException:
+        logging.info(f"Attente '{label}' : pas de navigation détectée après le clic.")
+    except Exception as e:
+        logging.warning(f"Attente '{label}' impossible ({e}), pause fixe de {fallback}s.")
+        time.sleep(fallback)
+        record_wait(label, time.perf_counter() - start_time, fallback, used_fallback=True)
+        return driver.current_url
+
+    remaining = max(timeout - (time.perf_counter() - start_time), IDLE_TIME)
+    wait_for_network_idle(driver, remaining)
+    record_wait(label, time.perf_counter() - start_time, fallback)
+    return driver.current_url
@@ -12,6 +12,8 @@ from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from session_state import establish_session
+from product_registry import tracked_keys
 
 URL = "https://www.cdiscount.com/"
 API_KEY = "48769c3dfb7194a2639f7f5627378bad"
@@ -233,12 +235,11 @@ def main():
     service = Service('C:\\Users\\nsoulie\\Downloads\\chromedriver-win64 (1)\\chromedriver-win64\chromedriver.exe')
     driver = webdriver.Chrome(service=service, options=chrome_options)
 
-    products_to_search = ['ip16512black', 'ip16256black', 'ip16128black',
-                          'ip16p512black', 'ip16p128black', 'ip16pro1tbblack',
-                          'ip16prom1tbbla', 'ip15512black', 'ip15128black', 'ip15protbblack', 'ip15promtbblack']
+    # Références Cdiscount du registre produits ; une référence partagée (ip15512black) n'est recherchée qu'une fois
+    products_to_search = tracked_keys("CDIS")
 
     try:
-        accept_condition(driver)
+        establish_session(driver, "cdiscount", URL, accept_condition, (By.ID, HTML_SELECTORS["accept_condition"]))
 
         for product_to_search in products_to_search:
             search_product(driver, product_to_search)
@@ -0,0 +1,397 @@
+"""
+Migration de l'historique CSV vers le dataset Parquet commun
+------------------------------------------------------------
+
+Les scrapers navigateur ont accumulé des CSV de formats incompatibles :
+- scraping_data.csv : en-têtes de 5, 6 puis 9 colonnes dans le même fichier, lignes entières entre guillemets,
+  prix du type "134.,30 �" ou 108�99 (le symbole € perdu à l'encodage) ;
+- LECLERC/product_details_bak.csv et product_details.csv : en-têtes répétés et lignes de séparation '-----' ;
+- scraping_leclerc.csv ("1299.,00 €"), scraping_carrefour.csv ("1053,00€", ",19€"), darty_offers.csv (en-têtes en français).
+
+Ce script lit chaque fichier en flux, par blocs de CHUNK_LINES lignes, et normalise les colonnes avec les opérations
+vectorisées de pandas (.str, to_numeric, factorize) plutôt qu'un apply ligne par ligne :
+- les lignes entièrement entre guillemets sont désimbriquées, les en-têtes répétés changent le format des lignes
+  suivantes, les séparateurs sont ignorés ;
+- prix et frais de port en centimes, horodatage en secondes epoch, plateforme -> pfid ;
+- les lignes sont découpées par le parseur C de pandas ; le nombre de champs de chaque ligne est compté à part
+  (virgules hors guillemets) : les lignes mal formées (guillemet non fermé, trop de champs) ne sont pas transmises
+  au parseur ;
+- l'idsmartphone est celui de la colonne 'idsmartphone' quand le scraper l'a écrite (darty_offers.csv),
+  sinon il est retrouvé par le titre du produit, comparé sous forme de slug ('apple-iphone-16-...-512-go-noir') :
+  titres enregistrés par les scrapers dans le cache d'URLs (url_cache) pour chaque EAN, résolu par le registre
+  produits, et à défaut titres lus dans les URLs produit Leclerc/Carrefour du registre (titre-EAN). Les titres
+  inconnus ou partagés par plusieurs téléphones (et les anciennes lignes sans titre de darty_offers.csv)
+  laissent l'idsmartphone vide ;
+- les lignes sans prix ou horodatage exploitable, de plateforme inconnue ou mal formées sont mises en quarantaine
+  (QUARANTINE_DIR/<source>.csv, avec la ligne d'origine et la raison). Les prix sont classés à part quand ils sont
+  absents ('Non spécifié') ou tronqués (',19€' : partie entière perdue au scraping, irrécupérable).
+
+Les offres sont écrites au schéma commun (offer_records.CANONICAL_SCHEMA) dans le dataset partitionné par plateforme,
+dans des fichiers 'legacy-<source>-*.parquet' : relancer la migration d'une source remplace ses fichiers précédents.
+L'instantané partagé des offres (offer_snapshot) est ensuite republié.
+
+Utilisation :
+    python migrate_legacy_csv.py [source ...]
+"""
+
+import csv
+import glob
+import io
+import logging
+import os
+import sqlite3
+import sys
+import re
+import time
+import unicodedata
+from datetime import datetime
+from itertools import islice
+from urllib.parse import urlparse
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from offer_records import OFFERS_DATASET, FIELDS, build_record_batch
+from offer_snapshot import publish_snapshot
+from product_registry import get_registry
+
+# CONSTANTS
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+QUARANTINE_DIR = os.path.join(BASE_DIR, "quarantine")
+URL_CACHE_FILE = os.path.join(BASE_DIR, "url_cache.sqlite")  # url_cache.CACHE_FILE
+CHUNK_LINES = 20000
+MAX_FIELDS = 12  # Plus large en-tête historique : 9 colonnes
+QUOTED_FIELD = r'"(?:[^"]|"")*"'
+TIMESTAMP_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+LEGACY_SOURCES = {
+    "scraping_data": {"path": "scraping_data.csv", "platform": None},
+    "scraping_leclerc": {"path": "scraping_leclerc.csv", "platform": None},
+    "scraping_carrefour": {"path": "scraping_carrefour.csv", "platform": None},
+    "darty_offers": {"path": "darty_offers.csv", "platform": "Darty"},
+    "leclerc_product_details": {"path": "LECLERC/product_details.csv", "platform": None},
+    "leclerc_product_details_bak": {"path": "LECLERC/product_details_bak.csv", "platform": None},
+}
+
+PLATFORM_IDS = {
+    "E.Leclerc": "LECL",
+    "Carrefour": "CARR",
+    "Darty": "DART",
+    "Cdiscount": "CDIS",
+}
+# Sites du cache d'URLs -> pfid
+CACHE_SITE_PFIDS = {
+    "leclerc": "LECL",
+    "carrefour": "CARR",
+}
+
+# Colonnes des différents en-têtes -> champ du schéma commun (les colonnes absentes restent vides)
+COLUMN_ALIASES = {
+    "Platform": "platform",
+    "Product Name": "descriptsmartphone",
+    "Price": "price",
+    "Prix (€)": "price",
+    "Seller": "seller",
+    "Nom du Vendeur": "seller",
+    "Seller Rating": "rating",
+    "Note du Vendeur": "rating",
+    "Delivery Fees": "shipcost",
+    "Delivery Fee": "shipcost",
+    "Delivery Date": "offerdetails",
+    "Delivery Info": "offerdetails",
+    "Date de Livraison": "offerdetails",
+    "Product State": "offertype",
+    "État du Produit": "offertype",
+    "Timestamp": "timestamp",
+    "Horodatage": "timestamp",
+    "idsmartphone": "idsmartphone",
+}
+HEADER_PATTERN = r"^(?:Platform|Nom du Vendeur),"
+TRUNCATED_PRICE = r"[.,]\d{1,2}[€�]?"  # ',19€' : centimes sans partie entière
+URL_TITLE_PATTERN = re.compile(r"([a-z0-9-]+?)-?\d{13}$")  # Dernier segment des URLs Leclerc/Carrefour : titre-EAN
+FREE_SHIPPING = {"offerte", "gratuit", "gratuite"}
+
+# FUNCTIONS
+def normalize_prices(prices):
+    """
+    Convertit une Series de prix texte en centimes (Int64, <NA> si illisible) :
+    '134.,30 €' / '1299.,00 €' (virgule doublée d'un point), '108�99' (€ perdu utilisé comme séparateur),
+    '1053,00€', '129.99', '159'. Un prix sans partie entière (',19€', TRUNCATED_PRICE) est illisible.
+    """
+    cleaned = (
+        prices.astype("string").str.strip()
+        .str.replace(r"(?<=\d)[€�](?=\d)", ",", regex=True)
+        .str.replace(r"[€�\s]", "", regex=True)
+        .str.replace(".,", ",", regex=False)
+    )
+    valid = cleaned.str.fullmatch(r"\d+(?:[.,]\d{1,2})?").fillna(False).astype(bool)
+    values = pd.to_numeric(cleaned.where(valid).str.replace(",", ".", regex=False), errors="coerce")
+    return (values * 100).round().astype("Int64")
+
+def normalize_shipcost(fees):
+    free = fees.astype("string").str.strip().str.lower().isin(FREE_SHIPPING)
+    return normalize_prices(fees).mask(free, 0)
+
+def normalize_timestamps(timestamps):
+    """
+    Convertit une Series d'horodatages 'jj/mm/aaaa hh:mm:ss' en secondes epoch (Int64), en heure locale
+    comme offer_records.to_epoch. Les horodatages d'un même passage se répètent : seules les valeurs distinctes
+    sont converties.
+    """
+    codes, uniques = pd.factorize(timestamps.astype("string").str.strip().str.strip('"'))
+
+    def to_epoch(value):
+        try:
+            return int(datetime.strptime(value, TIMESTAMP_FORMAT).timestamp())
+        except (TypeError, ValueError):
+            return None
+
+    epochs = pd.array([to_epoch(value) for value in uniques] + [None], dtype="Int64")
+    return pd.Series(epochs[codes], index=timestamps.index, dtype="Int64")
+
+def normalize_text(values):
+    cleaned = values.astype("string").str.replace("�", "", regex=False).str.strip()
+    return cleaned.mask(cleaned.isin(["", "Non spécifié", "Non trouvé", "Non applicable", "N/A"]))
+
+def unwrap_lines(lines):
+    """Désimbrique les lignes écrites entières entre guillemets ("E.Leclerc,""Nom"",""134.,30 �"",...")."""
+    wrapped = lines.str.startswith('"') & lines.str.endswith('"') & lines.str.contains('"",', regex=False)
+    unwrapped = lines.where(~wrapped, lines.str.slice(1, -1).str.replace('""', '"', regex=False))
+    return unwrapped
+
+def field_counts(lines):
+    """
+    Nombre de champs de chaque ligne CSV (virgules hors des champs entre guillemets), MAX_FIELDS + 1 pour les lignes
+    mal formées (guillemet non fermé) ou de plus de MAX_FIELDS champs.
+    """
+    unquoted = lines.str.replace(QUOTED_FIELD, "", regex=True)
+    counts = unquoted.str.count(",") + 1
+    malformed = unquoted.str.contains('"', regex=False) | counts.gt(MAX_FIELDS)
+    return counts.mask(malformed, MAX_FIELDS + 1).astype(int)
+
+def parse_lines(lines):
+    """
+    Découpe les lignes CSV en champs (colonnes 0..MAX_FIELDS-1, <NA> au-delà du dernier champ de chaque ligne).
+    Retourne (DataFrame des champs, nombre de champs par ligne) ; les lignes mal formées comptent pour MAX_FIELDS + 1
+    champs (field_counts), ne correspondent à aucun en-tête et ne sont pas transmises au parseur.
+    """
+    widths = field_counts(lines)
+    parsable = lines[widths <= MAX_FIELDS]
+    if parsable.empty:
+        return pd.DataFrame(index=lines.index, columns=range(MAX_FIELDS), dtype=object), widths
+    frame = pd.read_csv(
+        io.StringIO("\n".join(parsable)), header=None, names=range(MAX_FIELDS), dtype=str, keep_default_na=False,
+        skip_blank_lines=False, on_bad_lines="skip",
+    )
+    if len(frame) != len(parsable):
+        raise ValueError(f"{len(parsable)} lignes attendues, {len(frame)} lues par le parseur CSV")
+    frame.index = parsable.index
+    return frame.reindex(lines.index), widths
+
+def normalize_title(titles):
+    """Titres en slug, comme dans les URLs produit : 'Apple iPhone 16 15,5 cm (6.1")' -> 'apple-iphone-16-15-5-cm-6-1'."""
+    folded = titles.astype("string").str.replace("�", "", regex=False).map(
+        lambda title: unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode(), na_action="ignore"
+    )
+    return folded.str.lower().str.replace(r"[^a-z0-9]+", "-", regex=True).str.strip("-").astype("string")
+
+def url_titles(registry):
+    """
+    (pfid, titre normalisé) -> idsmartphone, à partir des URLs produit Leclerc/Carrefour du registre,
+    dont le dernier segment est le titre du produit suivi de son EAN. Un titre partagé par plusieurs
+    téléphones n'est pas retenu.
+    """
+    owners = {}
+    for pfid in CACHE_SITE_PFIDS.values():
+        for _, url, idsmartphones in registry.tracked(pfid):
+            match = URL_TITLE_PATTERN.search(urlparse(url or "").path.rstrip("/").rsplit("/", 1)[-1])
+            if match:
+                owners.setdefault((pfid, match.group(1)), set()).update(idsmartphones)
+    for (pfid, title), idsmartphones in owners.items():
+        if len(idsmartphones) > 1:
+            logging.warning(f"Titre {pfid} '{title}' partagé par {', '.join(sorted(idsmartphones))} : idsmartphone non renseigné.")
+    return {key: next(iter(idsmartphones)) for key, idsmartphones in owners.items() if len(idsmartphones) == 1}
+
+def product_titles(registry, cache_file=URL_CACHE_FILE):
+    """
+    (pfid, titre normalisé) -> idsmartphone, à partir des titres enregistrés par les scrapers dans le cache d'URLs
+    (EAN -> titre du produit sur le site) et du registre produits (EAN -> idsmartphone), complétés par les titres
+    des URLs produit du registre (url_titles). Un EAN partagé par plusieurs téléphones n'est pas retenu.
+    """
+    titles = url_titles(registry)
+    if not os.path.exists(cache_file):
+        logging.warning(f"Cache d'URLs {cache_file} absent : idsmartphone retrouvé par les URLs du registre seulement.")
+        return titles
+    conn = sqlite3.connect(cache_file)
+    try:
+        rows = conn.execute("SELECT site, ean, product_name FROM product_urls WHERE product_name IS NOT NULL").fetchall()
+    finally:
+        conn.close()
+    for site, ean, name in rows:
+        pfid = CACHE_SITE_PFIDS.get(site)
+        idsmartphones = registry.resolve_all(pfid, ean) if pfid else ()
+        if len(idsmartphones) == 1:
+            titles[(pfid, normalize_title(pd.Series([name])).iloc[0])] = idsmartphones[0]
+    return titles
+
+def resolve_idsmartphones(pfid, titles, product_titles):
+    """idsmartphone de chaque ligne d'après sa plateforme et le titre du produit (<NA> si inconnu)."""
+    if not product_titles:
+        return pd.Series(pd.NA, index=pfid.index, dtype="string")
+    keys = pd.Series(list(zip(pfid, normalize_title(titles))), index=pfid.index)
+    return keys.map(product_titles).astype("string")
+
+def to_canonical(frame, default_platform, titles=None):
+    """
+    Convertit les colonnes d'origine en colonnes du schéma commun. Retourne (colonnes, raison de rejet par ligne).
+    'titles' : (pfid, titre normalisé) -> idsmartphone (product_titles).
+    """
+    fields = {COLUMN_ALIASES[column]: frame[column] for column in frame.columns if column in COLUMN_ALIASES}
+    missing = pd.Series(pd.NA, index=frame.index, dtype="string")
+
+    platform = fields.get("platform", missing.fillna(default_platform) if default_platform else missing)
+    pfid = platform.astype("string").str.strip().map(PLATFORM_IDS)
+    price = normalize_prices(fields.get("price", missing))
+    timestamp = normalize_timestamps(fields.get("timestamp", missing))
+
+    reason = pd.Series(pd.NA, index=frame.index, dtype="string")
+    reason = reason.mask(timestamp.isna(), "horodatage illisible")
+    raw_price = fields.get("price", missing).astype("string").str.strip()
+    reason = reason.mask(price.isna(), "prix illisible")
+    reason = reason.mask(price.isna() & raw_price.str.fullmatch(TRUNCATED_PRICE).fillna(False).astype(bool), "prix tronqué")
+    reason = reason.mask(price.isna() & normalize_text(raw_price).isna(), "prix absent")
+    reason = reason.mask(pfid.isna(), "plateforme inconnue")
+
+    idsmartphone = resolve_idsmartphones(pfid, fields.get("descriptsmartphone", missing), titles)
+    if "idsmartphone" in fields:
+        idsmartphone = normalize_text(fields["idsmartphone"]).fillna(idsmartphone)
+
+    columns = {
+        "pfid": pfid,
+        "idsmartphone": idsmartphone,
+        "url": missing,
+        "timestamp": timestamp,
+        "price": price,
+        "shipcost": normalize_shipcost(fields["shipcost"]) if "shipcost" in fields else missing.astype("Int64"),
+        "seller": normalize_text(fields.get("seller", missing)),
+        "rating": pd.to_numeric(fields.get("rating", missing).astype("string").str.replace(",", ".", regex=False),
+                                errors="coerce"),
+        "ratingnb": missing.astype("Int64"),
+        "offertype": normalize_text(fields.get("offertype", missing)),
+        "offerdetails": normalize_text(fields.get("offerdetails", missing)),
+        "shipcountry": missing,
+        "sellercountry": missing,
+        "descriptsmartphone": normalize_text(fields.get("descriptsmartphone", missing)),
+    }
+    return columns, reason
+
+def to_arrow_values(series):
+    """Series pandas -> liste/tableau accepté par pyarrow, valeurs manquantes à None."""
+    if isinstance(series.dtype, pd.StringDtype) or series.dtype == object:
+        return series.astype(object).where(series.notna(), None).tolist()
+    return series
+
+def clear_previous_migration(source, dataset_dir):
+    for path in glob.glob(os.path.join(dataset_dir, "pfid=*", f"legacy-{source}-*.parquet")):
+        os.remove(path)
+    quarantine_file = os.path.join(QUARANTINE_DIR, f"{source}.csv")
+    if os.path.exists(quarantine_file):
+        os.remove(quarantine_file)
+
+def write_quarantine(source, raw_lines, reasons):
+    os.makedirs(QUARANTINE_DIR, exist_ok=True)
+    quarantine_file = os.path.join(QUARANTINE_DIR, f"{source}.csv")
+    pd.DataFrame({"line": raw_lines.index + 1, "reason": reasons, "raw": raw_lines}).to_csv(
+        quarantine_file, mode="a", header=not os.path.exists(quarantine_file), index=False, quoting=csv.QUOTE_MINIMAL
+    )
+
+def migrate_source(source, dataset_dir=OFFERS_DATASET, titles=None):
+    """
+    Migre un fichier CSV historique. Retourne ses statistiques (lignes lues, écrites, ignorées, en quarantaine,
+    mal formées, offres dont l'idsmartphone a été retrouvé).
+    """
+    config = LEGACY_SOURCES[source]
+    path = os.path.join(BASE_DIR, config["path"])
+    stats = {"lines": 0, "written": 0, "skipped": 0, "quarantined": 0, "malformed": 0, "resolved": 0}
+    clear_previous_migration(source, dataset_dir)
+
+    # Les en-têtes écrits dans les fichiers ne correspondent pas toujours aux lignes qui les suivent
+    # (lignes de 5 champs sous un en-tête de 9 colonnes dans scraping_data.csv) : chaque ligne est associée
+    # à l'en-tête rencontré ayant son nombre de champs.
+    headers = {}
+    with open(path, encoding="utf-8", errors="replace", newline="") as f:
+        chunk_index = 0
+        first_line = 0
+        while True:
+            raw = [line.rstrip("\r\n") for line in islice(f, CHUNK_LINES)]
+            if not raw:
+                break
+            lines = pd.Series(raw, index=pd.RangeIndex(first_line, first_line + len(raw)), dtype="string")
+            first_line += len(raw)
+            stats["lines"] += len(raw)
+
+            lines = unwrap_lines(lines)
+            is_header = lines.str.contains(HEADER_PATTERN, regex=True)
+            is_separator = lines.str.strip().eq("") | lines.str.startswith("---")
+            stats["skipped"] += int((is_header | is_separator).sum())
+            for header_line in lines[is_header].unique():
+                header = next(csv.reader([header_line]))
+                headers[len(header)] = header
+
+            data_lines = lines[~(is_header | is_separator)]
+            if data_lines.empty:
+                continue
+            frame, widths = parse_lines(data_lines)
+            stats["malformed"] += int(widths.gt(MAX_FIELDS).sum())
+
+            for width, rows in frame.groupby(widths):
+                row_lines = data_lines.loc[rows.index]
+                if width not in headers:
+                    write_quarantine(source, row_lines, "ligne mal formée" if width > MAX_FIELDS else "nombre de colonnes")
+                    stats["quarantined"] += len(rows)
+                    continue
+
+                rows = rows.iloc[:, :width].set_axis(headers[width], axis=1)
+                columns, reason = to_canonical(rows, config["platform"], titles)
+                rejected = reason.notna()
+                if rejected.any():
+                    write_quarantine(source, row_lines[rejected], reason[rejected])
+                    stats["quarantined"] += int(rejected.sum())
+
+                batch = build_record_batch({name: to_arrow_values(columns[name][~rejected]) for name in FIELDS})
+                if batch.num_rows:
+                    pq.write_to_dataset(
+                        pa.Table.from_batches([batch]),
+                        root_path=dataset_dir,
+                        partition_cols=["pfid"],
+                        basename_template=f"legacy-{source}-{chunk_index:05d}-{{i}}.parquet",
+                    )
+                    chunk_index += 1
+                    stats["written"] += batch.num_rows
+                    stats["resolved"] += batch.num_rows - batch.column("idsmartphone").null_count
+    return stats
+
+def migrate_all(sources=None, dataset_dir=OFFERS_DATASET):
+    results = {}
+    titles = product_titles(get_registry())
+    for source in sources or LEGACY_SOURCES:
+        start_time = time.perf_counter()
+        try:
+            stats = migrate_source(source, dataset_dir, titles)
+        except Exception as e:
+            logging.error(f"Migration de {source} impossible : {e}")
+            continue
+        stats["duration"] = time.perf_counter() - start_time
+        results[source] = stats
+        print(f"{source} : {stats['lines']} lignes, {stats['written']} offres écrites "
+              f"({stats['resolved']} avec idsmartphone), {stats['quarantined']} en quarantaine "
+              f"(dont {stats['malformed']} lignes mal formées), {stats['skipped']} en-têtes/séparateurs ignorés "
+              f"en {stats['duration']:.2f}s")
+    if results and dataset_dir == OFFERS_DATASET:
+        publish_snapshot(dataset_dir)
+    return results
+
+
+if __name__ == "__main__":
+    migrate_all(sys.argv[1:] or None)
@@ -0,0 +1,126 @@
+"""
+Bus local des lots d'offres enregistrés
+---------------------------------------
+
+Les tableaux de bord n'apprenaient l'arrivée de nouvelles offres que par les événements watchdog sur les CSV,
+alors que les scrapers enregistrent désormais leurs offres dans le dataset Parquet (offer_records.write_offers).
+
+Chaque lot enregistré est maintenant publié sur un bus local, sans courtier, par sockets Unix en datagrammes :
+- chaque abonné (BusSubscriber, un par processus de tableau de bord) crée une socket dans BUS_DIR ;
+- publish_batch() envoie le lot, sérialisé au format Arrow IPC (flux, schéma commun), à chaque socket de BUS_DIR.
+  L'envoi attend au plus SEND_TIMEOUT par message : un abonné saturé perd la fin du lot (avertissement),
+  la socket d'un abonné disparu est supprimée. Un lot plus gros que MAX_DATAGRAM est découpé en plusieurs messages ;
+- l'abonné reçoit les messages sur un thread dédié et passe chaque table Arrow à son 'handler'.
+Le bus ne remplace pas le dataset : un tableau de bord démarré après coup lit l'historique sur disque,
+puis applique les lots reçus.
+"""
+
+import glob
+import itertools
+import logging
+import math
+import os
+import socket
+import threading
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+# CONSTANTS
+BUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "offer_bus")
+MAX_DATAGRAM = 200_000  # octets, sous la taille par défaut des tampons des sockets Unix (net.core.wmem_default)
+RECEIVE_BUFFER = 4 << 20  # octets en attente par abonné (borné par net.core.rmem_max)
+SEND_TIMEOUT = 0.2  # secondes d'attente maximale d'un abonné saturé, par message
+
+_subscriber_ids = itertools.count()
+
+# FUNCTIONS
+def serialize(table):
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def deserialize(payload):
+    return ipc.open_stream(pa.py_buffer(payload)).read_all()
+
+def messages(table):
+    """Messages d'un lot, découpé par lignes pour que chacun tienne dans un datagramme."""
+    payload = serialize(table)
+    if len(payload) <= MAX_DATAGRAM or len(table) < 2:
+        return [payload]
+    parts = math.ceil(len(payload) / MAX_DATAGRAM) + 1
+    size = math.ceil(len(table) / parts)
+    return [payload for offset in range(0, len(table), size) for payload in messages(table.slice(offset, size))]
+
+def publish_batch(table, bus_dir=BUS_DIR):
+    """
+    Publie un lot d'offres (table ou lot Arrow) à tous les abonnés. Retourne le nombre d'abonnés atteints.
+    Les erreurs sont journalisées, jamais propagées : le bus ne doit pas interrompre l'enregistrement.
+    """
+    paths = glob.glob(os.path.join(bus_dir, "*.sock"))
+    if not paths:
+        return 0
+    if isinstance(table, pa.RecordBatch):
+        table = pa.Table.from_batches([table])
+    reached = 0
+    try:
+        payloads = messages(table)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sender:
+            sender.settimeout(SEND_TIMEOUT)
+            for path in paths:
+                try:
+                    for payload in payloads:
+                        sender.sendto(payload, path)
+                    reached += 1
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Abonné arrêté sans avoir supprimé sa socket
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                except (BlockingIOError, TimeoutError):
+                    logging.warning(f"Abonné {path} saturé, lot de {len(table)} offres perdu en partie.")
+    except Exception as e:
+        logging.error(f"Publication du lot sur le bus impossible : {e}")
+    return reached
+
+class BusSubscriber:
+    """Reçoit les lots publiés sur le bus et les passe à 'handler(table)' depuis un thread dédié."""
+
+    def __init__(self, handler, bus_dir=BUS_DIR):
+        self.handler = handler
+        os.makedirs(bus_dir, exist_ok=True)
+        self.path = os.path.join(bus_dir, f"sub-{os.getpid()}-{next(_subscriber_ids)}.sock")
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        self._socket.bind(self.path)
+        self.received = 0
+        self._thread = threading.Thread(target=self._run, name="offer-bus-subscriber", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                payload = self._socket.recv(MAX_DATAGRAM * 2)
+            except OSError:
+                return
+            if not payload:
+                return  # Socket fermée (close)
+            try:
+                table = deserialize(payload)
+                self.received += 1
+                self.handler(table)
+            except Exception as e:
+                logging.error(f"Lot reçu sur le bus non appliqué : {e}")
+
+    def close(self):
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)  # Réveille le thread en attente dans recv()
+        except OSError:
+            pass
+        self._socket.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,381 @@
+"""
+Format commun des offres et construction directe de lots Arrow
+--------------------------------------------------------------
+
+Chaque scraper construisait un dictionnaire Python par offre, avec des clés différentes ('Price' pour AMAZON et FNAC,
+'price' pour RAKUTEN), trois formats d'horodatage et 'descriptsmartphone' présent ou non ; les dictionnaires étaient
+ensuite convertis en DataFrame puis retypés colonne par colonne à chaque sauvegarde.
+
+Ce module définit un schéma unique (CANONICAL_SCHEMA) et un constructeur de lot (OfferBatchBuilder) qui range
+chaque offre directement dans des listes par colonne, déjà converties :
+- prix et frais de port en centimes entiers (int64) ;
+- horodatage en secondes depuis l'epoch (int64) ;
+- vendeur, type d'offre et plateforme encodés en dictionnaire (chaque valeur distincte n'est stockée qu'une fois).
+
+Les lots sont écrits dans un dataset Parquet partagé (OFFERS_DATASET), partitionné par plateforme (pfid=...),
+un fichier par sauvegarde : il n'y a plus de relecture ni de réécriture du fichier complet à chaque ajout.
+Chaque lot écrit dans OFFERS_DATASET est aussi publié sur le bus local des offres (offer_bus) pour les tableaux de bord
+en direct ; les écritures dans un autre dataset (essais, datasets temporaires) ne sont pas publiées.
+Les scrapers accumulent les offres de FLUSH_PRODUCTS produits avant chaque écriture (offer_snapshot.save_offers).
+Au-delà de COMPACT_THRESHOLD fichiers dans une partition, write_offers la regroupe en un seul (compact_partition).
+
+scan_offers() lit le dataset et les anciens fichiers Parquet par plateforme (LEGACY_OFFER_FILES, schéma historique)
+comme une seule source : seules les colonnes demandées sont lues, et les filtres (plateformes, produits, vendeurs,
+dates) sont appliqués à la lecture (partitions pfid, statistiques des groupes de lignes Parquet).
+Les offres d'un ancien fichier ne sont plus relues pour la période dont la partition de sa plateforme a été
+reconstruite depuis les données brutes (fichier LEGACY_SUPERSEDED, voir FNAC/FNAC_reprocess.py).
+"""
+
+import glob
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime
+
+import pandas as pd
+from dateutil.tz import tzlocal
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from offer_bus import publish_batch
+
+# CONSTANTS
+OFFERS_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "offers_dataset")
+FLUSH_PRODUCTS = 10  # Produits dont les offres sont accumulées par un scraper avant chaque écriture
+COMPACT_THRESHOLD = 200  # Fichiers d'une partition au-delà desquels elle est regroupée
+
+CANONICAL_SCHEMA = pa.schema([
+    ("pfid", pa.dictionary(pa.int8(), pa.string())),
+    ("idsmartphone", pa.string()),
+    ("url", pa.string()),
+    ("timestamp", pa.int64()),  # secondes depuis l'epoch
+    ("price", pa.int64()),  # centimes
+    ("shipcost", pa.int64()),  # centimes
+    ("seller", pa.dictionary(pa.int32(), pa.string())),
+    ("rating", pa.float64()),
+    ("ratingnb", pa.int64()),
+    ("offertype", pa.dictionary(pa.int8(), pa.string())),
+    ("offerdetails", pa.string()),
+    ("shipcountry", pa.string()),
+    ("sellercountry", pa.string()),
+    ("descriptsmartphone", pa.string()),
+])
+FIELDS = CANONICAL_SCHEMA.names
+
+# Formats d'horodatage historiques de chaque plateforme
+TIMESTAMP_FORMATS = {
+    "AMAZ": "%Y-%m-%d %H:%M:%S",
+    "FNAC": "%Y%m%d_%H%M%S",
+    "RAK": "%Y/%m/%d %H:%M",
+}
+
+# Anciens fichiers Parquet par plateforme (n'étant plus alimentés) : chemin, colonne du prix en euros
+LEGACY_OFFER_FILES = {
+    "AMAZ": (os.path.join(os.path.dirname(os.path.abspath(__file__)), "AMAZON", "amazon_offers.parquet"), "Price"),
+    "FNAC": (os.path.join(os.path.dirname(os.path.abspath(__file__)), "FNAC", "FNAC.parquet"), "Price"),
+    "RAK": (os.path.join(os.path.dirname(os.path.abspath(__file__)), "RAKUTEN", "Rakuten_data.parquet"), "price"),
+}
+
+# Fichier de la partition d'une plateforme donnant la période (epoch) qu'elle reconstruit depuis son ancien fichier
+LEGACY_SUPERSEDED = "_legacy_superseded"
+
+# FUNCTIONS
+def is_missing(value):
+    """True pour None, NaN et pd.NA (sans dépendre de pandas)."""
+    if value is None:
+        return True
+    try:
+        return bool(value != value)
+    except TypeError:
+        return True
+
+def to_cents(value):
+    """Convertit un prix (float, int ou texte '1 299,00 €') en centimes entiers, None si illisible."""
+    if is_missing(value):
+        return None
+    if not isinstance(value, (int, float)):
+        value = str(value).replace("€", "").replace("\xa0", "").replace(" ", "").replace(",", ".")
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else round(value * 100)
+
+def to_epoch(value, fmt=None):
+    """Convertit un datetime, un entier ou un texte au format 'fmt' en secondes depuis l'epoch."""
+    if is_missing(value):
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(datetime.strptime(str(value), fmt).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+def to_float(value):
+    if is_missing(value):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_int(value):
+    if is_missing(value):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_str(value):
+    return None if is_missing(value) else str(value)
+
+class OfferBatchBuilder:
+    """
+    Accumule les offres d'une plateforme colonne par colonne et produit un pyarrow.RecordBatch au schéma commun.
+    Les valeurs sont converties à l'ajout (centimes, epoch) : aucun retypage n'est nécessaire à la sauvegarde.
+    """
+    __slots__ = ("pfid", "timestamp_format", "_columns")
+
+    def __init__(self, pfid, timestamp_format=None):
+        self.pfid = pfid
+        self.timestamp_format = timestamp_format or TIMESTAMP_FORMATS.get(pfid)
+        self._columns = {name: [] for name in FIELDS}
+
+    def __len__(self):
+        return len(self._columns["pfid"])
+
+    def append(self, idsmartphone, url, timestamp, price, shipcost=None, seller=None, rating=None, ratingnb=None,
+               offertype=None, offerdetails=None, shipcountry=None, sellercountry=None, descriptsmartphone=None):
+        columns = self._columns
+        columns["pfid"].append(self.pfid)
+        columns["idsmartphone"].append(to_str(idsmartphone))
+        columns["url"].append(to_str(url))
+        columns["timestamp"].append(to_epoch(timestamp, self.timestamp_format))
+        columns["price"].append(to_cents(price))
+        columns["shipcost"].append(to_cents(shipcost))
+        columns["seller"].append(to_str(seller))
+        columns["rating"].append(to_float(rating))
+        columns["ratingnb"].append(to_int(ratingnb))
+        columns["offertype"].append(to_str(offertype))
+        columns["offerdetails"].append(to_str(offerdetails))
+        columns["shipcountry"].append(to_str(shipcountry))
+        columns["sellercountry"].append(to_str(sellercountry))
+        columns["descriptsmartphone"].append(to_str(descriptsmartphone))
+
+    def extend(self, other, **values):
+        """
+        Ajoute les offres d'un autre lot. 'values' remplace des colonnes texte par une même valeur
+        (ex : idsmartphone et descriptsmartphone pour une page partagée par plusieurs téléphones).
+        """
+        for name in FIELDS:
+            if name in values:
+                self._columns[name].extend([to_str(values[name])] * len(other))
+            else:
+                self._columns[name].extend(other._columns[name])
+
+    def clear(self):
+        for values in self._columns.values():
+            values.clear()
+
+    def to_record_batch(self):
+        return build_record_batch(self._columns)
+
+def build_record_batch(columns):
+    """
+    Construit un RecordBatch au schéma commun à partir de colonnes déjà converties
+    (listes Python ou Series pandas, une par champ de CANONICAL_SCHEMA).
+    """
+    arrays = []
+    for field in CANONICAL_SCHEMA:
+        values = columns[field.name]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, pa.string()).dictionary_encode().cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=CANONICAL_SCHEMA)
+
+def write_offers(builder, dataset_dir=OFFERS_DATASET):
+    """
+    Écrit les offres accumulées dans un nouveau fichier de la partition de la plateforme, puis vide le constructeur.
+    Retourne le nombre d'offres écrites.
+    """
+    count = len(builder)
+    if count == 0:
+        logging.info("Aucune offre à enregistrer.")
+        return 0
+    table = pa.Table.from_batches([builder.to_record_batch()])
+    pq.write_to_dataset(
+        table,
+        root_path=dataset_dir,
+        partition_cols=["pfid"],
+        basename_template=f"part-{time.time_ns()}-{os.getpid()}-{{i}}.parquet",
+    )
+    builder.clear()
+    logging.info(f"{count} offres {builder.pfid} ajoutées au dataset '{dataset_dir}'.")
+    if dataset_dir == OFFERS_DATASET:
+        publish_batch(table)
+    if len(partition_parts(builder.pfid, dataset_dir)) > COMPACT_THRESHOLD:
+        compact_partition(builder.pfid, dataset_dir)
+    return count
+
+def partition_dir(pfid, dataset_dir=OFFERS_DATASET):
+    return os.path.join(dataset_dir, f"pfid={pfid}")
+
+def partition_parts(pfid, dataset_dir=OFFERS_DATASET):
+    """Fichiers visibles d'une partition (les noms préfixés par '_' ou '.' sont en cours d'écriture)."""
+    return sorted(
+        path for path in glob.glob(os.path.join(partition_dir(pfid, dataset_dir), "*.parquet"))
+        if not os.path.basename(path).startswith(("_", "."))
+    )
+
+def compact_partition(pfid, dataset_dir=OFFERS_DATASET):
+    """Regroupe tous les fichiers d'une plateforme en un seul. Retourne le nombre de fichiers regroupés."""
+    parts = partition_parts(pfid, dataset_dir)
+    if len(parts) < 2:
+        return 0
+    table = ds.dataset(parts, format="parquet").to_table()
+    compacted = os.path.join(partition_dir(pfid, dataset_dir), f"compacted-{time.time_ns()}.parquet")
+    # Les fichiers préfixés par '_' sont ignorés par les lecteurs du dataset pendant l'écriture
+    tmp_file = os.path.join(partition_dir(pfid, dataset_dir), "_compacting.tmp")
+    pq.write_table(table, tmp_file)
+    os.replace(tmp_file, compacted)
+    for part in parts:
+        os.remove(part)
+    logging.info(f"{len(parts)} fichiers {pfid} regroupés dans {compacted}.")
+    return len(parts)
+
+def read_offers(dataset_dir=OFFERS_DATASET, filter_expr=None, columns=None):
+    """Lit le dataset des offres (toutes plateformes) en table Arrow."""
+    partitioning = ds.HivePartitioning.discover(infer_dictionary=True)
+    dataset = ds.dataset(dataset_dir, format="parquet", partitioning=partitioning)
+    return dataset.to_table(filter=filter_expr, columns=columns)
+
+def value_type(field_type):
+    return field_type.value_type if pa.types.is_dictionary(field_type) else field_type
+
+def offers_filter(pfids=None, idsmartphones=None, sellers=None, start=None, end=None):
+    """
+    Expression de filtre sur le dataset des offres (None si aucun filtre).
+    start / end sont des datetime locaux, comme les horodatages enregistrés (to_epoch).
+    """
+    conditions = []
+    if pfids:
+        conditions.append(ds.field("pfid").isin(list(pfids)))
+    if idsmartphones:
+        conditions.append(ds.field("idsmartphone").isin(list(idsmartphones)))
+    if sellers:
+        conditions.append(ds.field("seller").isin(list(sellers)))
+    if start is not None:
+        conditions.append(ds.field("timestamp") >= to_epoch(start))
+    if end is not None:
+        conditions.append(ds.field("timestamp") <= to_epoch(end))
+    return _combine(conditions)
+
+def legacy_offers_filter(pfid, idsmartphones=None, sellers=None, start=None, end=None):
+    """
+    Même filtre sur un ancien fichier Parquet : les horodatages y sont des textes au format de la plateforme
+    (TIMESTAMP_FORMATS), tous triables, comparés directement aux bornes formatées de la même façon.
+    """
+    conditions = []
+    if idsmartphones:
+        conditions.append(ds.field("idsmartphone").isin(list(idsmartphones)))
+    if sellers:
+        conditions.append(ds.field("seller").isin(list(sellers)))
+    if start is not None:
+        conditions.append(ds.field("timestamp") >= start.strftime(TIMESTAMP_FORMATS[pfid]))
+    if end is not None:
+        conditions.append(ds.field("timestamp") <= end.strftime(TIMESTAMP_FORMATS[pfid]))
+    return _combine(conditions)
+
+def write_legacy_superseded(pfid, start, end, dataset_dir=OFFERS_DATASET):
+    """Enregistre que la partition 'pfid' remplace les offres de son ancien fichier entre start et end (epoch)."""
+    with open(os.path.join(partition_dir(pfid, dataset_dir), LEGACY_SUPERSEDED), "w") as marker:
+        json.dump({"start": int(start), "end": int(end)}, marker)
+
+def legacy_superseded_filter(pfid, dataset_dir=OFFERS_DATASET):
+    """Filtre écartant de l'ancien fichier de 'pfid' les offres de la période reconstruite (None si aucune)."""
+    path = os.path.join(partition_dir(pfid, dataset_dir), LEGACY_SUPERSEDED)
+    if not os.path.exists(path):
+        return None
+    with open(path) as marker:
+        period = json.load(marker)
+    # Horodatages des anciens fichiers en heure locale, au format de la plateforme (comme local_epoch)
+    start, end = (datetime.fromtimestamp(period[bound]).strftime(TIMESTAMP_FORMATS[pfid]) for bound in ("start", "end"))
+    return ds.field("timestamp").is_null() | (ds.field("timestamp") < start) | (ds.field("timestamp") > end)
+
+def _combine(conditions):
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def legacy_projection(pfid, schema, price_column, columns):
+    """Expressions convertissant les colonnes d'un ancien fichier au schéma commun (prix en centimes)."""
+    projection = {}
+    for name in columns:
+        target = value_type(CANONICAL_SCHEMA.field(name).type)
+        source = price_column if name == "price" else name
+        if source not in schema.names:
+            projection[name] = pc.scalar(pa.scalar(None, target))
+        elif name in ("price", "shipcost"):
+            projection[name] = pc.round(pc.multiply(ds.field(source).cast(pa.float64()), 100)).cast(target)
+        elif name == "timestamp":
+            # Horodatage local sans fuseau : converti en epoch après lecture (local_epoch)
+            projection[name] = pc.strptime(ds.field(source), format=TIMESTAMP_FORMATS[pfid], unit="s", error_is_null=True)
+        else:
+            projection[name] = ds.field(source).cast(target)
+    return projection
+
+def local_epoch(timestamps):
+    """Horodatages locaux sans fuseau (pyarrow) -> secondes epoch, comme datetime.timestamp() dans to_epoch."""
+    local = timestamps.to_pandas().dt.tz_localize(tzlocal(), ambiguous="NaT", nonexistent="shift_forward")
+    epochs = local.dt.tz_convert("UTC").dt.tz_localize(None).astype("datetime64[s]").astype("int64")
+    return pa.array(epochs.where(local.notna(), None), pa.int64(), from_pandas=True)
+
+def local_datetime(epochs):
+    """Secondes epoch (Series pandas) -> horodatages locaux sans fuseau, convertis une fois par valeur distincte."""
+    codes, uniques = pd.factorize(epochs)
+    local = pd.to_datetime(uniques, unit="s", utc=True).tz_convert(tzlocal()).tz_localize(None)
+    return pd.Series(local.take(codes), index=epochs.index)
+
+def scan_offers(columns, pfids=None, idsmartphones=None, sellers=None, start=None, end=None,
+                dataset_dir=OFFERS_DATASET, legacy=True):
+    """
+    Lit les offres de toutes les sources (dataset commun et anciens fichiers par plateforme) en une table Arrow
+    au schéma commun (colonnes 'columns', dictionnaires décodés). Seules les colonnes demandées sont lues et les filtres
+    sont appliqués à la lecture : partitions pfid écartées, groupes de lignes écartés selon leurs statistiques.
+    """
+    columns = list(columns)
+    schema = pa.schema([(name, value_type(CANONICAL_SCHEMA.field(name).type)) for name in columns])
+    tables = []
+
+    if os.path.isdir(dataset_dir):
+        dataset = ds.dataset(dataset_dir, format="parquet", partitioning=ds.HivePartitioning.discover(infer_dictionary=True))
+        projection = {name: ds.field(name).cast(schema.field(name).type) for name in columns}
+        tables.append(dataset.to_table(
+            columns=projection, filter=offers_filter(pfids, idsmartphones, sellers, start, end)
+        ))
+
+    for pfid, (path, price_column) in LEGACY_OFFER_FILES.items() if legacy else ():
+        if (pfids and pfid not in pfids) or not os.path.exists(path):
+            continue
+        conditions = [legacy_offers_filter(pfid, idsmartphones, sellers, start, end), legacy_superseded_filter(pfid, dataset_dir)]
+        dataset = ds.dataset(path, format="parquet")
+        table = dataset.to_table(
+            columns=legacy_projection(pfid, dataset.schema, price_column, columns),
+            filter=_combine([condition for condition in conditions if condition is not None]),
+        )
+        if "timestamp" in columns:
+            table = table.set_column(table.schema.get_field_index("timestamp"), "timestamp",
+                                     local_epoch(table["timestamp"]))
+        tables.append(table.cast(schema))
+
+    return pa.concat_tables(tables) if tables else schema.empty_table()
@@ -0,0 +1,217 @@
+"""
+Instantané Arrow IPC des offres partagé par les tableaux de bord
+----------------------------------------------------------------
+
+Chaque processus Dash relisait le dataset Parquet et gardait sa propre copie pandas des offres : avec plusieurs
+workers gunicorn, la mémoire était multipliée d'autant et chaque worker redécodait le Parquet au démarrage.
+
+Les scrapers publient désormais, après chaque écriture dans le dataset (save_offers), un instantané versionné de la table des offres
+(colonnes SNAPSHOT_COLUMNS, schéma commun, vendeur/plateforme/type d'offre encodés en dictionnaire) au format
+Arrow IPC (Feather v2) non compressé, dans SNAPSHOT_DIR :
+- un instantané est une liste de segments (fichiers .arrow) décrite par MANIFEST : version, segments et fichiers
+  sources couverts (avec leur date de modification) ;
+- publish_snapshot() n'écrit qu'un segment pour les fichiers du dataset apparus depuis la version précédente ;
+  au-delà de MAX_SEGMENTS, les petits segments sont regroupés en un seul (sans relire le Parquet) ;
+  si un fichier couvert a été modifié ou supprimé (compact_partition, migration), l'instantané est reconstruit ;
+- les segments et le manifeste sont écrits sous un nom temporaire puis renommés (os.replace) : un lecteur voit
+  l'ancienne version ou la nouvelle, jamais un fichier incomplet. Les publications concurrentes (scrapers parallèles)
+  sont sérialisées par un verrou de fichier.
+
+SnapshotReader (côté tableau de bord) mappe les segments en mémoire (pa.memory_map) : les données ne sont pas copiées,
+tous les workers partagent les mêmes pages du cache système, et le démarrage ne décode plus rien.
+refresh() passe à la nouvelle version quand le manifeste change, par une seule affectation (version, table).
+
+Utilisation en ligne de commande (reconstruction complète, ex : après une migration) :
+    python offer_snapshot.py
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.ipc as ipc
+
+from offer_records import (
+    CANONICAL_SCHEMA, LEGACY_OFFER_FILES, OFFERS_DATASET, offers_filter, scan_offers, value_type, write_offers,
+)
+
+# CONSTANTS
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "offers_snapshot")
+MANIFEST = "manifest.json"
+LOCK_FILE = "_publish.lock"
+SNAPSHOT_COLUMNS = ["pfid", "idsmartphone", "timestamp", "price", "shipcost", "seller", "rating", "offertype"]
+DICTIONARY_COLUMNS = ["pfid", "seller", "offertype"]
+MAX_SEGMENTS = 16  # Segments au-delà desquels les ajouts sont regroupés
+
+# FUNCTIONS
+def read_manifest(snapshot_dir=SNAPSHOT_DIR):
+    """Manifeste de la version courante, None si aucun instantané n'a été publié."""
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def write_manifest(manifest, snapshot_dir=SNAPSHOT_DIR):
+    tmp_file = os.path.join(snapshot_dir, f"_{MANIFEST}.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_file, os.path.join(snapshot_dir, MANIFEST))
+
+def snapshot_sources(dataset_dir=OFFERS_DATASET):
+    """Fichiers sources (dataset et anciens fichiers par plateforme) -> date de modification (ns)."""
+    sources = {}
+    for root, _, files in os.walk(dataset_dir):
+        for name in files:
+            if name.endswith(".parquet") and not name.startswith(("_", ".")):
+                path = os.path.join(root, name)
+                sources[os.path.relpath(path, dataset_dir)] = os.stat(path).st_mtime_ns
+    for path, _ in LEGACY_OFFER_FILES.values():
+        if os.path.exists(path):
+            sources[path] = os.stat(path).st_mtime_ns
+    return sources
+
+def encode_table(table):
+    """Colonnes répétitives encodées en dictionnaire, un seul dictionnaire par colonne (requis par le format IPC)."""
+    for name in DICTIONARY_COLUMNS:
+        index = table.schema.get_field_index(name)
+        if index >= 0 and not pa.types.is_dictionary(table.schema.field(name).type):
+            table = table.set_column(index, name, table[name].dictionary_encode())
+    return table.unify_dictionaries().combine_chunks()
+
+def write_segment(table, version, snapshot_dir=SNAPSHOT_DIR):
+    """Écrit un segment Arrow IPC non compressé (mappable sans copie). Retourne son nom."""
+    table = encode_table(table)
+    name = f"offers-{version}.arrow"
+    tmp_file = os.path.join(snapshot_dir, f"_{name}.tmp")
+    with ipc.new_file(tmp_file, table.schema, options=ipc.IpcWriteOptions(compression=None)) as writer:
+        writer.write_table(table)
+    os.replace(tmp_file, os.path.join(snapshot_dir, name))
+    return name
+
+def map_segment(name, snapshot_dir=SNAPSHOT_DIR):
+    """Table d'un segment, mappée en mémoire (les données restent dans le cache système)."""
+    with pa.memory_map(os.path.join(snapshot_dir, name)) as source:
+        return ipc.open_file(source).read_all()
+
+def read_dataset_files(files, dataset_dir=OFFERS_DATASET):
+    """Offres des fichiers 'files' du dataset (chemins relatifs), colonnes SNAPSHOT_COLUMNS."""
+    dataset = ds.dataset(
+        [os.path.join(dataset_dir, name) for name in files], format="parquet",
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True), partition_base_dir=dataset_dir,
+    )
+    projection = {name: ds.field(name).cast(value_type(CANONICAL_SCHEMA.field(name).type)) for name in SNAPSHOT_COLUMNS}
+    return dataset.to_table(columns=projection)
+
+def _publish(dataset_dir, snapshot_dir):
+    manifest = read_manifest(snapshot_dir)
+    sources = snapshot_sources(dataset_dir)
+    version = time.time_ns()
+    covered = manifest["sources"] if manifest else {}
+
+    if manifest and all(sources.get(path) == mtime for path, mtime in covered.items()):
+        new_files = sorted(path for path in sources if path not in covered)
+        if not new_files:
+            return manifest["version"]
+        segments = manifest["segments"] + [write_segment(read_dataset_files(new_files, dataset_dir), version, snapshot_dir)]
+        if len(segments) > MAX_SEGMENTS:
+            # Le premier segment (reconstruction complète) est gardé, les ajouts suivants sont regroupés
+            appended = pa.concat_tables([map_segment(name, snapshot_dir) for name in segments[1:]])
+            segments = [segments[0], write_segment(appended, f"{version}-merged", snapshot_dir)]
+        logging.info(f"Instantané des offres : {len(new_files)} fichiers ajoutés (version {version}).")
+    else:
+        segments = [write_segment(scan_offers(SNAPSHOT_COLUMNS, dataset_dir=dataset_dir), version, snapshot_dir)]
+        logging.info(f"Instantané des offres reconstruit (version {version}).")
+
+    write_manifest({"version": version, "segments": segments, "sources": sources}, snapshot_dir)
+    # Les lecteurs ayant mappé une ancienne version gardent l'accès à ses pages après la suppression
+    for name in os.listdir(snapshot_dir):
+        if name.startswith("offers-") and name not in segments:
+            os.remove(os.path.join(snapshot_dir, name))
+    return version
+
+def publish_snapshot(dataset_dir=OFFERS_DATASET, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Publie une nouvelle version de l'instantané si le dataset a changé. Retourne la version courante, None en cas
+    d'erreur (l'instantané n'est qu'une copie de lecture : son échec n'interrompt pas le scraping).
+    """
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        with open(os.path.join(snapshot_dir, LOCK_FILE), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            return _publish(dataset_dir, snapshot_dir)
+    except Exception as e:
+        logging.error(f"Publication de l'instantané des offres impossible : {e}")
+        return None
+
+def save_offers(builder, dataset_dir=OFFERS_DATASET, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Écrit les offres accumulées par un scraper (write_offers) et publie l'instantané une seule fois pour tout le lot.
+    Retourne le nombre d'offres écrites ; si l'écriture échoue, les offres restent dans le lot.
+    """
+    count = write_offers(builder, dataset_dir)
+    if count and dataset_dir == OFFERS_DATASET:
+        publish_snapshot(dataset_dir, snapshot_dir)
+    return count
+
+def rebuild_snapshot(dataset_dir=OFFERS_DATASET, snapshot_dir=SNAPSHOT_DIR):
+    """Force une reconstruction complète à la prochaine publication, puis publie."""
+    manifest = read_manifest(snapshot_dir)
+    if manifest:
+        write_manifest({**manifest, "sources": {}}, snapshot_dir)
+    return publish_snapshot(dataset_dir, snapshot_dir)
+
+class SnapshotReader:
+    """Accès en lecture à la dernière version publiée de l'instantané, mappée en mémoire."""
+
+    def __init__(self, snapshot_dir=SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+        self._current = (None, None)
+        self._manifest_mtime = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """Passe à la dernière version publiée si le manifeste a changé. Retourne (version, table)."""
+        try:
+            mtime = os.stat(os.path.join(self.snapshot_dir, MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            return self._current
+        if mtime == self._manifest_mtime:
+            return self._current
+        with self._lock:
+            for _ in range(3):  # Un segment peut être supprimé entre la lecture du manifeste et son ouverture
+                manifest = read_manifest(self.snapshot_dir)
+                if manifest is None or manifest["version"] == self._current[0]:
+                    break
+                try:
+                    table = pa.concat_tables([map_segment(name, self.snapshot_dir) for name in manifest["segments"]])
+                except FileNotFoundError:
+                    continue
+                self._current = (manifest["version"], table)
+                break
+            self._manifest_mtime = mtime
+        return self._current
+
+    @property
+    def version(self):
+        return self.refresh()[0]
+
+    def scan(self, columns, pfids=None, idsmartphones=None, sellers=None, start=None, end=None):
+        """
+        Même résultat que offer_records.scan_offers (dictionnaires décodés) lu dans l'instantané,
+        None si aucun instantané n'est publié ou si une colonne demandée n'y figure pas.
+        """
+        _, table = self.refresh()
+        if table is None or not set(columns) <= set(table.schema.names):
+            return None
+        projection = {name: ds.field(name).cast(value_type(CANONICAL_SCHEMA.field(name).type)) for name in columns}
+        return ds.dataset(table).to_table(columns=projection, filter=offers_filter(pfids, idsmartphones, sellers, start, end))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    rebuild_snapshot()
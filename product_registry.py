@@ -0,0 +1,235 @@
+"""
+Registre des produits suivis et de leurs identifiants sur chaque plateforme
+---------------------------------------------------------------------------
+
+Chaque plateforme identifie un produit à sa façon : pid Rakuten (extract_pid_cid), ASIN Amazon, identifiant
+'a19813597' FNAC, EAN dans l'URL ou la recherche Leclerc/Carrefour, codic Darty, référence Cdiscount
+('ip16512black'). Les correspondances avec l'identifiant commun 'idsmartphone' étaient refaites au chargement
+dans chaque script (colonnes de ID_EXCEL.xlsx, feuilles de lien.xlsx, jointure sur lien.csv dans le visualiseur).
+
+Ce module construit une seule fois, à partir de ID_EXCEL.xlsx et lien.xlsx, un index en mémoire :
+- (pfid, clé plateforme) -> idsmartphone, consulté en O(1) par resolve() et resolve_url() ; une clé partagée par
+  plusieurs téléphones (même page dans les fichiers) les garde tous (resolve_all(), products(), tracked()),
+  resolve() retourne le premier enregistré ;
+- idsmartphone -> nom du téléphone (names) ;
+- pfid -> liste ordonnée (idsmartphone, clé, URL) des produits suivis sur la plateforme (products()).
+
+Les scrapers prennent la liste des produits à suivre dans tracked() : une entrée par page, avec tous ses idsmartphone.
+Une page partagée n'est scrapée qu'une fois et ses offres sont enregistrées pour chacun de ses téléphones.
+
+Les clés sont normalisées par platform_key(), qu'on lui donne la clé elle-même ou une URL produit.
+Une URL dont aucune clé ne peut être extraite (ex : recherche Rakuten sans pid) sert elle-même de clé (product_key()) :
+le produit reste suivi.
+Les pfid sont ceux du dataset des offres (offer_records, migrate_legacy_csv).
+"""
+
+import logging
+import os
+import re
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+# CONSTANTS
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ID_EXCEL_FILE = os.path.join(BASE_DIR, "ID_EXCEL.xlsx")
+LIEN_FILE = os.path.join(BASE_DIR, "lien.xlsx")
+ID_EXCEL_SKIPROWS = 7
+ID_EXCEL_NAME_COLUMN = 1
+ID_EXCEL_ID_COLUMN = 2
+
+# Colonnes (EAN, URL) de chaque plateforme dans ID_EXCEL.xlsx (None : pas de colonne EAN)
+ID_EXCEL_COLUMNS = {
+    "LECL": (4, 5),
+    "CARR": (6, 7),
+    "DART": (8, 9),
+    "FNAC": (10, 11),
+    "CDIS": (None, 12),
+    "RAK": (13, 14),
+    "AMAZ": (15, 16),
+}
+# Feuilles de lien.xlsx (Phone, ID, Link, Link_ID[, idsmartphone])
+LIEN_SHEETS = {
+    "FNAC": "FNAC",
+    "DART": "DARTY",
+    "AMAZ": "AMAZON",
+}
+
+# Extraction de la clé plateforme depuis une URL produit
+URL_KEY_PATTERNS = {
+    "LECL": re.compile(r"(\d{13})(?:[/?#]|$)"),
+    "CARR": re.compile(r"(\d{13})(?:[/?#]|$)"),
+    "DART": re.compile(r"codic=(\d+)|/([^/?#]+)\.html"),
+    "FNAC": re.compile(r"/a(\d+)(?:[/?#]|$)"),
+    "CDIS": re.compile(r"/f-\d+-([^/?#.]+)\.html"),
+    "AMAZ": re.compile(r"/(?:dp|gp/product)/([A-Z0-9]{10})"),
+}
+
+# Registre par défaut du processus, pour get_registry()
+_REGISTRY = None
+
+# FUNCTIONS
+def normalize_ean(value):
+    """EAN sur 13 chiffres ('195949823763', 195949823763.0 -> '0195949823763'), None si ce n'en est pas un."""
+    if value is None or pd.isna(value):
+        return None
+    value = str(value).strip()
+    if value.endswith(".0"):
+        value = value[:-2]
+    return value.zfill(13) if value.isdigit() and 8 <= len(value) <= 13 else None
+
+def platform_key(pfid, value):
+    """
+    Clé normalisée d'un produit sur une plateforme, à partir de la clé elle-même ou d'une URL produit :
+    pid Rakuten, ASIN Amazon, numéro FNAC sans le 'a', EAN Leclerc/Carrefour, codic ou page Darty, référence Cdiscount.
+    """
+    if value is None or pd.isna(value):
+        return None
+    value = str(value).strip()
+    if not value or value.lower().startswith("nd"):
+        return None
+
+    if "://" in value:
+        if pfid == "RAK":
+            return parse_qs(urlparse(value).query).get("pid", [None])[0]
+        pattern = URL_KEY_PATTERNS.get(pfid)
+        match = pattern.search(value) if pattern else None
+        if match is None:
+            return None
+        return platform_key(pfid, next(group for group in match.groups() if group))
+
+    if pfid in ("LECL", "CARR"):
+        return normalize_ean(value)
+    if pfid == "FNAC":
+        return value.lstrip("a")
+    if pfid == "AMAZ":
+        return value.upper()
+    if pfid == "DART" and value.endswith(".0"):
+        return value[:-2]
+    return value.lower() if pfid in ("CDIS", "DART") else value
+
+def product_key(pfid, key=None, url=None):
+    """Clé d'un produit enregistré : clé plateforme, sinon celle de l'URL, sinon l'URL elle-même."""
+    found = platform_key(pfid, key) or platform_key(pfid, url)
+    if found is None and url is not None and not pd.isna(url) and "://" in str(url):
+        return str(url).strip()
+    return found
+
+class ProductRegistry:
+    """Index en mémoire (pfid, clé plateforme) -> idsmartphone, et noms des téléphones."""
+    __slots__ = ("names", "_keys", "_products")
+
+    def __init__(self):
+        self.names = {}
+        self._keys = {}
+        self._products = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, pfid, idsmartphone, key=None, url=None):
+        """Enregistre un produit d'une plateforme, par sa clé et/ou son URL. Retourne la clé retenue."""
+        key = product_key(pfid, key, url)
+        if key is None:
+            return None
+        owners = self._keys.setdefault((pfid, key), [])
+        if idsmartphone not in owners:
+            owners.append(idsmartphone)
+            if len(owners) > 1:
+                logging.warning(f"Clé {pfid} '{key}' partagée par {', '.join(owners)} : offres enregistrées pour chacun "
+                                f"(tracked()), resolve() retourne {owners[0]}.")
+        products = self._products.setdefault(pfid, {})
+        if (idsmartphone, key) not in products or url:
+            products[(idsmartphone, key)] = url
+        return key
+
+    def resolve(self, pfid, key):
+        """idsmartphone du produit de clé 'key' sur la plateforme (None si inconnu, le premier si la clé est partagée)."""
+        owners = self.resolve_all(pfid, key)
+        return owners[0] if owners else None
+
+    def resolve_all(self, pfid, key):
+        """Tous les idsmartphone associés à la clé 'key' sur la plateforme."""
+        return tuple(self._keys.get((pfid, platform_key(pfid, key)), ()))
+
+    def resolve_url(self, pfid, url):
+        owners = self._keys.get((pfid, product_key(pfid, url=url)), ())
+        return owners[0] if owners else None
+
+    def name(self, idsmartphone):
+        return self.names.get(idsmartphone)
+
+    def products(self, pfid):
+        """Liste (idsmartphone, clé, URL) des produits suivis sur la plateforme, dans l'ordre des fichiers."""
+        return [(idsmartphone, key, url) for (idsmartphone, key), url in self._products.get(pfid, {}).items()]
+
+    def tracked(self, pfid):
+        """
+        Pages à scraper sur la plateforme, une par clé : liste ordonnée (clé, URL, idsmartphones).
+        Une clé partagée par plusieurs téléphones n'apparaît qu'une fois, avec tous ses idsmartphone.
+        """
+        pages = {}
+        for idsmartphone, key, url in self.products(pfid):
+            page = pages.setdefault(key, [key, url, []])
+            page[1] = page[1] or url
+            page[2].append(idsmartphone)
+        return [(key, url, tuple(idsmartphones)) for key, url, idsmartphones in pages.values()]
+
+def load_id_excel(registry, path=ID_EXCEL_FILE):
+    data = pd.read_excel(path, skiprows=ID_EXCEL_SKIPROWS, header=None, dtype=str)
+    for row in data.itertuples(index=False):
+        idsmartphone = row[ID_EXCEL_ID_COLUMN]
+        if pd.isna(idsmartphone):
+            continue
+        idsmartphone = idsmartphone.strip()
+        if not pd.isna(row[ID_EXCEL_NAME_COLUMN]):
+            registry.names.setdefault(idsmartphone, row[ID_EXCEL_NAME_COLUMN].strip())
+        for pfid, (ean_column, url_column) in ID_EXCEL_COLUMNS.items():
+            url = row[url_column] if url_column < len(row) and not pd.isna(row[url_column]) else None
+            url = url if url and "://" in url else None
+            if pfid in ("LECL", "CARR"):
+                registry.add(pfid, idsmartphone, row[ean_column], url)
+            elif url:
+                registry.add(pfid, idsmartphone, url=url)
+
+def load_lien(registry, path=LIEN_FILE):
+    """Ajoute les liens suivis de lien.xlsx. Sans colonne idsmartphone (feuille DARTY), le nom du téléphone sert de clé."""
+    ids_by_name = {name.lower(): idsmartphone for idsmartphone, name in registry.names.items()}
+    sheets = pd.read_excel(path, sheet_name=list(LIEN_SHEETS.values()), dtype=str)
+    for pfid, sheet in LIEN_SHEETS.items():
+        for row in sheets[sheet].to_dict("records"):
+            idsmartphone = row.get("idsmartphone")
+            if pd.isna(idsmartphone) and not pd.isna(row.get("Phone")):
+                idsmartphone = ids_by_name.get(row["Phone"].strip().lower())
+            if idsmartphone is None or pd.isna(idsmartphone):
+                continue
+            link = row.get("Link") if not pd.isna(row.get("Link")) else None
+            registry.add(pfid, idsmartphone.strip(), row.get("Link_ID"), link)
+
+def load_registry(id_excel_file=ID_EXCEL_FILE, lien_file=LIEN_FILE):
+    registry = ProductRegistry()
+    for loader, path in ((load_id_excel, id_excel_file), (load_lien, lien_file)):
+        try:
+            loader(registry, path)
+        except Exception as e:
+            logging.error(f"Lecture de {path} impossible : {e}")
+    logging.info(f"Registre produits : {len(registry)} téléphones, {len(registry._keys)} clés plateformes.")
+    return registry
+
+def tracked_keys(pfid, reload=False):
+    """Clés des produits suivis sur la plateforme (ex : EAN Leclerc/Carrefour), sans doublon, dans l'ordre des fichiers."""
+    return [key for key, _, _ in get_registry(reload).tracked(pfid)]
+
+def get_registry(reload=False):
+    """Registre par défaut du processus, chargé au premier appel."""
+    global _REGISTRY
+    if _REGISTRY is None or reload:
+        _REGISTRY = load_registry()
+    return _REGISTRY
+
+
+if __name__ == "__main__":
+    registry = get_registry()
+    for pfid in ID_EXCEL_COLUMNS:
+        for idsmartphone, key, url in registry.products(pfid):
+            print(f"{pfid}\t{idsmartphone}\t{registry.name(idsmartphone)}\t{key}")
@@ -1,5 +1,6 @@
 import csv
 import os
+import sys
 import time
 from datetime import datetime
 from bs4 import BeautifulSoup
@@ -10,6 +11,13 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from browser_setup import configure_options, enable_resource_blocking
+from browser_waits import wait_until_ready, wait_after_click, wait_stats_summary
+from sharded_runner import run_sharded
+from url_cache import open_url_cache, load_cached_product
+from session_state import establish_session
+from snapshot_store import snapshot_page
+from product_registry import tracked_keys
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 import subprocess
@@ -34,6 +42,10 @@ def start_xvfb():
 
 
 URL = "https://www.carrefour.fr/"
+CSV_FILE = "/home/scraping/algo_scraping/scraping_carrefour.csv"
+
+# Produits suivis : EAN Carrefour du registre produits (product_registry, ID_EXCEL.xlsx)
+PFID = "CARR"
 
 HTML_SELECTORS = {
     "accept_condition": "onetrust-accept-btn-handler",
@@ -54,7 +66,7 @@ HTML_SELECTORS = {
 
 def accept_condition(driver):
     driver.get(URL)
-    time.sleep(5)
+    wait_until_ready(driver, (By.ID, HTML_SELECTORS["accept_condition"]), timeout=15, fallback=5, label="carrefour_accept_condition")
     try:
         WebDriverWait(driver, 15).until(
             EC.element_to_be_clickable((By.ID, HTML_SELECTORS["accept_condition"]))
@@ -128,9 +140,10 @@ def get_product_url(driver):
         product_link = WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.CLASS_NAME, HTML_SELECTORS["product"]))
         )
+        previous_url = driver.current_url
         product_link.click()
-        time.sleep(2)
-        return driver.current_url
+        return wait_after_click(driver, previous_url, (By.CLASS_NAME, "product-title__title"),
+                                fallback=2, label="carrefour_product_click")
     except Exception as e:
         print(f"Erreur lors de la récupération du produit: {e}")
         return None
@@ -158,11 +171,11 @@ def scrape_product(driver, product_url):
 def click_more_offers(driver):
     try:
         print("Attempting to click 'More Offers' button...")
-        time.sleep(2)
+        wait_until_ready(driver, (By.XPATH, HTML_SELECTORS["more_offers_button"]), timeout=15, fallback=3,
+                         label="carrefour_more_offers", condition=EC.element_to_be_clickable)
         more_offers_button = WebDriverWait(driver, 15).until(
             EC.element_to_be_clickable((By.XPATH, HTML_SELECTORS["more_offers_button"]))
         )
-        time.sleep(1)
         driver.execute_script("arguments[0].click();", more_offers_button)
         print("Successfully clicked 'More Offers' button.")
         WebDriverWait(driver, 15).until(
@@ -206,7 +219,7 @@ def fetch_data_from_side_panel(driver):
         print(f"Erreur lors de la récupération des données du panneau latéral : {e}")
         return []
 
-def write_combined_data_to_csv(data, sellers_data, csv_file="/home/scraping/algo_scraping/scraping_carrefour.csv"):
+def write_combined_data_to_csv(data, sellers_data, csv_file=CSV_FILE):
     if not data:
         print("Aucune donnée de produit à écrire.")
         return
@@ -223,46 +236,65 @@ def write_combined_data_to_csv(data, sellers_data, csv_file="/home/scraping/algo
             ])
         writer.writerow(["----------------------------------------------------------------------------------------------------------"])
 
-def main():
+def consent_flow(driver):
+    accept_condition(driver)
+    close_ad(driver)  # Fermer la publicité
+    answer_question(driver)  # Répondre à la question
+
+def find_product_url(driver, product_id):
+    search_product(driver, product_id)
+    return get_product_url(driver)
+
+def main(product_ids=None, user_data_dir="/tmp/chrome_user_data_vm", csv_file=CSV_FILE, headless=False):
+    if product_ids is None:
+        product_ids = tracked_keys(PFID)
     chrome_options = Options()
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")  # Empêcher les erreurs liées au GPU
     chrome_options.add_argument("--window-size=1920,1080")  # Simuler un affichage normal
-    chrome_options.add_argument("--user-data-dir=/tmp/chrome_user_data_vm")
+    chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
+    if headless:
+        chrome_options.add_argument("--headless=new")
     chrome_options.binary_location = '/usr/bin/google-chrome'
+    configure_options(chrome_options, "carrefour")
     service = Service('/usr/local/bin/chromedriver-linux64/chromedriver')
     driver = webdriver.Chrome(service=service, options=chrome_options)
-    
-    product_ids = ['0195949822865', '0195949821899', '0195949821899', '0195949724169', '0195949723216', '0195949722264']
-    #Removed 0195949773488 because no longer available.
+    enable_resource_blocking(driver, "carrefour")
 
-    accept_condition(driver)
-    close_ad(driver)  # Fermer la publicité
-    answer_question(driver)  # Répondre à la question
+    url_cache = open_url_cache()
+
+    establish_session(driver, "carrefour", URL, consent_flow, (By.ID, HTML_SELECTORS["accept_condition"]))
 
     for product_id in product_ids:
         try:
             print(f"Scraping product with ID: {product_id}")
-            search_product(driver, product_id)
-            product_url = get_product_url(driver)
-            data = scrape_product(driver, product_url)
+            data = load_cached_product(driver, url_cache, "carrefour", product_id, scrape_product, find_product_url)
             if data:
                 click_more_offers(driver)
                 sellers_data = fetch_data_from_side_panel(driver)
-                write_combined_data_to_csv(data, sellers_data)
+                snapshot_page("carrefour", product_id, driver.page_source)
+                write_combined_data_to_csv(data, sellers_data, csv_file)
         except Exception as e:
             print(f"Erreur pour le produit {product_id}: {e}")
 
+    for line in wait_stats_summary():
+        print(line)
+    url_cache.close()
     driver.quit()
 
 if __name__ == "__main__":
-    xvfb = start_xvfb()
-    try:
-        main()
-    finally:
-        xvfb.terminate()
-        xvfb.wait()
-        # Optionally remove the lock file if it still exists
-        if os.path.exists("/tmp/.X98-lock"):
-            os.remove("/tmp/.X98-lock")
+    # python scraping_carrefour.py [nb_workers] : au-delà de 1, la liste est répartie entre plusieurs processus
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    if workers > 1:
+        run_sharded(main, "carrefour", tracked_keys(PFID), CSV_FILE, workers)
+    else:
+        xvfb = start_xvfb()
+        try:
+            main()
+        finally:
+            xvfb.terminate()
+            xvfb.wait()
+            # Optionally remove the lock file if it still exists
+            if os.path.exists("/tmp/.X98-lock"):
+                os.remove("/tmp/.X98-lock")
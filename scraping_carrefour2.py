@@ -1,6 +1,5 @@
 import csv
 import os
-import time
 from datetime import datetime
 from bs4 import BeautifulSoup
 from selenium import webdriver
@@ -10,6 +9,12 @@ from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from browser_setup import configure_options, enable_resource_blocking
+from browser_waits import wait_until_ready, wait_after_click, wait_stats_summary
+from url_cache import open_url_cache, load_cached_product
+from session_state import establish_session
+from snapshot_store import snapshot_page
+from product_registry import tracked_keys
 from selenium.common.exceptions import TimeoutException
 import subprocess
 
@@ -28,6 +33,11 @@ HTML_SELECTORS = {
     "more_offers_button": "//button[contains(text(), 'offres')]",
     "side_panel": "c-modal__container c-modal__container--position-right",
 }
+# Moteur : "selenium" (un Chrome, produits traités un par un) ou "playwright" (contextes isolés en parallèle
+# dans un seul navigateur, voir scraping_carrefour2_playwright.py)
+ENGINE = "selenium"
+# Produits suivis : EAN Carrefour du registre produits (product_registry, ID_EXCEL.xlsx)
+PFID = "CARR"
 
 
 def start_xvfb():
@@ -67,46 +77,51 @@ def get_product_url(driver):
         product_link = WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.CLASS_NAME, HTML_SELECTORS["product"]))
         )
+        previous_url = driver.current_url
         product_link.click()
-        time.sleep(2)
-        return driver.current_url
+        return wait_after_click(driver, previous_url, (By.CLASS_NAME, "product-title__title"),
+                                fallback=2, label="carrefour2_product_click")
     except Exception as e:
         print(f"Erreur URL produit : {e}")
         return None
 
 
+def parse_product_page(html):
+    """Extrait le nom et l'offre principale du HTML d'une page produit (commun aux moteurs Selenium et Playwright)."""
+    soup = BeautifulSoup(html, 'lxml')
+
+    name_elem = soup.find('h1', class_=HTML_SELECTORS["name"])
+    if not name_elem:
+        print("Nom produit introuvable")
+        return None
+
+    seller_elem = soup.find('a', class_=HTML_SELECTORS["seller"])
+    price_elem = soup.find('p', class_=HTML_SELECTORS["price"])
+    cents_elem = soup.find('p', class_=HTML_SELECTORS["cents"])
+    delivery_elem = soup.find('p', class_=HTML_SELECTORS["delivery_info"])
+
+    main_offer = {
+        "seller": seller_elem.get_text(strip=True) if seller_elem else "Non spécifié",
+        "price": f"{price_elem.get_text(strip=True)}{cents_elem.get_text(strip=True)}€" if price_elem and cents_elem else "Non spécifié",
+        "delivery_info": delivery_elem.get_text(strip=True) if delivery_elem else "Non spécifié",
+        "seller_rating": "Non spécifié"
+    }
+
+    return {
+        "Platform": "Carrefour",
+        "name": name_elem.get_text(strip=True),
+        "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+        "main_offer": main_offer
+    }
+
+
 def scrape_product(driver, product_url):
     try:
         driver.get(product_url)
         WebDriverWait(driver, 15).until(
             EC.presence_of_element_located((By.CLASS_NAME, "product-title__title"))
         )
-        soup = BeautifulSoup(driver.page_source, 'lxml')
-
-        name_elem = soup.find('h1', class_=HTML_SELECTORS["name"])
-        if not name_elem:
-            print("Nom produit introuvable")
-            return None
-
-        seller_elem = soup.find('a', class_=HTML_SELECTORS["seller"])
-        price_elem = soup.find('p', class_=HTML_SELECTORS["price"])
-        cents_elem = soup.find('p', class_=HTML_SELECTORS["cents"])
-        delivery_elem = soup.find('p', class_=HTML_SELECTORS["delivery_info"])
-
-        main_offer = {
-            "seller": seller_elem.get_text(strip=True) if seller_elem else "Non spécifié",
-            "price": f"{price_elem.get_text(strip=True)}{cents_elem.get_text(strip=True)}€" if price_elem and cents_elem else "Non spécifié",
-            "delivery_info": delivery_elem.get_text(strip=True) if delivery_elem else "Non spécifié",
-            "seller_rating": "Non spécifié"
-        }
-
-        return {
-            "Platform": "Carrefour",
-            "name": name_elem.get_text(strip=True),
-            "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
-            "main_offer": main_offer
-        }
-
+        return parse_product_page(driver.page_source)
     except Exception as e:
         print(f"Erreur scraping produit : {e}")
         return None
@@ -114,7 +129,8 @@ def scrape_product(driver, product_url):
 
 def click_more_offers(driver):
     try:
-        time.sleep(2)
+        wait_until_ready(driver, (By.XPATH, HTML_SELECTORS["more_offers_button"]), timeout=15, fallback=2,
+                         label="carrefour2_more_offers", condition=EC.element_to_be_clickable)
         more_offers_button = WebDriverWait(driver, 15).until(
             EC.element_to_be_clickable((By.XPATH, HTML_SELECTORS["more_offers_button"]))
         )
@@ -128,33 +144,38 @@ def click_more_offers(driver):
     return None
 
 
+def parse_side_panel(html):
+    """Extrait les offres du panneau latéral à partir du HTML de la page produit."""
+    full_soup = BeautifulSoup(html, 'lxml')
+    side_panel = full_soup.find('div', class_=HTML_SELECTORS["side_panel"])
+    if not side_panel:
+        return []
+
+    sellers = side_panel.find_all('a', class_=HTML_SELECTORS["seller"])
+    delivery_infos = side_panel.find_all('p', class_=HTML_SELECTORS["delivery_info"])
+    prices = side_panel.find_all('p', class_=HTML_SELECTORS["price"])
+    cents = side_panel.find_all('p', class_=HTML_SELECTORS["cents"])
+    seller_ratings = side_panel.find_all('span', class_="rating-stars__slot c-text c-text--size-m c-text--style-p c-text--spacing-default")
+
+    data = []
+    for i, seller in enumerate(sellers):
+        euros = prices[i].get_text(strip=True).replace("€", "") if i < len(prices) else ""
+        centimes = cents[i].get_text(strip=True).replace("€", "") if i < len(cents) else ""
+        price_text = f"{euros}{centimes}€" if euros or centimes else "Non spécifié"
+
+        data.append({
+            "seller": seller.get_text(strip=True),
+            "delivery_info": delivery_infos[i].get_text(strip=True) if i < len(delivery_infos) else "Non spécifié",
+            "price": price_text,
+            "seller_rating": seller_ratings[i].get_text(strip=True) if i < len(seller_ratings) else "Non spécifié"
+        })
+
+    return data
+
+
 def fetch_data_from_side_panel(driver):
     try:
-        full_soup = BeautifulSoup(driver.page_source, 'lxml')
-        side_panel = full_soup.find('div', class_=HTML_SELECTORS["side_panel"])
-        if not side_panel:
-            return []
-
-        sellers = side_panel.find_all('a', class_=HTML_SELECTORS["seller"])
-        delivery_infos = side_panel.find_all('p', class_=HTML_SELECTORS["delivery_info"])
-        prices = side_panel.find_all('p', class_=HTML_SELECTORS["price"])
-        cents = side_panel.find_all('p', class_=HTML_SELECTORS["cents"])
-        seller_ratings = side_panel.find_all('span', class_="rating-stars__slot c-text c-text--size-m c-text--style-p c-text--spacing-default")
-
-        data = []
-        for i, seller in enumerate(sellers):
-            euros = prices[i].get_text(strip=True).replace("€", "") if i < len(prices) else ""
-            centimes = cents[i].get_text(strip=True).replace("€", "") if i < len(cents) else ""
-            price_text = f"{euros}{centimes}€" if euros or centimes else "Non spécifié"
-
-            data.append({
-                "seller": seller.get_text(strip=True),
-                "delivery_info": delivery_infos[i].get_text(strip=True) if i < len(delivery_infos) else "Non spécifié",
-                "price": price_text,
-                "seller_rating": seller_ratings[i].get_text(strip=True) if i < len(seller_ratings) else "Non spécifié"
-            })
-
-        return data
+        return parse_side_panel(driver.page_source)
     except Exception as e:
         print(f"Erreur scraping panel : {e}")
         return []
@@ -177,40 +198,56 @@ def write_combined_data_to_csv(data, sellers_data, csv_file="scraping_carrefour.
         writer.writerow(["-" * 100])
 
 
-def main():
+def find_product_url(driver, product_id):
+    search_product(driver, product_id)
+    return get_product_url(driver)
+
+def main(product_ids=None):
+    if product_ids is None:
+        product_ids = tracked_keys(PFID)
     chrome_options = Options()
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--window-size=1920,1080")
     chrome_options.binary_location = '/usr/bin/google-chrome'
     chrome_options.add_argument("--user-data-dir=/tmp/chrome_user_data_vm")
+    configure_options(chrome_options, "carrefour")
     service = Service('/usr/local/bin/chromedriver-linux64/chromedriver')
     driver = webdriver.Chrome(service=service, options=chrome_options)
+    enable_resource_blocking(driver, "carrefour")
 
-    product_ids = ['0195949822865', '0195949821899', '0195949724169']
+    url_cache = open_url_cache()
 
-    accept_condition(driver)
+    # Clé distincte de scraping_carrefour.py, dont le parcours ferme aussi la publicité et répond à la question d'accueil
+    establish_session(driver, "carrefour2", URL, accept_condition, (By.ID, HTML_SELECTORS["accept_condition"]))
 
     for product_id in product_ids:
         try:
             print(f"Scraping ID: {product_id}")
-            search_product(driver, product_id)
-            product_url = get_product_url(driver)
-            data = scrape_product(driver, product_url)
+            data = load_cached_product(driver, url_cache, "carrefour", product_id, scrape_product, find_product_url)
             if data:
                 click_more_offers(driver)
-                sellers_data = [data["main_offer"]] + fetch_data_from_side_panel(driver)
+                side_panel_offers = fetch_data_from_side_panel(driver)
+                snapshot_page("carrefour", product_id, driver.page_source)
+                sellers_data = [data["main_offer"]] + side_panel_offers
                 write_combined_data_to_csv(data, sellers_data)
         except Exception as e:
             print(f"Erreur produit {product_id} : {e}")
 
+    for line in wait_stats_summary():
+        print(line)
+    url_cache.close()
     driver.quit()
 
 
 if __name__ == "__main__":
     xvfb = start_xvfb()
     try:
-        main()
+        if ENGINE == "playwright":
+            from scraping_carrefour2_playwright import main as playwright_main
+            playwright_main()
+        else:
+            main()
     finally:
         xvfb.terminate()
         xvfb.wait()
@@ -0,0 +1,206 @@
+"""
+Moteur Playwright asynchrone pour scraping_carrefour2
+-----------------------------------------------------
+
+Le moteur Selenium de scraping_carrefour2 pilote un seul Chrome et traite les produits un par un.
+Ce moteur lance un seul navigateur Chromium et y ouvre MAX_CONTEXTS contextes isolés (cookies, cache et stockage
+séparés, comme des profils distincts), qui traitent la liste de produits en parallèle. Un contexte coûte quelques
+dizaines de Mo, contre plusieurs centaines pour un Chrome complet par worker (sharded_runner).
+
+Fonctionnement :
+- Le consentement cookies est accepté une seule fois ; l'état de stockage obtenu (cookies + localStorage)
+  est donné à chaque contexte à sa création.
+- Chaque contexte bloque les mêmes ressources que browser_setup (images, polices, médias, pubs, traceurs).
+- L'analyse du HTML, le cache d'URLs et l'écriture CSV sont ceux de scraping_carrefour2 : les sorties sont identiques.
+
+Utilisation :
+    python scraping_carrefour2_playwright.py [nombre de contextes]
+ou ENGINE = "playwright" dans scraping_carrefour2.py.
+Nécessite : pip install playwright
+"""
+
+import asyncio
+import sys
+import time
+from fnmatch import fnmatch
+
+from playwright.async_api import async_playwright
+
+from browser_setup import RESOURCE_BLOCKING_ENABLED, get_site_blocking, get_blocked_urls
+from url_cache import open_url_cache, lookup_url, store_url, invalidate_url
+from snapshot_store import snapshot_page
+from product_registry import tracked_keys
+from scraping_carrefour2 import (
+    URL, HTML_SELECTORS, PFID,
+    parse_product_page, parse_side_panel, write_combined_data_to_csv,
+)
+
+# CONSTANTS
+MAX_CONTEXTS = 4  # Contextes (pages) ouverts en parallèle dans le navigateur
+HEADLESS = False
+CHROME_PATH = '/usr/bin/google-chrome'
+CSV_FILE = "scraping_carrefour.csv"
+PAGE_TIMEOUT = 15000  # ms
+
+# FUNCTIONS
+async def block_resources(context, site="carrefour"):
+    """Bloque dans le contexte les types de ressources et les URLs configurés dans browser_setup."""
+    if not RESOURCE_BLOCKING_ENABLED:
+        return
+    resource_types = {resource_type.lower() for resource_type in get_site_blocking(site)["resource_types"]}
+    patterns = get_blocked_urls(site)
+
+    async def handle(route):
+        request = route.request
+        if request.resource_type in resource_types or any(fnmatch(request.url, pattern) for pattern in patterns):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", handle)
+
+async def accept_condition(page):
+    await page.goto(URL)
+    try:
+        await page.click(f"#{HTML_SELECTORS['accept_condition']}", timeout=PAGE_TIMEOUT)
+    except Exception as e:
+        print(f"Erreur accept condition : {e}")
+
+async def search_product(page, search_query):
+    try:
+        search_bar = page.locator(f"#{HTML_SELECTORS['search_bar']}")
+        await search_bar.click(timeout=10000)
+        await search_bar.fill(search_query)
+        await search_bar.press("Enter")
+    except Exception as e:
+        print(f"Erreur recherche : {e}")
+
+async def get_product_url(page):
+    try:
+        product_link = page.locator(f".{HTML_SELECTORS['product']}").first
+        await product_link.wait_for(timeout=10000)
+        previous_url = page.url
+        await product_link.click()
+        await page.wait_for_url(lambda url: url != previous_url, timeout=10000)
+        return page.url
+    except Exception as e:
+        print(f"Erreur URL produit : {e}")
+        return None
+
+async def scrape_product(page, product_url):
+    try:
+        response = await page.goto(product_url)
+        if response is not None and response.status >= 400:
+            print(f"Statut {response.status} pour {product_url}")
+            return None
+        await page.wait_for_selector(".product-title__title", timeout=PAGE_TIMEOUT)
+        return parse_product_page(await page.content())
+    except Exception as e:
+        print(f"Erreur scraping produit : {e}")
+        return None
+
+async def click_more_offers(page):
+    try:
+        more_offers_button = page.locator(f"xpath={HTML_SELECTORS['more_offers_button']}").first
+        await more_offers_button.wait_for(timeout=PAGE_TIMEOUT)
+        await more_offers_button.dispatch_event("click")
+        side_panel_selector = "." + ".".join(HTML_SELECTORS["side_panel"].split())
+        await page.wait_for_selector(side_panel_selector, timeout=PAGE_TIMEOUT)
+        await page.wait_for_load_state("networkidle", timeout=PAGE_TIMEOUT)
+        return page.url
+    except Exception as e:
+        print(f"Erreur bouton offres : {e}")
+    return None
+
+async def fetch_data_from_side_panel(page):
+    try:
+        return parse_side_panel(await page.content())
+    except Exception as e:
+        print(f"Erreur scraping panel : {e}")
+        return []
+
+async def load_product(page, url_cache, product_id):
+    """Page produit depuis l'URL du cache si possible, sinon par la recherche (version asynchrone de url_cache.load_cached_product)."""
+    cached = lookup_url(url_cache, "carrefour", product_id)
+    if cached:
+        data = await scrape_product(page, cached["product_url"])
+        if data:
+            return data
+        invalidate_url(url_cache, "carrefour", product_id)
+
+    if not page.url.startswith(URL):
+        await page.goto(URL)
+    await search_product(page, product_id)
+    product_url = await get_product_url(page)
+    if not product_url:
+        return None
+    data = await scrape_product(page, product_url)
+    if data:
+        store_url(url_cache, "carrefour", product_id, product_url, product_name=data["name"])
+    return data
+
+async def scrape_one(page, url_cache, product_id, csv_file):
+    try:
+        print(f"Scraping ID: {product_id}")
+        data = await load_product(page, url_cache, product_id)
+        if data:
+            await click_more_offers(page)
+            side_panel_offers = await fetch_data_from_side_panel(page)
+            snapshot_page("carrefour", product_id, await page.content())
+            write_combined_data_to_csv(data, [data["main_offer"]] + side_panel_offers, csv_file)
+    except Exception as e:
+        print(f"Erreur produit {product_id} : {e}")
+
+async def context_worker(browser, storage_state, queue, url_cache, csv_file):
+    """Un contexte isolé qui traite les produits de la file jusqu'à ce qu'elle soit vide."""
+    context = await browser.new_context(storage_state=storage_state, viewport={"width": 1920, "height": 1080})
+    await block_resources(context)
+    page = await context.new_page()
+    page.set_default_timeout(PAGE_TIMEOUT)
+    try:
+        while True:
+            try:
+                product_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await scrape_one(page, url_cache, product_id, csv_file)
+    finally:
+        await context.close()
+
+async def run(product_ids, contexts=MAX_CONTEXTS, csv_file=CSV_FILE, headless=HEADLESS):
+    start_time = time.perf_counter()
+    url_cache = open_url_cache()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(
+            headless=headless,
+            executable_path=CHROME_PATH,
+            args=["--no-sandbox", "--disable-dev-shm-usage"],
+        )
+        try:
+            # Consentement accepté une seule fois, état partagé par tous les contextes
+            consent_context = await browser.new_context()
+            await block_resources(consent_context)
+            await accept_condition(await consent_context.new_page())
+            storage_state = await consent_context.storage_state()
+            await consent_context.close()
+
+            queue = asyncio.Queue()
+            for product_id in product_ids:
+                queue.put_nowait(product_id)
+            workers = max(1, min(contexts, len(product_ids)))
+            await asyncio.gather(*(
+                context_worker(browser, storage_state, queue, url_cache, csv_file) for _ in range(workers)
+            ))
+            print(f"{len(product_ids)} produits traités en {time.perf_counter() - start_time:.1f}s avec {workers} contextes.")
+        finally:
+            await browser.close()
+            url_cache.close()
+
+def main(product_ids=None, contexts=MAX_CONTEXTS, csv_file=CSV_FILE, headless=HEADLESS):
+    if product_ids is None:
+        product_ids = tracked_keys(PFID)
+    asyncio.run(run(product_ids, contexts, csv_file, headless))
+
+
+if __name__ == "__main__":
+    main(contexts=int(sys.argv[1]) if len(sys.argv) > 1 else MAX_CONTEXTS)
@@ -1,5 +1,6 @@
 import csv
 import os
+import sys
 import time
 from datetime import datetime
 from bs4 import BeautifulSoup
@@ -11,13 +12,23 @@ from selenium.webdriver.chrome.service import Service
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from browser_setup import configure_options, enable_resource_blocking
+from browser_waits import wait_until_ready, wait_after_click, wait_stats_summary
+from sharded_runner import run_sharded, start_xvfb, stop_xvfb
+from url_cache import open_url_cache, lookup_url, store_url, invalidate_url, is_cached_page_valid
+from session_state import establish_session
+from snapshot_store import snapshot_page
+from product_registry import tracked_keys
 
 
-# Démarrer Xvfb sur l'écran virtuel :99 (ou un autre numéro)
-os.system("Xvfb :99 -screen 0 1920x1080x24 &")
-os.environ["DISPLAY"] = ":99"
+# Écran virtuel Xvfb utilisé en exécution simple (les workers parallèles ont chacun le leur)
+DISPLAY_NUMBER = 99
 
 URL = "https://www.e.leclerc/"
+CSV_FILE = "/home/scraping/algo-scraping/scraping_leclerc.csv"
+
+# Produits suivis : EAN Leclerc du registre produits (product_registry, ID_EXCEL.xlsx)
+PFID = "LECL"
 
 HTML_SELECTORS = {
     "accept_condition": "didomi-notice-agree-button",
@@ -36,7 +47,7 @@ HTML_SELECTORS = {
 
 def accept_condition(driver):
     driver.get(URL)
-    time.sleep(5)
+    wait_until_ready(driver, (By.ID, HTML_SELECTORS["accept_condition"]), timeout=15, fallback=5, label="leclerc_accept_condition")
     try:
         WebDriverWait(driver, 15).until(
             EC.element_to_be_clickable((By.ID, HTML_SELECTORS["accept_condition"]))
@@ -72,9 +83,9 @@ def get_product_url(driver):
         product_link = WebDriverWait(driver, 10).until(
             EC.element_to_be_clickable((By.CLASS_NAME, HTML_SELECTORS["product"]))
         )
+        previous_url = driver.current_url
         product_link.click()
-        time.sleep(2)
-        return driver.current_url
+        return wait_after_click(driver, previous_url, fallback=2, label="leclerc_product_click")
     except Exception as e:
         print(f"Erreur lors de la récupération du produit: {e}")
         return None
@@ -106,9 +117,9 @@ def click_more_offers(driver):
         )
         driver.execute_script("window.scrollBy(0, 1000);")
         time.sleep(1)
+        previous_url = driver.current_url
         more_offers_button.click()
-        time.sleep(2)
-        return driver.current_url
+        return wait_after_click(driver, previous_url, fallback=2, label="leclerc_more_offers_click")
     except TimeoutException:
         try:
             alternative_button = WebDriverWait(driver, 10).until(
@@ -117,13 +128,12 @@ def click_more_offers(driver):
             driver.execute_script("window.scrollBy(0, 1000);")
             time.sleep(1)
             alternative_button.click()
-            time.sleep(2)
             more_offers_button = WebDriverWait(driver, 10).until(
                 EC.visibility_of_element_located((By.XPATH, HTML_SELECTORS["more_offers_link"]))
             )
+            previous_url = driver.current_url
             more_offers_button.click()
-            time.sleep(2)
-            return driver.current_url
+            return wait_after_click(driver, previous_url, fallback=2, label="leclerc_more_offers_click")
         except Exception as e:
             print(f"Erreur lors de la tentative de clic sur l'alternative: {e}")
             return None
@@ -131,66 +141,94 @@ def click_more_offers(driver):
         print(f"Erreur lors du clic sur 'Consulter': {e}")
         return None
 
-def fetch_data_from_pages(driver, url, data_type):
-    if not url:
-        print(f"URL non valide pour récupérer {data_type}.")
-        return []
+def normalize_product_state(state_text):
+    if "NEUF" in state_text:
+        return "NEUF"
+    if state_text.startswith("OCCASION -"):
+        return state_text
+    return ""
 
-    fetched_data = []
-    seen_urls = set()
+def get_text(element):
+    return element.get_text(strip=True) if element else ""
 
-    while url and url not in seen_urls:
-        seen_urls.add(url)
-        try:
-            driver.get(url)
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "h1")))
-            soup = BeautifulSoup(driver.page_source, 'lxml')
-            if data_type == 'sellers':
-                sellers = soup.find_all('a', class_=HTML_SELECTORS["seller"])
-                delivery_fees = soup.find_all('span', class_=HTML_SELECTORS["delivery_fees"])
-                delivery_dates = soup.find_all('span', class_=HTML_SELECTORS["delivery_date"])
-                
-                product_state_elements = driver.find_elements(
-                    By.XPATH,
-                    "//app-product-detail-offers//app-product-offer-list-item//div/div[1]/p"
-                )
-                product_states = []
-                for elem in product_state_elements:
-                    state_text = elem.text.strip()
-                    if "NEUF" in state_text:
-                        product_states.append("NEUF")
-                    elif state_text.startswith("OCCASION -"):
-                        product_states.append(state_text)
-
-                for i in range(len(sellers)):
-                    product_state_text = product_states[i] if i < len(product_states) else ""
-                    print(f"Product State: {product_state_text}")
-                    fetched_data.append({
-                        "seller": sellers[i].get_text(strip=True) if i < len(sellers) else "",
-                        "delivery_fees": delivery_fees[i].get_text(strip=True) if i < len(delivery_fees) else "",
-                        "delivery_date": delivery_dates[i].get_text(strip=True) if i < len(delivery_dates) else "",
-                        "product_state": product_state_text
-                    })
-
-            elif data_type == 'prices':
-                prices = soup.find_all('div', class_=HTML_SELECTORS["price"])
-                currencies = soup.find_all('span', class_=HTML_SELECTORS["currency"])
-                cents = soup.find_all('span', class_=HTML_SELECTORS["cents"])
-
-                fetched_data = [
-                    f"{prices[i].get_text(strip=True)}.{cents[i].get_text(strip=True)} {currencies[i].get_text(strip=True)}"
-                    for i in range(min(len(prices), len(currencies), len(cents)))
-                ]
-
-            time.sleep(5)
-        except Exception as e:
-            print(f"Erreur lors de la récupération des {data_type}: {e}")
-            break
+def format_price(price, cents, currency):
+    return f"{get_text(price)}.{get_text(cents)} {get_text(currency)}"
+
+def get_seller(item):
+    """
+    Vendeur d'une offre : le lien vers sa boutique, ou pour les offres vendues par E.Leclerc (sans lien)
+    le texte 'Vendeur : ...', comme LECLERC.get_sellers.
+    """
+    seller = item.find('a', class_=HTML_SELECTORS["seller"])
+    if seller:
+        return get_text(seller)
+    shop_infos = item.select_one(".shop-infos")
+    if shop_infos and "Vendeur :" in get_text(shop_infos):
+        return get_text(shop_infos).replace("Vendeur :", "").strip()
+    return ""
+
+def extract_offer_rows(soup):
+    """
+    Extrait les offres complètes (prix, vendeur, frais et date de livraison, état) d'un instantané du DOM.
+    Chaque offre est lue dans son propre bloc 'app-product-offer-list-item', ce qui évite d'associer
+    des listes de prix et de vendeurs par leur index. Sans ces blocs, la page entière est lue comme avant.
+    """
+    offer_items = soup.find_all('app-product-offer-list-item')
+    rows = []
 
-    return fetched_data
+    if offer_items:
+        for item in offer_items:
+            seller = get_seller(item)
+            price = item.find('div', class_=HTML_SELECTORS["price"])
+            if not seller or not price:
+                continue
+            state = item.select_one("div > div:nth-of-type(1) > p")
+            rows.append({
+                "price": format_price(price, item.find('span', class_=HTML_SELECTORS["cents"]), item.find('span', class_=HTML_SELECTORS["currency"])),
+                "seller": seller,
+                "delivery_fees": get_text(item.find('span', class_=HTML_SELECTORS["delivery_fees"])),
+                "delivery_date": get_text(item.find('span', class_=HTML_SELECTORS["delivery_date"])),
+                "product_state": normalize_product_state(get_text(state))
+            })
+        return rows
 
+    sellers = soup.find_all('a', class_=HTML_SELECTORS["seller"])
+    delivery_fees = soup.find_all('span', class_=HTML_SELECTORS["delivery_fees"])
+    delivery_dates = soup.find_all('span', class_=HTML_SELECTORS["delivery_date"])
+    prices = soup.find_all('div', class_=HTML_SELECTORS["price"])
+    currencies = soup.find_all('span', class_=HTML_SELECTORS["currency"])
+    cents = soup.find_all('span', class_=HTML_SELECTORS["cents"])
 
-def write_combined_data_to_csv(data, sellers_data, prices, csv_file = "/home/scraping/algo-scraping/scraping_leclerc.csv"):
+    for i in range(min(len(sellers), len(prices), len(currencies), len(cents))):
+        rows.append({
+            "price": format_price(prices[i], cents[i], currencies[i]),
+            "seller": get_text(sellers[i]),
+            "delivery_fees": get_text(delivery_fees[i]) if i < len(delivery_fees) else "",
+            "delivery_date": get_text(delivery_dates[i]) if i < len(delivery_dates) else "",
+            "product_state": ""
+        })
+    return rows
+
+def fetch_offers_from_page(driver, url):
+    """
+    Charge la page des offres une seule fois, prend un unique instantané du DOM
+    et retourne les offres complètes (voir extract_offer_rows).
+    """
+    if not url:
+        print("URL non valide pour récupérer les offres.")
+        return []
+
+    try:
+        driver.get(url)
+        WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, "h1")))
+        wait_until_ready(driver, (By.TAG_NAME, "app-product-offer-list-item"), timeout=10, fallback=5, label="leclerc_offers_page")
+        soup = BeautifulSoup(driver.page_source, 'lxml')
+        return extract_offer_rows(soup)
+    except Exception as e:
+        print(f"Erreur lors de la récupération des offres: {e}")
+        return []
+
+def write_combined_data_to_csv(data, offers, csv_file=CSV_FILE):
     if not data:
         print("Aucune donnée de produit à écrire.")
         return
@@ -200,55 +238,95 @@ def write_combined_data_to_csv(data, sellers_data, prices, csv_file = "/home/scr
         if not file_exists:
             writer.writerow(["Platform", "Product Name", "Price", "Seller", "Delivery Fees", "Delivery Date", "Product State", "Timestamp"])
 
-        if sellers_data and prices:
-            min_length = min(len(sellers_data), len(prices))
-            for i in range(min_length):
-                writer.writerow([
-                    data["Platform"], data["name"], prices[i], sellers_data[i]["seller"],
-                    sellers_data[i]["delivery_fees"], sellers_data[i]["delivery_date"],
-                    sellers_data[i].get("product_state", ""), datetime.now().strftime("%d/%m/%Y %H:%M:%S")
-                ])
+        timestamp = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        for offer in offers:
+            writer.writerow([
+                data["Platform"], data["name"], offer["price"], offer["seller"],
+                offer["delivery_fees"], offer["delivery_date"],
+                offer.get("product_state", ""), timestamp
+            ])
         writer.writerow(["----------------------------------------------------------------------------------------------------------"])
 
-def main():
+def consent_flow(driver):
+    accept_condition(driver)
+    close_popup_if_present(driver)
+
+def resolve_product(driver, url_cache, product_code, use_cache=True):
+    """
+    Retourne (product_data, offers_url, from_cache) pour un EAN : depuis le cache si possible,
+    sinon par la recherche sur le site (le résultat est alors mis en cache).
+    """
+    cached = lookup_url(url_cache, "leclerc", product_code) if use_cache else None
+    if cached and cached["offers_url"] and cached["product_name"]:
+        product_data = {
+            "Platform": "E.Leclerc",
+            "name": cached["product_name"],
+            "timestamp": datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        }
+        return product_data, cached["offers_url"], True
+
+    search_product(driver, product_code)
+    product_url = get_product_url(driver)
+    if not product_url:
+        return None, None, False
+    product_data = scrape_product(driver, product_url)
+    if not product_data:
+        return None, None, False
+    more_offers = click_more_offers(driver)
+    if more_offers:
+        store_url(url_cache, "leclerc", product_code, product_url, more_offers, product_data["name"])
+    return product_data, more_offers, False
+
+def main(product_codes=None, user_data_dir="/tmp/chrome_user_data_vm", csv_file=CSV_FILE, headless=False):
+    if product_codes is None:
+        product_codes = tracked_keys(PFID)
     chrome_options = Options()
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
     chrome_options.add_argument("--disable-gpu")  # Empêcher les erreurs liées au GPU
     chrome_options.add_argument("--window-size=1920,1080")  # Simuler un affichage normal
-    chrome_options.add_argument("--user-data-dir=/tmp/chrome_user_data_vm")
+    chrome_options.add_argument(f"--user-data-dir={user_data_dir}")
+    if headless:
+        chrome_options.add_argument("--headless=new")
     chrome_options.binary_location = '/usr/bin/google-chrome'
+    configure_options(chrome_options, "leclerc")
     service = Service('/usr/local/bin/chromedriver-linux64/chromedriver')
     driver = webdriver.Chrome(service=service, options=chrome_options)
-
-    product_codes = ['0195949823763', '0195949806384', '0195949771774', '0195949773860','0195949722264',
-                     '0195949036064', '0195949042539', '0195949041631', '0195949040733', '0195949020735',
-                     '0195949049699']    
-    
+    enable_resource_blocking(driver, "leclerc")
+    url_cache = open_url_cache()
 
     try:
-        accept_condition(driver)
-        close_popup_if_present(driver)
+        establish_session(driver, "leclerc", URL, consent_flow, (By.ID, HTML_SELECTORS["accept_condition"]))
 
         for product_code in product_codes:
-            search_product(driver, product_code)
-
-            product_url = get_product_url(driver)
-            if product_url:
-                product_data = scrape_product(driver, product_url)
-                if product_data:
-                    more_offers = click_more_offers(driver)
-                    sellers_data, prices = [], []
-                    if more_offers:
-                        sellers_data = fetch_data_from_pages(driver, more_offers, 'sellers')
-                        prices = fetch_data_from_pages(driver, more_offers, 'prices')
-                        write_combined_data_to_csv(product_data, sellers_data, prices)
-                    else:
-                        print("non")
-            else:
+            product_data, more_offers, from_cache = resolve_product(driver, url_cache, product_code)
+            if not product_data or not more_offers:
                 print("non")
+                continue
+
+            offers = fetch_offers_from_page(driver, more_offers)
+            if from_cache and not is_cached_page_valid(driver, more_offers):
+                # Page déplacée ou supprimée : on refait la recherche
+                invalidate_url(url_cache, "leclerc", product_code)
+                product_data, more_offers, _ = resolve_product(driver, url_cache, product_code, use_cache=False)
+                offers = fetch_offers_from_page(driver, more_offers) if more_offers else []
+            snapshot_page("leclerc", product_code, driver.page_source)
+            if product_data:
+                write_combined_data_to_csv(product_data, offers, csv_file)
     finally:
+        for line in wait_stats_summary():
+            print(line)
+        url_cache.close()
         driver.quit()
 
 if __name__ == "__main__":
-    main()
+    # python scraping_leclerc.py [nb_workers] : au-delà de 1, la liste est répartie entre plusieurs processus
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    if workers > 1:
+        run_sharded(main, "leclerc", tracked_keys(PFID), CSV_FILE, workers)
+    else:
+        xvfb = start_xvfb(DISPLAY_NUMBER)
+        try:
+            main()
+        finally:
+            stop_xvfb(xvfb, DISPLAY_NUMBER)
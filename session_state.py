@@ -0,0 +1,172 @@
+"""
+État de session réutilisable (consentement cookies, pop-ups) pour les scrapers Selenium
+---------------------------------------------------------------------------------------
+
+Chaque exécution des scrapers Carrefour, Leclerc et Cdiscount commence par le parcours de consentement :
+chargement de la page d'accueil, attente du bouton d'acceptation (jusqu'à 15s), clic, puis pour Carrefour
+fermeture de la publicité et réponse à la question d'accueil.
+
+Ce module enregistre, après un parcours réussi, les cookies et le localStorage du site dans un fichier JSON
+par parcours (SESSION_DIR, un fichier par clé 'site' : deux scrapers d'un même site dont les parcours diffèrent
+utilisent des clés distinctes). Aux exécutions suivantes :
+- les cookies sont injectés dans le navigateur avant la première navigation (CDP Network.setCookies) et
+  le localStorage est restauré au chargement de la première page du site ;
+- la page d'accueil est chargée et l'absence du bandeau de consentement est vérifiée ;
+- si l'état est absent, expiré ou refusé par le site (bandeau à nouveau affiché), le parcours complet est rejoué
+  et l'état est réenregistré, après avoir retiré l'état restauré (cookies de tous les domaines, script localStorage).
+
+Le temps gagné au démarrage (durée du dernier parcours complet moins durée de la restauration) est journalisé.
+Utile notamment pour les workers de sharded_runner, qui démarrent chacun avec un profil Chrome vide.
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from selenium.webdriver.support.ui import WebDriverWait
+
+from browser_waits import wait_for_network_idle
+
+# CONSTANTS
+SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_state")
+SESSION_EXPIRY = timedelta(days=30)  # Au-delà, le parcours de consentement est rejoué
+BANNER_CHECK_TIMEOUT = 5  # Délai (s) laissé au bandeau de consentement pour apparaître après restauration
+
+# FUNCTIONS
+def session_file(site):
+    return os.path.join(SESSION_DIR, f"{site}.json")
+
+def save_session_state(driver, site, flow_duration):
+    """Enregistre les cookies et le localStorage de la page courante, avec la durée du parcours complet."""
+    try:
+        local_storage = driver.execute_script("return Object.assign({}, window.localStorage);")
+    except Exception as e:
+        logging.warning(f"localStorage illisible ({site}) : {e}")
+        local_storage = {}
+
+    state = {
+        "saved_at": datetime.now().isoformat(),
+        "origin": "{0.scheme}://{0.netloc}".format(urlparse(driver.current_url)),
+        "flow_duration": flow_duration,
+        "cookies": driver.get_cookies(),
+        "local_storage": local_storage,
+    }
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    # Fichier temporaire propre au processus : les workers de sharded_runner enregistrent le même site en parallèle
+    tmp_file = f"{session_file(site)}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, session_file(site))
+    logging.info(f"État de session enregistré pour {site} ({len(state['cookies'])} cookies, "
+                 f"{len(local_storage)} clés localStorage).")
+
+def load_session_state(site):
+    """Retourne l'état enregistré pour le site, ou None s'il est absent, illisible ou expiré."""
+    try:
+        with open(session_file(site), encoding="utf-8") as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"État de session illisible pour {site} : {e}")
+        return None
+
+    if datetime.now() - datetime.fromisoformat(state["saved_at"]) > SESSION_EXPIRY:
+        logging.info(f"État de session expiré pour {site}.")
+        return None
+    return state
+
+def discard_session_state(site):
+    if os.path.exists(session_file(site)):
+        os.remove(session_file(site))
+
+def to_cdp_cookie(cookie):
+    """Convertit un cookie au format Selenium (get_cookies) au format CDP (Network.setCookies)."""
+    cdp_cookie = {key: cookie[key] for key in ("name", "value", "domain", "path", "secure", "httpOnly") if key in cookie}
+    if "expiry" in cookie:
+        cdp_cookie["expires"] = cookie["expiry"]
+    if cookie.get("sameSite") in ("Strict", "Lax", "None"):
+        cdp_cookie["sameSite"] = cookie["sameSite"]
+    return cdp_cookie
+
+def restore_session_state(driver, state):
+    """
+    Injecte les cookies et le localStorage enregistrés avant la navigation vers le site.
+    Retourne l'identifiant du script de restauration du localStorage (pour clear_restored_state),
+    None si le navigateur ne permet pas l'injection (pas de CDP).
+    """
+    script = (
+        f"if (location.origin === {json.dumps(state['origin'])}) {{"
+        f"  const items = {json.dumps(state['local_storage'])};"
+        "  for (const key in items) { if (localStorage.getItem(key) === null) localStorage.setItem(key, items[key]); }"
+        "}"
+    )
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": [to_cdp_cookie(c) for c in state["cookies"]]})
+        result = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": script})
+    except Exception as e:
+        logging.warning(f"Restauration de l'état de session impossible : {e}")
+        return None
+    return result["identifier"]
+
+def clear_restored_state(driver, identifier):
+    """
+    Annule une restauration refusée par le site : retire le script de restauration du localStorage
+    (sinon réinjecté à chaque navigation) et efface les cookies de tous les domaines, pas seulement de la page courante.
+    """
+    try:
+        driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": identifier})
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+    except Exception as e:
+        logging.warning(f"Effacement de l'état de session restauré impossible : {e}")
+        driver.delete_all_cookies()
+    try:
+        driver.execute_script("window.localStorage.clear();")
+    except Exception as e:
+        logging.debug(f"localStorage non effacé : {e}")
+
+def is_banner_displayed(driver, banner_locator, timeout=BANNER_CHECK_TIMEOUT):
+    """Retourne True si le bandeau de consentement s'affiche : l'état restauré a été refusé par le site."""
+    wait_for_network_idle(driver, timeout)
+    try:
+        WebDriverWait(driver, 1).until(
+            lambda d: any(element.is_displayed() for element in d.find_elements(*banner_locator))
+        )
+        return True
+    except Exception:
+        return False
+
+def establish_session(driver, site, url, consent_flow, banner_locator):
+    """
+    Prépare le navigateur sur la page d'accueil du site, consentement accepté.
+    'consent_flow(driver)' est le parcours complet du scraper (accept_condition, close_ad...), rejoué uniquement
+    si l'état enregistré est absent ou refusé. 'banner_locator' identifie le bandeau de consentement.
+    Retourne True si l'état enregistré a été réutilisé.
+    """
+    start_time = time.perf_counter()
+    state = load_session_state(site)
+    identifier = restore_session_state(driver, state) if state else None
+    if identifier is not None:
+        driver.get(url)
+        if not is_banner_displayed(driver, banner_locator):
+            elapsed = time.perf_counter() - start_time
+            logging.info(f"État de session restauré pour {site} en {elapsed:.1f}s, "
+                         f"{state['flow_duration'] - elapsed:.1f}s gagnées sur le parcours de consentement.")
+            return True
+        logging.info(f"État de session refusé par {site}, parcours de consentement rejoué.")
+        discard_session_state(site)
+        clear_restored_state(driver, identifier)
+
+    flow_start = time.perf_counter()
+    consent_flow(driver)
+    flow_duration = time.perf_counter() - flow_start
+    logging.info(f"Parcours de consentement {site} effectué en {flow_duration:.1f}s.")
+    if any(element.is_displayed() for element in driver.find_elements(*banner_locator)):
+        logging.warning(f"Bandeau de consentement {site} toujours affiché, état de session non enregistré.")
+    else:
+        save_session_state(driver, site, flow_duration)
+    return False
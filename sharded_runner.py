@@ -0,0 +1,148 @@
+"""
+Exécution parallèle des scrapers Selenium par découpage de la liste de produits
+-------------------------------------------------------------------------------
+
+Les scrapers Leclerc et Carrefour parcourent leur liste de produits un par un dans un seul Chrome.
+Ce module répartit la liste sur plusieurs processus, chacun avec :
+- son propre écran virtuel Xvfb (ou Chrome en mode headless si HEADLESS est activé) ;
+- son propre répertoire de profil Chrome ;
+- son propre driver et son propre fichier CSV intermédiaire.
+
+À la fin, les CSV intermédiaires sont fusionnés dans le fichier de sortie du scraper, puis les écrans,
+fichiers de verrou X11 et profils temporaires sont nettoyés. Le nombre de processus est limité par site
+(SITE_CONCURRENCY) pour ne pas surcharger les sites ni déclencher leurs protections anti-bot.
+
+La fonction cible d'un scraper doit accepter : (liste de produits, répertoire de profil, fichier CSV, headless).
+"""
+
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+# CONSTANTS
+HEADLESS = False  # True : Chrome headless, sans Xvfb
+DISPLAY_BASE = 100  # Premier numéro d'écran virtuel essayé pour les workers
+SCREEN_GEOMETRY = "1920x1080x24"
+SITE_CONCURRENCY = {
+    "leclerc": 3,
+    "carrefour": 2,
+}
+DEFAULT_CONCURRENCY = 2
+
+# FUNCTIONS
+def lock_file(display_number):
+    return f"/tmp/.X{display_number}-lock"
+
+def socket_file(display_number):
+    return f"/tmp/.X11-unix/X{display_number}"
+
+def find_free_display(start):
+    display_number = start
+    while os.path.exists(lock_file(display_number)) or os.path.exists(socket_file(display_number)):
+        display_number += 1
+    return display_number
+
+def start_xvfb(display_number):
+    xvfb_process = subprocess.Popen(
+        ["Xvfb", f":{display_number}", "-screen", "0", SCREEN_GEOMETRY],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    # Attendre que le serveur X crée son socket avant de lancer Chrome
+    for _ in range(50):
+        if os.path.exists(socket_file(display_number)) or xvfb_process.poll() is not None:
+            break
+        time.sleep(0.1)
+    os.environ["DISPLAY"] = f":{display_number}"
+    return xvfb_process
+
+def stop_xvfb(xvfb_process, display_number):
+    xvfb_process.terminate()
+    try:
+        xvfb_process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        xvfb_process.kill()
+        xvfb_process.wait()
+    for path in (lock_file(display_number), socket_file(display_number)):
+        if os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"Impossible de supprimer {path} : {e}")
+
+def split_items(items, shards):
+    """Répartit les produits en 'shards' listes de tailles équilibrées (ordre entrelacé)."""
+    return [items[i::shards] for i in range(shards)]
+
+def run_worker(target, site, worker_index, items, display_number, csv_file, headless):
+    profile_dir = tempfile.mkdtemp(prefix=f"chrome_{site}_{worker_index}_")
+    xvfb_process = None if headless else start_xvfb(display_number)
+    start_time = time.time()
+    try:
+        target(items, profile_dir, csv_file, headless)
+    except Exception as e:
+        logging.error(f"Worker {worker_index} ({site}) : erreur {e}")
+        raise
+    finally:
+        if xvfb_process is not None:
+            stop_xvfb(xvfb_process, display_number)
+        shutil.rmtree(profile_dir, ignore_errors=True)
+        logging.info(f"Worker {worker_index} ({site}) : {len(items)} produits traités en {time.time() - start_time:.2f}s.")
+
+def merge_csv_files(shard_files, output_file):
+    """Concatène les CSV intermédiaires dans output_file en ne gardant qu'une ligne d'en-tête."""
+    write_header = not os.path.isfile(output_file)
+    merged = 0
+    with open(output_file, "a", newline="") as out:
+        for shard_file in shard_files:
+            if not os.path.isfile(shard_file):
+                continue
+            with open(shard_file, newline="") as f:
+                header = f.readline()
+                if write_header:
+                    out.write(header)
+                    write_header = False
+                shutil.copyfileobj(f, out)
+            os.remove(shard_file)
+            merged += 1
+    return merged
+
+def run_sharded(target, site, items, output_file, workers=None, headless=HEADLESS):
+    """
+    Lance 'target' sur 'items' découpés entre plusieurs processus, puis fusionne leurs CSV dans output_file.
+    Retourne le nombre de workers dont l'exécution a échoué.
+    """
+    cap = SITE_CONCURRENCY.get(site, DEFAULT_CONCURRENCY)
+    workers = max(1, min(workers or cap, cap, os.cpu_count() or 1, len(items)))
+    shards = split_items(list(items), workers)
+    logging.info(f"{len(items)} produits {site} répartis sur {workers} workers.")
+
+    processes, shard_files = [], []
+    display_number = DISPLAY_BASE
+    for worker_index, shard in enumerate(shards):
+        display_number = find_free_display(display_number)
+        shard_file = f"{output_file}.part{worker_index}"
+        shard_files.append(shard_file)
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(target, site, worker_index, shard, display_number, shard_file, headless),
+            name=f"{site}-worker-{worker_index}",
+        )
+        process.start()
+        processes.append(process)
+        display_number += 1
+
+    failures = 0
+    for process in processes:
+        process.join()
+        if process.exitcode != 0:
+            failures += 1
+            logging.error(f"{process.name} terminé avec le code {process.exitcode}.")
+
+    merged = merge_csv_files(shard_files, output_file)
+    logging.info(f"{merged} fichiers intermédiaires fusionnés dans {output_file}.")
+    return failures
@@ -0,0 +1,271 @@
+"""
+Stockage dédupliqué des pages HTML des scrapers navigateur
+----------------------------------------------------------
+
+LECLERC.py écrasait page_content.html à chaque URL et les autres scrapers ne gardaient aucune page :
+impossible de réanalyser hors ligne ou de déboguer un changement de structure après coup.
+Ce module conserve chaque page_source dans une base SQLite unique (STORE_FILE) :
+- chaque page est identifiée par l'empreinte SHA-256 de son contenu et n'est stockée qu'une fois ;
+- elle est compressée avec zstd et un dictionnaire entraîné par site sur ses premières pages
+  (les pages d'un même site partagent l'essentiel de leur balisage, le dictionnaire le factorise) ;
+- un index (site, produit, horodatage) -> empreinte permet de retrouver n'importe quelle page historique
+  en quelques millisecondes (une lecture indexée + une décompression).
+
+Sans le paquet zstandard, la compression se fait avec zlib et un dictionnaire prédéfini (zdict),
+construit à partir des mêmes pages d'entraînement. Chaque page stockée indique le codec et le dictionnaire utilisés.
+
+Utilisation en ligne de commande :
+    python snapshot_store.py stats
+    python snapshot_store.py show <site> <produit> [horodatage ISO] > page.html
+    python snapshot_store.py train <site>
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import zlib
+from datetime import datetime
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# CONSTANTS
+SNAPSHOTS_ENABLED = True
+STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots.sqlite")
+CODEC = "zstd" if zstandard else "zlib"
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+DICT_SIZE = 112 * 1024  # Taille du dictionnaire zstd
+ZLIB_DICT_SIZE = 32 * 1024  # zlib n'exploite que les 32 derniers Ko du dictionnaire
+DICT_TRAIN_SAMPLES = 20  # Pages nécessaires avant d'entraîner le dictionnaire d'un site
+
+# Dictionnaires chargés, par (site, dict_id)
+_DICTIONARIES = {}
+# Connexion par défaut du processus, pour snapshot_page()
+_STORE = None
+# Nombre de pages du site lors du dernier entraînement échoué : le suivant attend DICT_TRAIN_SAMPLES pages de plus
+_FAILED_TRAININGS = {}
+
+# FUNCTIONS
+def open_snapshot_store(path=STORE_FILE):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash TEXT PRIMARY KEY,
+            site TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            dict_id INTEGER NOT NULL,
+            raw_size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS dictionaries (
+            site TEXT NOT NULL,
+            dict_id INTEGER NOT NULL,
+            codec TEXT NOT NULL,
+            data BLOB NOT NULL,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (site, dict_id)
+        );
+        CREATE TABLE IF NOT EXISTS snapshots (
+            site TEXT NOT NULL,
+            product TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            hash TEXT NOT NULL,
+            PRIMARY KEY (site, product, timestamp)
+        );
+    """)
+    conn.commit()
+    return conn
+
+def get_dictionary(conn, site, dict_id):
+    """Retourne (codec, données) du dictionnaire, ou (None, None) pour dict_id 0 (pas de dictionnaire)."""
+    if dict_id == 0:
+        return None, None
+    key = (site, dict_id)
+    if key not in _DICTIONARIES:
+        row = conn.execute("SELECT codec, data FROM dictionaries WHERE site = ? AND dict_id = ?", key).fetchone()
+        if row is None:
+            raise KeyError(f"Dictionnaire {dict_id} introuvable pour {site}")
+        _DICTIONARIES[key] = (row[0], bytes(row[1]))
+    return _DICTIONARIES[key]
+
+def current_dictionary_id(conn, site):
+    """Dernier dictionnaire du site utilisable avec le codec courant (0 si aucun)."""
+    row = conn.execute("SELECT MAX(dict_id) FROM dictionaries WHERE site = ? AND codec = ?", (site, CODEC)).fetchone()
+    return row[0] or 0
+
+def compress(raw, codec, dictionary):
+    if codec == "zstd":
+        zdict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=zdict).compress(raw)
+    compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(ZLIB_LEVEL)
+    return compressor.compress(raw) + compressor.flush()
+
+def decompress(data, codec, dictionary):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Le paquet zstandard est nécessaire pour relire cette page.")
+        zdict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=zdict).decompress(data)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(data) + decompressor.flush()
+
+def read_blob(conn, content_hash):
+    row = conn.execute("SELECT site, codec, dict_id, data FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+    if row is None:
+        return None
+    site, codec, dict_id, data = row
+    _, dictionary = get_dictionary(conn, site, dict_id)
+    return decompress(bytes(data), codec, dictionary)
+
+def train_dictionary(conn, site, recompress=True):
+    """
+    Entraîne un dictionnaire pour le site à partir de ses pages déjà stockées,
+    puis recompresse avec lui les pages stockées sans dictionnaire. Retourne le nouveau dict_id (0 si impossible).
+    Le dict_id est attribué sous verrou d'écriture (BEGIN IMMEDIATE) : deux processus qui entraînent
+    en même temps obtiennent des dict_id distincts.
+    """
+    hashes = [row[0] for row in conn.execute(
+        "SELECT hash FROM blobs WHERE site = ? ORDER BY rowid DESC LIMIT ?", (site, DICT_TRAIN_SAMPLES * 5)
+    )]
+    samples = [read_blob(conn, content_hash) for content_hash in hashes]
+    if len(samples) < DICT_TRAIN_SAMPLES:
+        return 0
+
+    try:
+        if CODEC == "zstd":
+            dictionary = zstandard.train_dictionary(DICT_SIZE, samples).as_bytes()
+        else:
+            # Sans entraînement possible, le dictionnaire zlib est la fin des pages les plus récentes
+            dictionary = b"".join(reversed(samples))[-ZLIB_DICT_SIZE:]
+    except Exception as e:
+        logging.warning(f"Entraînement du dictionnaire impossible pour {site} : {e}")
+        return 0
+
+    conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT COALESCE(MAX(dict_id), 0) FROM dictionaries WHERE site = ?", (site,)).fetchone()
+        dict_id = row[0] + 1
+        conn.execute(
+            "INSERT INTO dictionaries (site, dict_id, codec, data, created_at) VALUES (?, ?, ?, ?, ?)",
+            (site, dict_id, CODEC, dictionary, datetime.now().isoformat())
+        )
+
+        if recompress:
+            for content_hash in [row[0] for row in conn.execute(
+                "SELECT hash FROM blobs WHERE site = ? AND dict_id = 0", (site,)
+            )]:
+                raw = read_blob(conn, content_hash)
+                conn.execute(
+                    "UPDATE blobs SET codec = ?, dict_id = ?, data = ? WHERE hash = ?",
+                    (CODEC, dict_id, compress(raw, CODEC, dictionary), content_hash)
+                )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    logging.info(f"Dictionnaire {CODEC} n°{dict_id} entraîné pour {site} sur {len(samples)} pages.")
+    return dict_id
+
+def save_snapshot(conn, site, product, html, timestamp=None):
+    """
+    Enregistre la page 'html' de (site, produit) à l'horodatage donné (maintenant par défaut).
+    Le contenu n'est compressé et stocké que s'il n'existe pas déjà. Retourne l'empreinte de la page.
+    """
+    raw = html.encode("utf-8")
+    content_hash = hashlib.sha256(raw).hexdigest()
+    timestamp = timestamp or datetime.now().isoformat(timespec="seconds")
+
+    if conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (content_hash,)).fetchone() is None:
+        dict_id = current_dictionary_id(conn, site)
+        _, dictionary = get_dictionary(conn, site, dict_id)
+        conn.execute(
+            "INSERT INTO blobs (hash, site, codec, dict_id, raw_size, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, site, CODEC, dict_id, len(raw), compress(raw, CODEC, dictionary))
+        )
+        conn.commit()
+        if dict_id == 0:
+            count = conn.execute("SELECT COUNT(*) FROM blobs WHERE site = ?", (site,)).fetchone()[0]
+            if count >= _FAILED_TRAININGS.get(site, 0) + DICT_TRAIN_SAMPLES and not train_dictionary(conn, site):
+                _FAILED_TRAININGS[site] = count
+
+    conn.execute(
+        "INSERT OR REPLACE INTO snapshots (site, product, timestamp, hash) VALUES (?, ?, ?, ?)",
+        (site, str(product), timestamp, content_hash)
+    )
+    conn.commit()
+    return content_hash
+
+def load_snapshot(conn, site, product, timestamp=None):
+    """Retourne le HTML de la dernière page de (site, produit) enregistrée à ou avant 'timestamp' (None si aucune)."""
+    row = conn.execute(
+        "SELECT hash FROM snapshots WHERE site = ? AND product = ? AND timestamp <= ? ORDER BY timestamp DESC LIMIT 1",
+        (site, str(product), timestamp or "9999")
+    ).fetchone()
+    if row is None:
+        return None
+    raw = read_blob(conn, row[0])
+    return raw.decode("utf-8") if raw is not None else None
+
+def list_snapshots(conn, site=None, product=None):
+    """Liste (site, produit, horodatage, empreinte) des pages enregistrées, les plus récentes en premier."""
+    query = "SELECT site, product, timestamp, hash FROM snapshots WHERE 1 = 1"
+    params = []
+    if site:
+        query += " AND site = ?"
+        params.append(site)
+    if product:
+        query += " AND product = ?"
+        params.append(str(product))
+    return conn.execute(query + " ORDER BY timestamp DESC", params).fetchall()
+
+def snapshot_page(site, product, html):
+    """
+    Enregistre une page dans le stockage par défaut du processus (ouvert au premier appel).
+    Ne lève jamais d'exception : un échec d'archivage ne doit pas interrompre le scraping.
+    """
+    global _STORE
+    if not SNAPSHOTS_ENABLED or not html:
+        return None
+    try:
+        if _STORE is None:
+            _STORE = open_snapshot_store()
+        return save_snapshot(_STORE, site, product, html)
+    except Exception as e:
+        logging.warning(f"Archivage de la page {site}/{product} impossible : {e}")
+        return None
+
+def store_stats(conn):
+    rows = conn.execute("""
+        SELECT b.site, COUNT(*), SUM(b.raw_size), SUM(LENGTH(b.data)),
+               (SELECT COUNT(*) FROM snapshots s WHERE s.site = b.site)
+        FROM blobs b GROUP BY b.site ORDER BY b.site
+    """).fetchall()
+    lines = []
+    for site, blobs, raw_size, stored_size, snapshots in rows:
+        lines.append(f"{site} : {snapshots} pages enregistrées, {blobs} uniques, "
+                     f"{raw_size / 1e6:.1f} Mo bruts -> {stored_size / 1e6:.2f} Mo stockés "
+                     f"(x{raw_size / max(stored_size, 1):.0f})")
+    return lines
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    store = open_snapshot_store()
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "show":
+        html = load_snapshot(store, sys.argv[2], sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+        if html is None:
+            sys.exit(f"Aucune page pour {sys.argv[2]}/{sys.argv[3]}")
+        sys.stdout.write(html)
+    elif command == "train":
+        train_dictionary(store, sys.argv[2])
+    else:
+        for line in store_stats(store):
+            print(line)
+    store.close()
@@ -0,0 +1,120 @@
+"""
+Cache de résolution EAN -> URL produit pour les scrapers à recherche
+-------------------------------------------------------------------
+
+Les scrapers Carrefour et Leclerc retrouvent chaque produit en tapant son EAN dans la barre de recherche
+puis en cliquant sur le premier résultat, à chaque exécution. Ce cache conserve, pour chaque couple (site, EAN),
+l'URL de la page produit, l'URL de la page des offres et le nom du produit, pour aller directement
+à la page des offres lors des exécutions suivantes.
+
+Fonctionnement :
+- Stockage SQLite (un seul fichier, accès concurrent sûr entre les workers de sharded_runner).
+- Une entrée plus ancienne que CACHE_EXPIRY est ignorée et la recherche est rejouée.
+- Après chargement d'une URL issue du cache, is_cached_page_valid() vérifie que la page n'a pas été redirigée
+  et qu'elle n'a pas répondu en erreur (404...) ; sinon l'entrée est invalidée et la recherche rejouée.
+- load_cached_product() enchaîne ces étapes pour une page produit, avec les fonctions de scraping et
+  de recherche propres au site.
+"""
+
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from browser_waits import RESPONSE_EVENTS, read_network_events
+
+# CONSTANTS
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "url_cache.sqlite")
+CACHE_EXPIRY = timedelta(days=7)
+
+# FUNCTIONS
+def open_url_cache(path=CACHE_FILE):
+    """Ouvre (et crée si besoin) la base du cache d'URLs."""
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS product_urls (
+            site TEXT NOT NULL,
+            ean TEXT NOT NULL,
+            product_url TEXT NOT NULL,
+            offers_url TEXT,
+            product_name TEXT,
+            resolved_at TEXT NOT NULL,
+            PRIMARY KEY (site, ean)
+        )
+    """)
+    conn.commit()
+    return conn
+
+def lookup_url(conn, site, ean):
+    """
+    Retourne l'entrée du cache (dict) pour (site, ean), ou None si elle est absente ou expirée.
+    """
+    row = conn.execute(
+        "SELECT product_url, offers_url, product_name, resolved_at FROM product_urls WHERE site = ? AND ean = ?",
+        (site, ean)
+    ).fetchone()
+    if row is None:
+        return None
+
+    product_url, offers_url, product_name, resolved_at = row
+    if datetime.now() - datetime.fromisoformat(resolved_at) > CACHE_EXPIRY:
+        logging.info(f"Entrée du cache expirée pour {site}/{ean}.")
+        return None
+    return {"product_url": product_url, "offers_url": offers_url, "product_name": product_name}
+
+def store_url(conn, site, ean, product_url, offers_url=None, product_name=None):
+    conn.execute(
+        "INSERT OR REPLACE INTO product_urls (site, ean, product_url, offers_url, product_name, resolved_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (site, ean, product_url, offers_url, product_name, datetime.now().isoformat())
+    )
+    conn.commit()
+
+def invalidate_url(conn, site, ean):
+    conn.execute("DELETE FROM product_urls WHERE site = ? AND ean = ?", (site, ean))
+    conn.commit()
+    logging.info(f"Entrée du cache invalidée pour {site}/{ean}.")
+
+def is_cached_page_valid(driver, expected_url):
+    """
+    Vérifie qu'une URL issue du cache a bien été chargée : pas de redirection vers une autre page,
+    et pas de statut HTTP d'erreur pour le document principal (lu dans les logs de performance, si disponibles).
+    """
+    if urlparse(driver.current_url).path.rstrip("/") != urlparse(expected_url).path.rstrip("/"):
+        logging.info(f"Redirection détectée : {expected_url} -> {driver.current_url}")
+        return False
+
+    read_network_events(driver)
+    expected_path = urlparse(expected_url).path.rstrip("/")
+    documents = [
+        params["response"] for params in RESPONSE_EVENTS.get(id(driver), [])
+        if params.get("type") == "Document"
+        and urlparse(params.get("response", {}).get("url", "")).path.rstrip("/") == expected_path
+    ]
+    if documents and documents[-1].get("status", 200) >= 400:
+        logging.info(f"Statut {documents[-1]['status']} pour {expected_url}.")
+        return False
+    return True
+
+def load_cached_product(driver, conn, site, ean, scrape_product, find_product_url):
+    """
+    Charge la page produit d'un EAN : directement depuis l'URL du cache si elle est encore valide,
+    sinon par la recherche sur le site (l'URL trouvée est alors mise en cache).
+    'scrape_product(driver, url)' retourne les données de la page (dict avec 'name') ou None,
+    'find_product_url(driver, ean)' recherche le produit sur le site et retourne l'URL de sa page.
+    """
+    cached = lookup_url(conn, site, ean)
+    if cached:
+        data = scrape_product(driver, cached["product_url"])
+        if data and is_cached_page_valid(driver, cached["product_url"]):
+            return data
+        invalidate_url(conn, site, ean)
+
+    product_url = find_product_url(driver, ean)
+    if not product_url:
+        return None
+    data = scrape_product(driver, product_url)
+    if data:
+        store_url(conn, site, ean, product_url, product_name=data["name"])
+    return data
@@ -0,0 +1,82 @@
+"""
+Comparaison des lectures complètes pandas et Polars
+---------------------------------------------------
+
+Lit les anciens CSV du dépôt (Carrefour, E.Leclerc, Rakuten) comme au démarrage d'un visualiseur (TailLoader.load()
+sur un fichier jamais lu), avec le nettoyage pandas puis avec la requête Polars de csv_cleaning, et affiche
+pour chaque fichier : le nombre de lignes retenues par chaque chemin, la somme des prix (les deux doivent être
+identiques) et la meilleure durée sur ROUNDS lectures.
+
+Les CSV du dépôt étant petits, chaque fichier est recopié REPEAT fois dans un fichier temporaire.
+Usage : python benchmark_backends.py [REPEAT]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from functools import partial
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from product_registry import get_registry
+from tail_loader import TailLoader
+from polars_backend import available, scanner
+from csv_cleaning import (
+    CARREFOUR_COLUMNS, LECLERC_COLUMNS, RAKUTEN_COLUMNS,
+    clean_carrefour, clean_carrefour_lazy, clean_leclerc, clean_leclerc_lazy, clean_rakuten, clean_rakuten_lazy,
+)
+
+# CONSTANTS
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+REPEAT = 20  # Copies de chaque CSV dans le fichier mesuré
+ROUNDS = 3  # Lectures par chemin, la meilleure durée est gardée
+
+# FUNCTIONS
+def sources():
+    """Nom -> (CSV, colonnes, nettoyage pandas, requête Polars, colonne du prix)."""
+    names = get_registry().names
+    return {
+        "carrefour": (os.path.join(ROOT, "scraping_carrefour.csv"), CARREFOUR_COLUMNS,
+                      clean_carrefour, clean_carrefour_lazy, "Price"),
+        "leclerc": (os.path.join(ROOT, "LECLERC", "product_details_bak.csv"), LECLERC_COLUMNS,
+                    clean_leclerc, clean_leclerc_lazy, "Price"),
+        "rakuten": (os.path.join(ROOT, "RAKUTEN", "Rakuten_data.csv"), RAKUTEN_COLUMNS,
+                    partial(clean_rakuten, names=names), partial(clean_rakuten_lazy, names=names), "price"),
+    }
+
+def timed_load(path, columns, clean, scan, rounds=ROUNDS):
+    """Meilleure durée d'une lecture complète, et les données lues."""
+    best = None
+    for _ in range(rounds):
+        loader = TailLoader(path, columns, clean, scan=scan)
+        start_time = time.perf_counter()
+        data = loader.load()
+        duration = time.perf_counter() - start_time
+        best = duration if best is None else min(best, duration)
+    return best, data
+
+def benchmark(repeat=REPEAT):
+    if not available():
+        print("Polars n'est pas installé : seul le chemin pandas est mesuré.")
+    for name, (path, columns, clean, clean_lazy, price_col) in sources().items():
+        with open(path, "rb") as f:
+            content = f.read()
+        if not content.endswith(b"\n"):
+            content += b"\n"
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as f:
+            f.write(content * repeat)
+            copy = f.name
+        try:
+            size_mb = os.path.getsize(copy) / 1e6
+            pandas_time, pandas_data = timed_load(copy, columns, clean, None)
+            print(f"{name} ({size_mb:.1f} Mo) - pandas : {len(pandas_data)} lignes, "
+                  f"prix {pandas_data[price_col].sum():.2f}, {pandas_time:.3f} s")
+            if available():
+                polars_time, polars_data = timed_load(copy, columns, clean, scanner(columns, clean_lazy))
+                print(f"{name} ({size_mb:.1f} Mo) - polars : {len(polars_data)} lignes, "
+                      f"prix {polars_data[price_col].sum():.2f}, {polars_time:.3f} s (x{pandas_time / polars_time:.1f})")
+        finally:
+            os.remove(copy)
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else REPEAT)
@@ -0,0 +1,119 @@
+"""
+Nettoyage des CSV suivis par les visualiseurs
+---------------------------------------------
+
+Pour chaque CSV (Carrefour, E.Leclerc, Rakuten) : les noms des colonnes, le nettoyage pandas appliqué aux lignes
+ajoutées (TailLoader) et le même nettoyage en requête Polars paresseuse, utilisée pour les lectures complètes
+quand Polars est installé (voir polars_backend).
+Les deux versions doivent rester équivalentes : benchmark_backends.py compare leurs résultats et leurs durées.
+rakuten_rows() met au même format les lots d'offres Rakuten reçus sur le bus (schéma commun d'offer_records).
+"""
+
+import os
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from offer_records import local_datetime
+from polars_backend import pl, parse_number, parse_price, parse_timestamp
+
+# CONSTANTS
+CARREFOUR_COLUMNS = ["Store", "Product", "Seller", "Delivery", "Price", "Rating", "Timestamp"]
+LECLERC_COLUMNS = [
+    "Platform", "Product", "Seller", "Price", "Delivery Fees", "Delivery Date", "Product State", "Seller Rating", "Timestamp"
+]
+RAKUTEN_COLUMNS = [
+    "pfid", "idsmartphone", "url", "timestamp", "price", "shipcost",
+    "rating", "ratingnb", "offertype", "offerdetails",
+    "shipcountry", "sellercountry", "seller"
+]
+
+CARREFOUR_TIMESTAMP_FORMAT = '%d/%m/%Y %H:%M:%S'
+LECLERC_TIMESTAMP_FORMAT = '%d/%m/%Y %H:%M:%S'
+RAKUTEN_TIMESTAMP_FORMAT = '%Y/%m/%d %H:%M'
+
+# FUNCTIONS
+def clean_price(price):
+    """Prix en euros ('1 053,00 €' -> 1053.0) ; NaN si le texte n'est pas un nombre."""
+    price = price.str.replace('€', '').str.replace(',', '.').str.strip()
+    return pd.to_numeric(price.where(price.str.fullmatch(r'\d*\.?\d*') & price.str.contains(r'\d')), errors='coerce')
+
+def clean_carrefour(data):
+    data = data.assign(Price=clean_price(data['Price']))
+    data = data[data['Price'].notnull() & (data['Rating'] != "Non spécifié")]
+    data = data.assign(
+        Rating=pd.to_numeric(data['Rating'], errors='coerce'),
+        Timestamp=pd.to_datetime(data['Timestamp'], format=CARREFOUR_TIMESTAMP_FORMAT, errors='coerce'),
+    )
+    return data[data['Timestamp'].notnull()]
+
+def clean_carrefour_lazy(frame):
+    frame = frame.with_columns(Price=parse_price('Price'))
+    frame = frame.filter(pl.col('Price').is_not_null() & pl.col('Rating').ne_missing("Non spécifié"))
+    frame = frame.with_columns(
+        Rating=parse_number('Rating'),
+        Timestamp=parse_timestamp('Timestamp', CARREFOUR_TIMESTAMP_FORMAT),
+    )
+    return frame.filter(pl.col('Timestamp').is_not_null())
+
+def clean_leclerc(data):
+    data = data.assign(Price=clean_price(data['Price']))
+    data = data[data['Price'].notnull()]
+    data = data.assign(
+        **{'Seller Rating': pd.to_numeric(data['Seller Rating'], errors='coerce')},
+        Timestamp=pd.to_datetime(data['Timestamp'], format=LECLERC_TIMESTAMP_FORMAT, errors='coerce'),
+    )
+    return data[data['Timestamp'].notnull()]
+
+def clean_leclerc_lazy(frame):
+    frame = frame.with_columns(Price=parse_price('Price')).filter(pl.col('Price').is_not_null())
+    frame = frame.with_columns(
+        parse_number('Seller Rating'),
+        Timestamp=parse_timestamp('Timestamp', LECLERC_TIMESTAMP_FORMAT),
+    )
+    return frame.filter(pl.col('Timestamp').is_not_null())
+
+def clean_rakuten(data, names):
+    """'names' : idsmartphone -> nom du modèle (registre produits), pour l'affichage."""
+    data = data.assign(price=clean_price(data['price']))
+    data = data[data['price'].notnull()]
+    data = data.assign(
+        # Handle missing values in 'shipcost'
+        shipcost=pd.to_numeric(data['shipcost'], errors='coerce').fillna(0),
+        # Convert 'rating' to numeric, fill missing with NaN
+        rating=pd.to_numeric(data['rating'], errors='coerce'),
+        # Convert 'timestamp' to datetime using the specified format
+        timestamp=pd.to_datetime(data['timestamp'], format=RAKUTEN_TIMESTAMP_FORMAT, errors='coerce'),
+    )
+    data = data[data['timestamp'].notnull()]
+    return data.assign(
+        # Fill missing seller names with "Unknown"
+        seller=data['seller'].fillna("Unknown"),
+        # Replace idsmartphone with the phone name from the product registry for visualization
+        idsmartphone=data['idsmartphone'].map(names).fillna(data['idsmartphone']),
+    )
+
+def clean_rakuten_lazy(frame, names):
+    frame = frame.with_columns(price=parse_price('price')).filter(pl.col('price').is_not_null())
+    frame = frame.with_columns(
+        shipcost=parse_number('shipcost').fill_null(0),
+        rating=parse_number('rating'),
+        timestamp=parse_timestamp('timestamp', RAKUTEN_TIMESTAMP_FORMAT),
+    )
+    return frame.filter(pl.col('timestamp').is_not_null()).with_columns(
+        seller=pl.col('seller').fill_null("Unknown"),
+        idsmartphone=pl.col('idsmartphone').replace(names),
+    )
+
+def rakuten_rows(offers, names):
+    """Offres au schéma commun (table Arrow : prix en centimes, horodatage epoch) -> lignes nettoyées Rakuten."""
+    data = offers.to_pandas()
+    data = data[(data['pfid'] == "RAK") & data['price'].notnull() & data['timestamp'].notnull()]
+    return data[RAKUTEN_COLUMNS].assign(
+        price=data['price'] / 100,
+        shipcost=(data['shipcost'] / 100).fillna(0),
+        timestamp=local_datetime(data['timestamp']),
+        seller=data['seller'].astype(object).fillna("Unknown"),
+        idsmartphone=data['idsmartphone'].map(names).fillna(data['idsmartphone']),
+    )
@@ -0,0 +1,69 @@
+"""
+Réduction des longues séries de prix avant affichage
+----------------------------------------------------
+
+Au-delà de quelques dizaines de milliers de points, les figures SVG (px.line, line_shape="spline") bloquent
+le navigateur. Avant de construire la figure :
+- chaque série (produit, vendeur ou plateforme) est réduite côté serveur à POINTS_PER_SERIES points avec
+  l'algorithme Largest-Triangle-Three-Buckets (LTTB), qui garde la forme de la courbe (pics et creux compris) ;
+- au-delà de WEBGL_THRESHOLD points au total, la figure est rendue en WebGL (Scattergl) plutôt qu'en SVG.
+Les séries plus courtes que POINTS_PER_SERIES sont gardées entières ; un zoom relit la plage à pleine résolution
+(voir rollups.FULL_RESOLUTION_SPAN).
+"""
+
+import numpy as np
+import pandas as pd
+
+# CONSTANTS
+FIGURE_WIDTH_PX = 1800  # Largeur d'affichage visée
+FACET_COLUMNS = 3  # facet_col_wrap des visualiseurs
+POINTS_PER_SERIES = FIGURE_WIDTH_PX // FACET_COLUMNS  # Environ un point par pixel de facette
+WEBGL_THRESHOLD = 5000  # Points au-delà desquels la figure passe en WebGL
+
+# FUNCTIONS
+def lttb_indices(x, y, n_out):
+    """
+    Indices des points gardés par Largest-Triangle-Three-Buckets : le premier et le dernier point, puis dans chaque
+    intervalle le point formant le plus grand triangle avec le point gardé précédent et la moyenne de l'intervalle
+    suivant. x et y sont des tableaux numpy de même longueur, x croissant.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 intervalles entre les deux extrémités
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas)) if len(areas) else start
+        kept[i + 1] = previous
+    return kept
+
+def downsample(frame, x, y, series_cols, n_out=POINTS_PER_SERIES):
+    """Réduit chaque série (groupes 'series_cols', triée par 'x') à n_out points avec LTTB."""
+    if frame.empty or frame.groupby(series_cols, observed=True).size().max() <= n_out:
+        return frame
+    frame = frame.sort_values(x, kind="stable")
+    kept = []
+    for _, series in frame.groupby(series_cols, observed=True, sort=False):
+        values = series[y].to_numpy(dtype=np.float64, na_value=np.nan)
+        valid = ~np.isnan(values)
+        series, values = series[valid], values[valid]
+        x_values = pd.to_datetime(series[x]).to_numpy().astype(np.int64) if not np.issubdtype(series[x].dtype, np.number) \
+            else series[x].to_numpy()
+        kept.append(series.index.to_numpy()[lttb_indices(x_values, values, n_out)])
+    return frame.loc[np.concatenate(kept)] if kept else frame.iloc[0:0]
+
+def render_mode(frame):
+    """'webgl' (Scattergl) pour les figures de plus de WEBGL_THRESHOLD points, 'svg' sinon."""
+    return "webgl" if len(frame) > WEBGL_THRESHOLD else "svg"
@@ -0,0 +1,63 @@
+"""
+Lecture des CSV des visualiseurs avec Polars (optionnel)
+--------------------------------------------------------
+
+Le nettoyage pandas (remplacements de chaînes enchaînés, filtres sur le DataFrame complet) s'exécute sur un seul
+cœur ; il reste le chemin utilisé pour les lignes ajoutées au fil de l'eau (TailLoader), qui sont peu nombreuses.
+Pour les lectures complètes (démarrage du visualiseur, fichier tronqué ou remplacé), le même nettoyage est exprimé
+en requête Polars paresseuse :
+- scan_csv() lit les lignes brutes, toutes les colonnes en texte ; une ligne trop longue est tronquée au lieu
+  d'être ignorée, les lignes d'en-tête et de séparation sont écartées par le filtre sur le prix ;
+- parse_price(), parse_timestamp() et parse_number() sont les équivalents vectorisés des conversions pandas ;
+- collect_arrow() exécute la requête en streaming, sur tous les cœurs, et retourne une table Arrow, convertie
+  en DataFrame pandas pour les agrégats (rollups) puis les figures Plotly.
+
+Si Polars n'est pas installé, available() retourne False et les visualiseurs gardent le chemin pandas.
+"""
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+# FUNCTIONS
+def available():
+    return pl is not None
+
+def scan_csv(source, columns):
+    """Requête paresseuse sur un CSV sans en-tête (chemin ou octets), toutes les colonnes en texte."""
+    return pl.scan_csv(
+        source, has_header=False, new_columns=columns, infer_schema=False,
+        truncate_ragged_lines=True, ignore_errors=True,
+    )
+
+def parse_price(column):
+    """Prix en euros ('1 053,00 €' -> 1053.0) ; null si le texte n'est pas un nombre."""
+    price = pl.col(column).str.replace_all("€", "", literal=True).str.replace_all(",", ".", literal=True).str.strip_chars()
+    return pl.when(price.str.contains(r"^\d*\.?\d*$") & price.str.contains(r"\d")).then(price).cast(pl.Float64, strict=False)
+
+def parse_number(column):
+    return pl.col(column).cast(pl.Float64, strict=False)
+
+def parse_timestamp(column, timestamp_format):
+    return pl.col(column).str.strptime(pl.Datetime("us"), timestamp_format, strict=False)
+
+def collect_arrow(query):
+    """Exécute la requête (moteur streaming, multi-thread) et retourne une table Arrow."""
+    return query.collect(engine="streaming").to_arrow()
+
+def collect_pandas(query):
+    return collect_arrow(query).to_pandas()
+
+def scanner(columns, clean_lazy):
+    """
+    Fonction de lecture complète pour TailLoader (paramètre 'scan') : octets des lignes complètes du fichier
+    -> DataFrame pandas nettoyé par la requête 'clean_lazy(LazyFrame)'. None si Polars n'est pas installé.
+    """
+    if not available():
+        return None
+
+    def scan(chunk):
+        return collect_pandas(clean_lazy(scan_csv(chunk, columns)))
+
+    return scan
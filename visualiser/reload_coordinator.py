@@ -0,0 +1,123 @@
+"""
+Coordination des rechargements déclenchés par watchdog
+------------------------------------------------------
+
+Les scrapers écrivent ligne par ligne : chaque ajout déclenchait un on_modified, et chaque on_modified rechargeait
+les données sur le thread de watchdog en réaffectant la variable globale 'data', pendant que les callbacks Dash
+pouvaient la lire.
+
+ReloadCoordinator :
+- notify() ne fait qu'enregistrer l'événement (appelé depuis on_modified, retour immédiat) ;
+- un thread dédié attend que les événements cessent pendant DEBOUNCE_SECONDS (sans dépasser MAX_DELAY_SECONDS
+  après le premier, pour qu'un flux continu d'ajouts ne retarde pas indéfiniment l'affichage), puis appelle
+  'reload' une seule fois pour toute la rafale ;
+- le résultat est publié avec un numéro de version par une seule affectation d'un tuple (version, données) :
+  current() retourne toujours un couple cohérent, jamais des données à moitié remplacées ;
+- metrics() donne le nombre d'événements, de rechargements, d'événements regroupés, d'erreurs et les durées.
+"""
+
+import logging
+import threading
+import time
+
+# CONSTANTS
+DEBOUNCE_SECONDS = 2.0  # Silence attendu après le dernier événement avant de recharger
+MAX_DELAY_SECONDS = 10.0  # Délai maximal entre le premier événement d'une rafale et le rechargement
+
+class ReloadCoordinator:
+    """Regroupe les notifications de modification et publie les données rechargées sous une référence versionnée."""
+
+    def __init__(self, reload, debounce=DEBOUNCE_SECONDS, max_delay=MAX_DELAY_SECONDS):
+        self.reload = reload
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._snapshot = (0, None)
+        self._pending = threading.Event()
+        self._lock = threading.Lock()
+        self._first_event = None
+        self._last_event = None
+        self._burst_events = 0
+        self._metrics = {
+            "events": 0, "reloads": 0, "coalesced_events": 0, "errors": 0,
+            "last_duration": None, "max_duration": 0.0, "total_duration": 0.0, "last_reload_at": None,
+        }
+        self._thread = threading.Thread(target=self._run, name="reload-coordinator", daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        """Signale une modification des données (appelé depuis le thread de watchdog)."""
+        now = time.monotonic()
+        with self._lock:
+            self._metrics["events"] += 1
+            self._burst_events += 1
+            if self._first_event is None:
+                self._first_event = now
+            self._last_event = now
+            self._pending.set()  # Sous le verrou : la rafale ne peut pas être prise entre l'enregistrement et le signal
+
+    def current(self):
+        """Dernière version publiée : (version, données)."""
+        return self._snapshot
+
+    @property
+    def version(self):
+        return self._snapshot[0]
+
+    def reload_now(self):
+        """Recharge immédiatement sur le thread appelant (chargement initial) et publie le résultat."""
+        start_time = time.perf_counter()
+        try:
+            data = self.reload()
+        except Exception as e:
+            with self._lock:
+                self._metrics["errors"] += 1
+            logging.error(f"Rechargement des données impossible : {e}")
+            return self._snapshot
+        duration = time.perf_counter() - start_time
+        with self._lock:
+            self._snapshot = (self._snapshot[0] + 1, data)
+            metrics = self._metrics
+            metrics["reloads"] += 1
+            metrics["last_duration"] = duration
+            metrics["max_duration"] = max(metrics["max_duration"], duration)
+            metrics["total_duration"] += duration
+            metrics["last_reload_at"] = time.time()
+        return self._snapshot
+
+    def _wait_for_quiet(self):
+        """Attend la fin de la rafale d'événements et retourne le nombre d'événements regroupés (0 si aucun)."""
+        while True:
+            with self._lock:
+                if self._last_event is None:
+                    self._pending.clear()
+                    return 0
+                now = time.monotonic()
+                quiet_for = now - self._last_event
+                waited = now - self._first_event
+                if quiet_for >= self.debounce or waited >= self.max_delay:
+                    events, self._burst_events = self._burst_events, 0
+                    self._first_event = self._last_event = None
+                    self._pending.clear()
+                    self._metrics["coalesced_events"] += events - 1
+                    return events
+            time.sleep(min(self.debounce - quiet_for, self.max_delay - waited))
+
+    def _run(self):
+        while True:
+            self._pending.wait()
+            try:
+                if self._wait_for_quiet():
+                    self.reload_now()
+            except Exception as e:
+                # Une erreur ne doit pas arrêter le thread : les rechargements suivants n'auraient plus lieu
+                with self._lock:
+                    self._metrics["errors"] += 1
+                logging.exception(f"Erreur du coordinateur de rechargement : {e}")
+
+    def metrics(self):
+        """Compteurs et durées (secondes) des rechargements, pour la route /metrics des visualiseurs."""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics["version"] = self.version
+        metrics["mean_duration"] = metrics["total_duration"] / metrics["reloads"] if metrics["reloads"] else None
+        return metrics
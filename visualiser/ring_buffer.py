@@ -0,0 +1,156 @@
+"""
+Fenêtre glissante des derniers relevés en mémoire
+-------------------------------------------------
+
+TailLoader ajoutait chaque nouveau lot au DataFrame complet : la mémoire des visualiseurs croissait avec
+l'historique, alors que la vue en direct n'a besoin que des derniers jours (relevés bruts des zooms courts,
+recalcul des intervalles touchés par les nouveaux lots).
+
+RingBuffer garde les relevés des LIVE_WINDOW derniers jours (par rapport au relevé le plus récent) dans des
+tableaux numpy par colonne, utilisés comme tampon circulaire :
+- horodatages (datetime64[ns]) et valeurs (float64) tels quels ; produits et vendeurs encodés en dictionnaire
+  (int32, un libellé par valeur distincte) ;
+- append() écrit à la suite des relevés existants ; les relevés sortis de la fenêtre sont évincés en avançant
+  l'indice de début (recherche dichotomique, sans copie) ; les tableaux ne sont agrandis (par doublement)
+  que si la fenêtre contient plus de relevés que leur capacité : la mémoire se stabilise avec la fenêtre ;
+- frame() copie la fenêtre dans un DataFrame (colonnes encodées en Categorical, sans recopier les libellés) :
+  un DataFrame publié ne change plus quand ses cases du tampon sont réécrites.
+Les lots sont supposés arriver dans l'ordre chronologique (ajouts en fin de CSV) : un relevé arrivé en retard
+n'est évincé qu'avec ceux écrits avant lui.
+Les plages antérieures à la fenêtre sont relues depuis le fichier (TailLoader.read_all).
+"""
+
+import numpy as np
+import pandas as pd
+
+# CONSTANTS
+LIVE_WINDOW = pd.Timedelta(days=7)  # Relevés gardés en mémoire pour la vue en direct
+INITIAL_CAPACITY = 1 << 16
+
+class RingBuffer:
+    """Relevés (horodatage, valeurs, catégories) des 'window' derniers jours, en tableaux numpy circulaires."""
+
+    def __init__(self, time_col, value_cols, category_cols, window=LIVE_WINDOW, capacity=INITIAL_CAPACITY):
+        self.time_col = time_col
+        self.value_cols = list(value_cols)
+        self.category_cols = list(category_cols)
+        self.window = pd.Timedelta(window)
+        self.labels = {column: [] for column in self.category_cols}
+        self._codes = {column: {} for column in self.category_cols}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self._times = np.empty(capacity, dtype="datetime64[ns]")
+        self._values = {column: np.empty(capacity, dtype=np.float64) for column in self.value_cols}
+        self._categories = {column: np.empty(capacity, dtype=np.int32) for column in self.category_cols}
+        self._head = 0
+        self._size = 0
+
+    @property
+    def capacity(self):
+        return len(self._times)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        arrays = [self._times, *self._values.values(), *self._categories.values()]
+        return sum(array.nbytes for array in arrays)
+
+    def clear(self):
+        self.labels = {column: [] for column in self.category_cols}
+        self._codes = {column: {} for column in self.category_cols}
+        self._allocate(INITIAL_CAPACITY)
+
+    def _positions(self, start, count):
+        """Indices dans les tableaux des relevés logiques start .. start + count - 1."""
+        return (self._head + start + np.arange(count)) % self.capacity
+
+    def _ordered(self, array):
+        """Copie du contenu logique d'un tableau, du plus ancien au plus récent (les cases seront réécrites)."""
+        end = self._head + self._size
+        if end <= self.capacity:
+            return array[self._head:end].copy()
+        return np.concatenate([array[self._head:], array[:end - self.capacity]])
+
+    @property
+    def oldest(self):
+        return pd.Timestamp(self._times[self._head]) if self._size else None
+
+    @property
+    def newest(self):
+        return pd.Timestamp(self._times[(self._head + self._size - 1) % self.capacity]) if self._size else None
+
+    def encode(self, column, values):
+        """Codes du dictionnaire de 'column' (-1 pour les valeurs manquantes), les nouvelles valeurs y sont ajoutées."""
+        codes, uniques = pd.factorize(values)
+        lookup = self._codes[column]
+        labels = self.labels[column]
+        for value in uniques:
+            if value not in lookup:
+                lookup[value] = len(labels)
+                labels.append(value)
+        mapping = np.array([lookup[value] for value in uniques] + [-1], dtype=np.int32)
+        return mapping[codes]  # code -1 de factorize -> dernier élément (-1)
+
+    def evict(self, cutoff):
+        """Évince les relevés antérieurs à 'cutoff' en avançant le début du tampon. Retourne leur nombre."""
+        if not self._size:
+            return 0
+        end = self._head + self._size
+        first = self._times[self._head:min(end, self.capacity)]
+        count = int(np.searchsorted(first, np.datetime64(cutoff, "ns"), side="left"))
+        if count == len(first) and end > self.capacity:
+            count += int(np.searchsorted(self._times[:end - self.capacity], np.datetime64(cutoff, "ns"), side="left"))
+        self._head = (self._head + count) % self.capacity
+        self._size -= count
+        return count
+
+    def append(self, frame):
+        """Ajoute les relevés de 'frame' et évince ceux sortis de la fenêtre."""
+        if frame.empty:
+            return
+        frame = frame.sort_values(self.time_col, kind="stable")
+        times = frame[self.time_col].to_numpy(dtype="datetime64[ns]")
+        newest = times[-1] if self.newest is None else max(times[-1], np.datetime64(self.newest, "ns"))
+        cutoff = pd.Timestamp(newest) - self.window
+        self.evict(cutoff)
+        keep = times >= np.datetime64(cutoff, "ns")  # Lot plus long que la fenêtre (relecture complète)
+        frame, times = frame[keep], times[keep]
+        count = len(frame)
+        if self._size + count > self.capacity:
+            self._grow(self._size + count)
+        positions = self._positions(self._size, count)
+        self._times[positions] = times
+        for column in self.value_cols:
+            self._values[column][positions] = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        for column in self.category_cols:
+            self._categories[column][positions] = self.encode(column, frame[column])
+        self._size += count
+
+    def _grow(self, needed):
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        times = self._ordered(self._times)
+        values = {column: self._ordered(array) for column, array in self._values.items()}
+        categories = {column: self._ordered(array) for column, array in self._categories.items()}
+        size = self._size
+        self._allocate(capacity)
+        self._times[:size] = times
+        for column, array in values.items():
+            self._values[column][:size] = array
+        for column, array in categories.items():
+            self._categories[column][:size] = array
+        self._size = size
+
+    def frame(self):
+        """DataFrame des relevés de la fenêtre, du plus ancien au plus récent."""
+        columns = {self.time_col: self._ordered(self._times)}
+        for column in self.value_cols:
+            columns[column] = self._ordered(self._values[column])
+        for column in self.category_cols:
+            columns[column] = pd.Categorical.from_codes(self._ordered(self._categories[column]),
+                                                        categories=pd.Index(self.labels[column], dtype=object))
+        return pd.DataFrame(columns)
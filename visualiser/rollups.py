@@ -0,0 +1,170 @@
+"""
+Agrégats de prix par intervalle de temps pour les visualiseurs
+--------------------------------------------------------------
+
+Les visualiseurs traçaient chaque relevé brut (arrondi à 30 min ou 3 min) : la construction de la figure
+et son rendu dans le navigateur ralentissaient avec l'historique.
+
+PriceRollups maintient, pour plusieurs granularités (GRANULARITIES : 3 min, 30 min, 1 h, 1 jour),
+le prix minimum, maximum, dernier et médian par (produit, vendeur, intervalle) :
+- update() reçoit les lignes nouvellement chargées (TailLoader) ; seuls les intervalles touchés par ces lignes
+  sont recalculés, à partir des relevés bruts de ces intervalles (la médiane n'est pas cumulable) ;
+- select_granularity() choisit l'intervalle le plus fin qui garde au plus MAX_BUCKETS points par courbe
+  sur la plage affichée, donc le plus grossier nécessaire : un zoom sur quelques heures affiche les agrégats
+  à 3 min, l'historique complet les agrégats journaliers ;
+- selected_range() lit la plage affichée dans le relayoutData du graphique Dash ;
+- un zoom sur moins de FULL_RESOLUTION_SPAN relit les relevés bruts de la plage (pleine résolution) ;
+- view() applique les filtres (produits, vendeurs) aux agrégats avant de les retourner, et 'version'
+  change à chaque mise à jour : (filtres, version) identifie une figure, qui peut être mise en cache.
+
+Avec une durée de conservation ('retention', ex : ring_buffer.LIVE_WINDOW), les granularités fines (toutes sauf
+la plus grossière) ne sont gardées que sur cette durée : la vue complète utilise alors les granularités qui couvrent
+tout l'historique, et une plage demandée plus ancienne est agrégée à partir des relevés relus par 'history()'.
+"""
+
+import threading
+
+import pandas as pd
+
+# CONSTANTS
+GRANULARITIES = ["3min", "30min", "1h", "1D"]
+MAX_BUCKETS = 300  # Points maximum par courbe sur la plage affichée
+AGGREGATES = ["min", "max", "last", "median"]
+FULL_RESOLUTION_SPAN = pd.Timedelta("12h")  # Plage zoomée en dessous de laquelle les relevés bruts sont affichés
+
+# FUNCTIONS
+def selected_range(relayout_data):
+    """Plage (début, fin) de l'axe des dates zoomée dans le graphique, None pour la plage complète."""
+    if not relayout_data:
+        return None
+    for key, value in relayout_data.items():
+        if key.startswith("xaxis") and key.endswith(".range[0]"):
+            end = relayout_data.get(key.replace("range[0]", "range[1]"))
+            return pd.Timestamp(value), pd.Timestamp(end)
+        if key.startswith("xaxis") and key.endswith(".range") and isinstance(value, list):
+            return pd.Timestamp(value[0]), pd.Timestamp(value[1])
+    return None
+
+def select_granularity(start, end, granularities=GRANULARITIES, max_buckets=MAX_BUCKETS):
+    """Granularité la plus fine donnant au plus 'max_buckets' intervalles entre start et end."""
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for granularity in granularities:
+        if span / pd.Timedelta(granularity) <= max_buckets:
+            return granularity
+    return granularities[-1]
+
+class PriceRollups:
+    """Agrégats min/max/dernier/médian du prix par (groupes, intervalle) à chaque granularité."""
+
+    def __init__(self, group_cols, time_col, value_col, granularities=GRANULARITIES, retention=None):
+        self.group_cols = list(group_cols)
+        self.time_col = time_col
+        self.value_col = value_col
+        self.granularities = list(granularities)
+        self.retention = pd.Timedelta(retention) if retention is not None else None
+        self.rollups = {granularity: self._empty() for granularity in self.granularities}
+        self.start = None
+        self.end = None
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def _empty(self):
+        return pd.DataFrame(columns=self.group_cols + ["bucket"] + AGGREGATES)
+
+    def aggregate(self, data, granularity):
+        """Agrège des relevés bruts à la granularité donnée."""
+        data = data.sort_values(self.time_col, kind="stable")
+        grouped = data.groupby(self.group_cols + [data[self.time_col].dt.floor(granularity).rename("bucket")],
+                               observed=True, sort=False)[self.value_col]
+        return grouped.agg(AGGREGATES).reset_index()
+
+    def update(self, new_rows, data):
+        """
+        Recalcule les intervalles touchés par 'new_rows' à partir des relevés bruts 'data' (qui les contient déjà).
+        Lors du premier appel (ou si new_rows est data), tout l'historique est agrégé.
+        """
+        if new_rows.empty:
+            return
+        with self._lock:
+            for granularity in self.granularities:
+                first_bucket = new_rows[self.time_col].min().floor(granularity)
+                rollup = self.rollups[granularity]
+                touched = data[data[self.time_col] >= first_bucket]
+                kept = rollup[rollup["bucket"] < first_bucket] if len(rollup) else rollup
+                fresh = self.aggregate(touched, granularity)
+                self.rollups[granularity] = pd.concat([kept, fresh], ignore_index=True) if len(kept) else fresh
+            new_start, new_end = new_rows[self.time_col].min(), new_rows[self.time_col].max()
+            self.start = new_start if self.start is None else min(self.start, new_start)
+            self.end = new_end if self.end is None else max(self.end, new_end)
+            if self.retention is not None:
+                for granularity in self.granularities[:-1]:
+                    rollup = self.rollups[granularity]
+                    self.rollups[granularity] = rollup[rollup["bucket"] >= self.retained_start().floor(granularity)]
+            self.version += 1
+
+    def reset(self):
+        with self._lock:
+            self.rollups = {granularity: self._empty() for granularity in self.granularities}
+            self.start = self.end = None
+            self.version += 1
+
+    def retained_start(self):
+        """Début de la période couverte par les granularités fines (None : tout l'historique)."""
+        if self.retention is None or self.end is None:
+            return None
+        return max(self.start, self.end - self.retention)
+
+    def values(self, column):
+        """Valeurs distinctes d'une colonne de groupe (options des filtres du tableau de bord)."""
+        rollup = self.rollups[self.granularities[-1]]
+        return sorted(rollup[column].dropna().unique()) if len(rollup) else []
+
+    def observations(self, data, time_range, filters=None):
+        """Relevés bruts de la plage, au format des agrégats (bucket = horodatage, min = max = dernier = médian = prix)."""
+        start, end = time_range
+        data = data[(data[self.time_col] >= start) & (data[self.time_col] <= end)]
+        for column, values in (filters or {}).items():
+            if values:
+                data = data[data[column].isin(values)]
+        prices = data[self.value_col]
+        return data[self.group_cols].assign(
+            bucket=data[self.time_col], **{aggregate: prices for aggregate in AGGREGATES}
+        ).sort_values("bucket", kind="stable")
+
+    def view(self, time_range=None, filters=None, data=None, history=None):
+        """
+        Agrégats de la plage (début, fin) demandée, ou de tout l'historique, à la granularité adaptée.
+        'filters' associe une colonne de groupe à la liste des valeurs à garder (liste vide ou None : pas de filtre).
+        Si les relevés bruts 'data' sont fournis et que la plage est plus courte que FULL_RESOLUTION_SPAN,
+        ils sont retournés à pleine résolution (granularité "raw").
+        'history()' retourne tous les relevés bruts : utilisé pour les plages antérieures aux relevés 'data'
+        ou aux granularités fines conservées.
+        Retourne (granularité, DataFrame trié par intervalle).
+        """
+        with self._lock:  # Agrégats et bornes d'une même mise à jour
+            rollups, bounds, retained_start = dict(self.rollups), (self.start, self.end), self.retained_start()
+        if bounds[0] is None:
+            return self.granularities[0], self._empty()
+        if data is not None and time_range and time_range[1] - time_range[0] <= FULL_RESOLUTION_SPAN:
+            if history is not None and (data.empty or time_range[0] < data[self.time_col].min()):
+                data = history()
+            return "raw", self.observations(data, time_range, filters)
+        start, end = time_range or bounds
+        granularity = select_granularity(start, end, self.granularities)
+        rollup = rollups[granularity]
+        if granularity != self.granularities[-1] and retained_start is not None and start < retained_start:
+            if time_range and history is not None:
+                # Plage plus ancienne que les granularités fines conservées : agrégée depuis les relevés relus
+                rows = history()
+                times = rows[self.time_col]
+                rollup = self.aggregate(rows[(times >= pd.Timestamp(start).floor(granularity)) & (times <= end)], granularity)
+            else:
+                # Historique complet : seule la granularité la plus grossière le couvre entièrement
+                granularity = self.granularities[-1]
+                rollup = rollups[granularity]
+        for column, values in (filters or {}).items():
+            if values:
+                rollup = rollup[rollup[column].isin(values)]
+        if time_range:
+            rollup = rollup[(rollup["bucket"] >= pd.Timestamp(start).floor(granularity)) & (rollup["bucket"] <= end)]
+        return granularity, rollup.sort_values("bucket", kind="stable")
@@ -0,0 +1,142 @@
+"""
+Chargement incrémental des CSV suivis par les visualiseurs
+----------------------------------------------------------
+
+À chaque modification du CSV, les visualiseurs relisaient le fichier entier (engine='python'), refiltraient
+chaque prix avec un apply ligne par ligne et réanalysaient tous les horodatages : le coût d'un rechargement
+croissait avec la taille du fichier.
+
+TailLoader mémorise la position (en octets) jusqu'où le fichier a été lu. À chaque appel de load() :
+- seules les lignes ajoutées depuis sont lues ; une ligne incomplète en fin de fichier (écriture en cours)
+  est gardée pour l'appel suivant ;
+- les lignes de séparation ('-----'), les lignes vides et les en-têtes répétés sont ignorés ;
+- les nouvelles lignes sont analysées avec le moteur C de pandas, nettoyées par la fonction 'clean'
+  du visualiseur (opérations vectorisées) puis ajoutées au DataFrame en mémoire.
+Si le fichier a été tronqué ou remplacé, il est relu depuis le début.
+
+Les 'listeners' (ex : rollups.PriceRollups) sont prévenus de chaque ajout par update(nouvelles lignes, données)
+et de chaque relecture complète par reset().
+
+Si une fonction 'scan' est fournie (ex : polars_backend.scanner), les lectures depuis le début du fichier lui
+passent directement les octets des lignes complètes ; elle retourne les lignes déjà nettoyées.
+
+append() ajoute des lignes déjà nettoyées reçues par un autre canal (bus des offres), avec les mêmes
+prévenances des listeners.
+
+Si un 'store' est fourni (ring_buffer.RingBuffer), seuls les relevés de sa fenêtre (derniers jours) sont gardés
+en mémoire : 'data' est la fenêtre, et read_all() relit le fichier pour les plages plus anciennes.
+"""
+
+import io
+import os
+import threading
+
+import pandas as pd
+
+# CONSTANTS
+HEADER_PATTERN = r"^(?:Platform|Nom du Vendeur|pfid),"
+SEPARATOR_PREFIX = "---"
+
+class TailLoader:
+    """
+    Lit un CSV par ajouts successifs. 'clean(frame)' reçoit les nouvelles lignes (colonnes 'columns', texte brut)
+    et retourne les lignes nettoyées à ajouter aux données.
+    """
+
+    def __init__(self, path, columns, clean, header_pattern=HEADER_PATTERN, listeners=(), scan=None, store=None):
+        self.path = path
+        self.columns = columns
+        self.clean = clean
+        self.scan = scan
+        self.store = store
+        self.header_pattern = header_pattern
+        self.listeners = list(listeners)
+        self.data = clean(pd.DataFrame(columns=columns, dtype=str))
+        self._offset = 0
+        self._file_id = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        self.data = self.clean(pd.DataFrame(columns=self.columns, dtype=str))
+        self._offset = 0
+        if self.store is not None:
+            self.store.clear()
+        for listener in self.listeners:
+            listener.reset()
+
+    def read_new_chunk(self):
+        """
+        Retourne les octets des lignes complètes ajoutées depuis la dernière lecture,
+        et True s'ils commencent au début du fichier.
+        """
+        stat = os.stat(self.path)
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._offset:
+            self._file_id = file_id
+            self.reset()
+        if stat.st_size == self._offset:
+            return b"", False
+
+        from_start = self._offset == 0
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            chunk = f.read(stat.st_size - self._offset)
+        end = chunk.rfind(b"\n") + 1  # La fin de fichier sans retour à la ligne peut être en cours d'écriture
+        self._offset += end
+        return chunk[:end], from_start
+
+    def split_lines(self, chunk):
+        """Lignes de données d'un bloc d'octets, en Series de texte."""
+        lines = pd.Series(chunk.decode("utf-8", errors="replace").splitlines(), dtype="string")
+        skipped = (
+            lines.str.strip().eq("")
+            | lines.str.startswith(SEPARATOR_PREFIX)
+            | lines.str.contains(self.header_pattern, regex=True)
+        )
+        return lines[~skipped]
+
+    def parse(self, chunk, from_start):
+        """Lignes nettoyées d'un bloc de lignes complètes."""
+        if from_start and self.scan is not None:
+            return self.scan(chunk)  # Lecture complète : requête multi-thread
+        lines = self.split_lines(chunk)
+        if lines.empty:
+            return self.clean(pd.DataFrame(columns=self.columns, dtype=str))
+        new_rows = pd.read_csv(
+            io.StringIO("\n".join(lines)), names=self.columns, header=None, dtype=str,
+            on_bad_lines="skip", skip_blank_lines=True,
+        )
+        return self.clean(new_rows)
+
+    def load(self):
+        """Ajoute aux données les lignes nouvelles du fichier et retourne le DataFrame complet (ou la fenêtre)."""
+        with self._lock:
+            chunk, from_start = self.read_new_chunk()
+            if not chunk:
+                return self.data
+            self._add(self.parse(chunk, from_start), from_start)
+            return self.data
+
+    def append(self, new_rows):
+        """Ajoute des lignes déjà nettoyées (au format de 'clean') et retourne le DataFrame complet (ou la fenêtre)."""
+        with self._lock:
+            self._add(new_rows, from_start=False)
+            return self.data
+
+    def _add(self, new_rows, from_start):
+        if new_rows.empty:
+            return
+        if self.store is not None:
+            self.store.append(new_rows)
+            self.data = self.store.frame()
+        else:
+            self.data = pd.concat([self.data, new_rows], ignore_index=True) if len(self.data) else new_rows
+        # Une relecture complète contient tout l'historique, la fenêtre seulement les derniers jours
+        for listener in self.listeners:
+            listener.update(new_rows, new_rows if from_start else self.data)
+
+    def read_all(self):
+        """Relit et nettoie le fichier entier, sans modifier les données en mémoire (plages hors de la fenêtre)."""
+        with open(self.path, "rb") as f:
+            chunk = f.read()
+        return self.parse(chunk[:chunk.rfind(b"\n") + 1], from_start=True)
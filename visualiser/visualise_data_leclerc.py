@@ -1,83 +1,141 @@
 import pandas as pd
 import plotly.express as px
-from dash import Dash, dcc, html
-from dash.dependencies import Input, Output
+from dash import Dash, ctx, dcc, html
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import threading
 import time
+from functools import lru_cache
+from flask import jsonify
+
+from tail_loader import TailLoader
+from rollups import PriceRollups, selected_range
+from ring_buffer import LIVE_WINDOW, RingBuffer
+from downsampling import downsample, render_mode
+from reload_coordinator import ReloadCoordinator
+from csv_cleaning import LECLERC_COLUMNS, clean_leclerc, clean_leclerc_lazy
+from polars_backend import scanner
 
 # Path to the CSV file
 csv_file = '/home/scraping/algo_scraping/LECLERC/product_details.csv'
 
-# Define column names for the CSV
-columns = [
-    "Platform", "Product", "Seller", "Price", "Delivery Fees", "Delivery Date", "Product State", "Seller Rating", "Timestamp"
-]
+FIGURE_CACHE_SIZE = 64  # Figures kept in memory
+LIVE_UPDATE_MS = 5000  # Interval at which browsers check for a new data version
+
+# Column names of the CSV
+columns = LECLERC_COLUMNS
+
+# Cleaning of newly read rows (pandas, vectorized) and of complete reads (Polars lazy query, when installed)
+clean_data = clean_leclerc
+
+# Incremental loader: only the lines appended to the CSV since the last load are parsed
+# Min/max/last/median price per (Product, Seller, bucket), updated with each appended batch
+# Only the last LIVE_WINDOW days of observations (and of the sub-daily rollups) stay in memory;
+# older ranges are read back from the CSV
+store = RingBuffer('Timestamp', ['Price'], ['Product', 'Seller'])
+rollups = PriceRollups(["Product", "Seller"], time_col='Timestamp', value_col='Price', retention=LIVE_WINDOW)
+loader = TailLoader(csv_file, columns, clean_data, listeners=[rollups], store=store, scan=scanner(columns, clean_leclerc_lazy))
 
-# Function to load and clean the data
 def load_and_clean_data():
-    data = pd.read_csv(csv_file, sep=",", names=columns, skiprows=1, engine='python', on_bad_lines='skip')
-    # Clean the data
-    data['Price'] = data['Price'].str.replace('€', '').str.replace(',', '.').str.strip()
-    data = data[data['Price'].notnull()]
-    data = data[data['Price'].apply(lambda x: x.replace('.', '', 1).isdigit())]
-    data['Price'] = data['Price'].astype(float)
-    data['Seller Rating'] = data['Seller Rating'].astype(float, errors='ignore')  # Convert Seller Rating to float
-    data['Timestamp'] = pd.to_datetime(data['Timestamp'], errors='coerce', dayfirst=True)
-    data = data[data['Timestamp'].notnull()]
-    data['Rounded_Timestamp'] = data['Timestamp'].dt.round('3min')
-    return data
+    return loader.load()
 
 # Initialize the Dash app
 app = Dash(__name__)
 
+# Reloads are debounced and run on the coordinator thread, which publishes (version, data) in one assignment
+reloader = ReloadCoordinator(load_and_clean_data)
+
 # Initial data load
-data = load_and_clean_data()
+reloader.reload_now()
+
+# Reload counts and durations, as JSON
+@app.server.route('/metrics')
+def metrics():
+    return jsonify(reloader.metrics())
 
 # Function to create the figure
-def create_figure(data):
+def create_figure(rollup, granularity):
+    # Long series: LTTB downsampling of each (Product, Seller) series, WebGL rendering above a few thousand points
+    rollup = downsample(rollup, 'bucket', 'median', ['Product', 'Seller'])
+    mode = render_mode(rollup)
     return px.line(
-        data,
-        x="Rounded_Timestamp",
-        y="Price",
+        rollup,
+        x="bucket",
+        y="median",
         color="Seller",
         line_group="Product",
         facet_col="Product",
         facet_col_wrap=3,
-        line_shape="spline",
-        title="Price Trends for Products Over Time",
+        line_shape="spline" if mode == "svg" else "linear",  # Scattergl has no spline
+        render_mode=mode,
+        hover_data=["min", "max", "last"],
+        title=f"Price Trends for Products Over Time ({granularity} median)",
         labels={
-            "Rounded_Timestamp": "Date",
-            "Price": "Price (€)",
+            "bucket": "Date",
+            "median": "Price (€)",
             "Seller": "Seller",
             "Product": "Product Name"
         },
         height=800
     )
 
-# Define the layout of the app
-app.layout = html.Div([
-    html.H1("Price Trends for Smartphones Over Time", style={'textAlign': 'center'}),
-    dcc.Graph(id='price-trends-graph')  # Dynamic graph
-])
+# Define the layout of the app (rebuilt on each page load, so the filter options follow the data)
+def serve_layout():
+    return html.Div([
+        html.H1("Price Trends for Smartphones Over Time", style={'textAlign': 'center'}),
+        html.Div([
+            dcc.Dropdown(id='product-filter', options=rollups.values('Product'), multi=True, placeholder="Products"),
+            dcc.Dropdown(id='seller-filter', options=rollups.values('Seller'), multi=True, placeholder="Sellers"),
+            dcc.DatePickerRange(id='date-filter', display_format='DD/MM/YYYY'),
+        ], style={'display': 'flex', 'gap': '10px'}),
+        dcc.Graph(id='price-trends-graph'),  # Dynamic graph
+        dcc.Interval(id='live-updates', interval=LIVE_UPDATE_MS),
+        dcc.Store(id='figure-version')  # Data version of the figure shown in the browser
+    ])
+
+app.layout = serve_layout
+
+# Figures cached by (filters, data version): a new data version never serves a stale figure
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def cached_figure(products, sellers, time_range, version):
+    # Filters are applied to the rollups before building the figure
+    # Zoomed ranges shorter than FULL_RESOLUTION_SPAN are drawn from the raw observations of the published version
+    data = reloader.current()[1]
+    granularity, rollup = rollups.view(time_range, {'Product': list(products), 'Seller': list(sellers)},
+                                       data=data, history=loader.read_all)
+    return create_figure(rollup, granularity)
 
-# Callback to update the graph when data changes
+# Callback to update the graph when the filters, the zoom or the data change
+# The interval only compares versions: a figure is sent to the browser when new data has been published
 @app.callback(
     Output('price-trends-graph', 'figure'),
-    Input('price-trends-graph', 'id')  # Dummy input to trigger updates
+    Output('figure-version', 'data'),
+    Input('product-filter', 'value'),
+    Input('seller-filter', 'value'),
+    Input('date-filter', 'start_date'),
+    Input('date-filter', 'end_date'),
+    Input('price-trends-graph', 'relayoutData'),  # Zoom / pan on the date axis
+    Input('live-updates', 'n_intervals'),
+    State('figure-version', 'data')
 )
-def update_graph(_):
-    global data
-    return create_figure(data)
+def update_graph(products, sellers, start_date, end_date, relayout_data, n_intervals, shown_version):
+    version = reloader.version
+    if ctx.triggered_id == 'live-updates' and version == shown_version:
+        raise PreventUpdate
+    # A zoom on the graph takes precedence over the date picker
+    time_range = selected_range(relayout_data)
+    if time_range is None and start_date and end_date:
+        time_range = (pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1))
+    return cached_figure(tuple(sorted(products or [])), tuple(sorted(sellers or [])), time_range, version), version
 
-# File watcher to reload data when the CSV file changes
+# File watcher notifying the reload coordinator when the CSV file changes
 class CSVFileHandler(FileSystemEventHandler):
     def on_modified(self, event):
-        global data
+        # Scrapers append row by row: the coordinator coalesces the burst into a single reload
         if event.src_path == csv_file:
-            print(f"File {csv_file} changed, reloading data...")
-            data = load_and_clean_data()
+            reloader.notify()
 
 # Start the file watcher in a separate thread
 def start_file_watcher():
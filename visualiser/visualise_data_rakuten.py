@@ -1,176 +1,189 @@
 import pandas as pd
 import plotly.express as px
-from dash import Dash, dcc, html
-from dash.dependencies import Input, Output
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from dash import Dash, ctx, dcc, html
+from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
+from functools import lru_cache, partial
+from flask import jsonify
+import os
+import queue
+import sys
 import threading
-import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from product_registry import get_registry
+from tail_loader import TailLoader
+from rollups import PriceRollups, selected_range
+from ring_buffer import LIVE_WINDOW, RingBuffer
+from downsampling import downsample, render_mode
+from reload_coordinator import ReloadCoordinator
+from offer_bus import BusSubscriber
+from csv_cleaning import RAKUTEN_COLUMNS, clean_rakuten, clean_rakuten_lazy, rakuten_rows
+from polars_backend import scanner
 
 # Path to the CSV file
 csv_file = '/home/scraping/algo_scraping/RAKUTEN/Rakuten_data.csv'
 
-# Chemin vers le fichier lien.csv
-smartphone_csv_file = '/home/scraping/algo_scraping/lien.csv'
+FIGURE_CACHE_SIZE = 64  # Figures kept in memory
+LIVE_UPDATE_MS = 5000  # Interval at which browsers check for a new data version
 
-# Define column names for the new CSV structure
-columns = [
-    "pfid", "idsmartphone", "url", "timestamp", "price", "shipcost", 
-    "rating", "ratingnb", "offertype", "offerdetails", 
-    "shipcountry", "sellercountry", "seller"
-]
+# Column names of the CSV
+columns = RAKUTEN_COLUMNS
 
-# Function to load and clean the data
-def load_and_clean_data():
-    try:
-        # Load the CSV file and let pandas infer column names
-        data = pd.read_csv(csv_file, sep=",", engine='python', on_bad_lines='skip')
-        
-        # Check if the file is empty
-        if data.empty:
-            print("The CSV file is empty.")
-            return pd.DataFrame(columns=columns)
-        
-        # Ensure the DataFrame has the expected columns
-        missing_columns = [col for col in columns if col not in data.columns]
-        if missing_columns:
-            print(f"Missing columns in the CSV file: {missing_columns}")
-            return pd.DataFrame(columns=columns)
-        
-        # Clean the data
-        data['price'] = data['price'].astype(str).str.replace('€', '').str.replace(',', '.').str.strip()
-        data = data[data['price'].notnull()]
-        data = data[data['price'].apply(lambda x: x.replace('.', '', 1).isdigit())]
-        data['price'] = data['price'].astype(float)
-        
-        # Handle missing values in 'shipcost'
-        data['shipcost'] = data['shipcost'].fillna(0).astype(float)
-        
-        # Convert 'rating' to numeric, fill missing with NaN
-        data['rating'] = pd.to_numeric(data['rating'], errors='coerce')
-        
-        # Convert 'timestamp' to datetime using the specified format
-        data['timestamp'] = pd.to_datetime(data['timestamp'], format='%Y/%m/%d %H:%M', errors='coerce')
-        data = data[data['timestamp'].notnull()]
-        
-        # Round timestamps to the nearest 30 minutes
-        data['Rounded_Timestamp'] = data['timestamp'].dt.round('30min')
-        
-        # Fill missing seller names with "Unknown"
-        data['seller'] = data['seller'].fillna("Unknown")
-        
-        # Merge with smartphone models to replace idsmartphone with Phone
-        smartphone_models = load_smartphone_models(smartphone_csv_file)
-        data = data.merge(smartphone_models, on='idsmartphone', how='left')
-        
-        # Replace idsmartphone with Phone for visualization
-        data['idsmartphone'] = data['Phone']
-        data.drop(columns=['Phone'], inplace=True)  # Remove the Phone column after replacement
-        
-        return data
-    except Exception as e:
-        print(f"Error loading and cleaning data: {e}")
-        return pd.DataFrame(columns=columns)
-
-def load_smartphone_models(csv_file_path):
-    """
-    Charge les modèles de smartphones depuis le fichier lien.csv.
-    
-    Args:
-        csv_file_path (str): Chemin vers le fichier lien.csv.
-    
-    Returns:
-        pd.DataFrame: DataFrame contenant les colonnes 'Phone' et 'idsmartphone'.
-    """
-    try:
-        # Charger le fichier CSV
-        data = pd.read_csv(csv_file_path)
-        
-        # Vérifier si les colonnes nécessaires sont présentes
-        required_columns = ['Phone', 'idsmartphone']
-        if not all(col in data.columns for col in required_columns):
-            print(f"Les colonnes nécessaires {required_columns} sont absentes du fichier.")
-            return pd.DataFrame(columns=required_columns)
-        
-        # Extraire les colonnes nécessaires
-        smartphone_models = data[['Phone', 'idsmartphone']].dropna()
-        print(f"{len(smartphone_models)} modèles de smartphones chargés depuis {csv_file_path}.")
-        return smartphone_models
-    
-    except Exception as e:
-        print(f"Erreur lors du chargement des modèles de smartphones : {e}")
-        return pd.DataFrame(columns=['Phone', 'idsmartphone'])
-
-# Charger les modèles de smartphones
-smartphone_models = load_smartphone_models(smartphone_csv_file)
-
-# Afficher les modèles chargés (pour vérification)
-print(smartphone_models.head())
+# Noms des smartphones (idsmartphone -> Phone) depuis le registre produits
+smartphone_names = get_registry().names
+print(f"{len(smartphone_names)} modèles de smartphones chargés depuis le registre produits.")
+
+# Cleaning of newly read rows (pandas, vectorized) and of complete reads (Polars lazy query, when installed)
+clean_data = partial(clean_rakuten, names=smartphone_names)
+clean_lazy = partial(clean_rakuten_lazy, names=smartphone_names)
+
+# History loader: the CSV is read once at startup, live offers then arrive on the offer bus
+# Min/max/last/median price per (idsmartphone, seller, bucket), updated with each batch
+# Only the last LIVE_WINDOW days of observations (and of the sub-daily rollups) stay in memory;
+# older ranges are read back from the CSV
+store = RingBuffer('timestamp', ['price'], ['idsmartphone', 'seller'])
+rollups = PriceRollups(["idsmartphone", "seller"], time_col='timestamp', value_col='price', retention=LIVE_WINDOW)
+loader = TailLoader(csv_file, columns, clean_data, listeners=[rollups], store=store, scan=scanner(columns, clean_lazy))
+
+# Offer batches received on the bus, applied by the coordinator thread
+pending_batches = queue.SimpleQueue()
+apply_lock = threading.Lock()  # The initial publication and the coordinator thread both apply batches
+reloader = None
+loaded_until = None  # Newest CSV timestamp at startup
+
+# Batches persisted between the subscription and the CSV read are in both: drop the rows already loaded
+def drop_loaded_rows(rows):
+    if loaded_until is None:
+        return rows
+    # The CSV keeps minute timestamps, the bus keeps seconds
+    minutes = rows['timestamp'].dt.floor('min')
+    overlap = (minutes <= loaded_until).to_numpy()
+    if not overlap.any():
+        return rows
+    keys = ['idsmartphone', 'seller', 'timestamp', 'price']
+    labels = {'idsmartphone': object, 'seller': object}
+    loaded = loader.data.loc[loader.data['timestamp'] >= minutes[overlap].min(), keys].astype(labels)
+    candidates = rows[keys].astype(labels).assign(timestamp=minutes)
+    already = candidates.merge(loaded.drop_duplicates(), how='left', indicator=True)['_merge'].eq('both').to_numpy()
+    return rows[~(overlap & already)]
+
+# Apply the batches received since the last update to the in-memory state
+def apply_offer_batches():
+    with apply_lock:
+        tables = []
+        while not pending_batches.empty():
+            tables.append(pending_batches.get())
+        if not tables:
+            return loader.data
+        rows = pd.concat([rakuten_rows(table, smartphone_names) for table in tables], ignore_index=True)
+        return loader.append(drop_loaded_rows(rows))
+
+# Called on the bus thread for each persisted offer batch; batches received before startup completes stay queued
+def on_offer_batch(table):
+    pending_batches.put(table)
+    if reloader is not None:
+        reloader.notify()
 
 # Initialize the Dash app
 app = Dash(__name__)
 
-# Initial data load
-data = load_and_clean_data()
+# Subscribe before reading the CSV, so that no batch persisted during the initial load is missed
+subscriber = BusSubscriber(on_offer_batch)
+
+# Initial data load (history from the CSV)
+loader.load()
+if not loader.data.empty:
+    loaded_until = loader.data['timestamp'].max()
+
+# Batches are coalesced and applied on the coordinator thread, which publishes (version, data) in one assignment;
+# the initial publication applies the batches queued during the load
+reloader = ReloadCoordinator(apply_offer_batches)
+reloader.reload_now()
+
+# Reload counts and durations, as JSON
+@app.server.route('/metrics')
+def metrics():
+    return jsonify(reloader.metrics())
 
 # Function to create the figure
-def create_figure(data):
+def create_figure(rollup, granularity):
+    # Long series: LTTB downsampling of each (idsmartphone, seller) series, WebGL rendering above a few thousand points
+    rollup = downsample(rollup, 'bucket', 'median', ['idsmartphone', 'seller'])
+    mode = render_mode(rollup)
     return px.line(
-        data,
-        x="Rounded_Timestamp",
-        y="price",
+        rollup,
+        x="bucket",
+        y="median",
         color="seller",
         line_group="idsmartphone",
         facet_col="idsmartphone",
         facet_col_wrap=3,
-        line_shape="spline",
-        title="Price Trends for Smartphones Over Time",
+        line_shape="spline" if mode == "svg" else "linear",  # Scattergl has no spline
+        render_mode=mode,
+        hover_data=["min", "max", "last"],
+        title=f"Price Trends for Smartphones Over Time ({granularity} median)",
         labels={
-            "Rounded_Timestamp": "Date",
-            "price": "Price (€)",
+            "bucket": "Date",
+            "median": "Price (€)",
             "seller": "Seller",
             "idsmartphone": "Smartphone ID"
         },
         height=800
     )
 
-# Define the layout of the app
-app.layout = html.Div([
-    html.H1("Price Trends for Smartphones Over Time", style={'textAlign': 'center'}),
-    dcc.Graph(id='price-trends-graph')  # Dynamic graph
-])
+# Define the layout of the app (rebuilt on each page load, so the filter options follow the data)
+def serve_layout():
+    return html.Div([
+        html.H1("Price Trends for Smartphones Over Time", style={'textAlign': 'center'}),
+        html.Div([
+            dcc.Dropdown(id='product-filter', options=rollups.values('idsmartphone'), multi=True, placeholder="Smartphones"),
+            dcc.Dropdown(id='seller-filter', options=rollups.values('seller'), multi=True, placeholder="Sellers"),
+            dcc.DatePickerRange(id='date-filter', display_format='DD/MM/YYYY'),
+        ], style={'display': 'flex', 'gap': '10px'}),
+        dcc.Graph(id='price-trends-graph'),  # Dynamic graph
+        dcc.Interval(id='live-updates', interval=LIVE_UPDATE_MS),
+        dcc.Store(id='figure-version')  # Data version of the figure shown in the browser
+    ])
 
-# Callback to update the graph when data changes
+app.layout = serve_layout
+
+# Figures cached by (filters, data version): a new data version never serves a stale figure
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def cached_figure(products, sellers, time_range, version):
+    # Filters are applied to the rollups before building the figure
+    # Zoomed ranges shorter than FULL_RESOLUTION_SPAN are drawn from the raw observations of the published version
+    data = reloader.current()[1]
+    granularity, rollup = rollups.view(time_range, {'idsmartphone': list(products), 'seller': list(sellers)},
+                                       data=data, history=loader.read_all)
+    return create_figure(rollup, granularity)
+
+# Callback to update the graph when the filters, the zoom or the data change
+# The interval only compares versions: a figure is sent to the browser when new data has been published
 @app.callback(
     Output('price-trends-graph', 'figure'),
-    Input('price-trends-graph', 'id')  # Dummy input to trigger updates
+    Output('figure-version', 'data'),
+    Input('product-filter', 'value'),
+    Input('seller-filter', 'value'),
+    Input('date-filter', 'start_date'),
+    Input('date-filter', 'end_date'),
+    Input('price-trends-graph', 'relayoutData'),  # Zoom / pan on the date axis
+    Input('live-updates', 'n_intervals'),
+    State('figure-version', 'data')
 )
-def update_graph(_):
-    global data
-    return create_figure(data)
-
-# File watcher to reload data when the CSV file changes
-class CSVFileHandler(FileSystemEventHandler):
-    def on_modified(self, event):
-        global data
-        if event.src_path == csv_file:
-            print(f"File {csv_file} changed, reloading data...")
-            data = load_and_clean_data()
-
-# Start the file watcher in a separate thread
-def start_file_watcher():
-    event_handler = CSVFileHandler()
-    observer = Observer()
-    observer.schedule(event_handler, path=csv_file, recursive=False)
-    observer.start()
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+def update_graph(products, sellers, start_date, end_date, relayout_data, n_intervals, shown_version):
+    version = reloader.version
+    if ctx.triggered_id == 'live-updates' and version == shown_version:
+        raise PreventUpdate
+    # A zoom on the graph takes precedence over the date picker
+    time_range = selected_range(relayout_data)
+    if time_range is None and start_date and end_date:
+        time_range = (pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1))
+    return cached_figure(tuple(sorted(products or [])), tuple(sorted(sellers or [])), time_range, version), version
 
-# Run the app and file watcher
+# Run the app; new offers arrive on the bus, without watching the CSV
 if __name__ == '__main__':
-    threading.Thread(target=start_file_watcher, daemon=True).start()
-    app.run(debug=True, host='157.159.195.72', port=8052)
+    try:
+        app.run(debug=True, host='157.159.195.72', port=8052)
+    finally:
+        subscriber.close()
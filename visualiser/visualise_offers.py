@@ -0,0 +1,162 @@
+import pandas as pd
+import plotly.express as px
+from dash import Dash, dcc, html
+from dash.dependencies import Input, Output
+from functools import lru_cache
+import glob
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from offer_records import OFFERS_DATASET, LEGACY_OFFER_FILES, local_datetime, scan_offers
+from offer_snapshot import SnapshotReader
+from product_registry import get_registry
+from rollups import FULL_RESOLUTION_SPAN, select_granularity, selected_range
+from downsampling import downsample, render_mode
+
+# Single dashboard for every platform: the common offers dataset (partitioned by pfid) and the former
+# per-platform Parquet files are read as one source. Each view only reads the columns it plots, and its
+# platform / product / seller / date filters are applied while reading (partition pruning, row-group statistics).
+# When the scrapers publish the shared Arrow snapshot (offer_snapshot), it is memory-mapped instead: every worker
+# reads the same page-cache copy, and switches to a new version as soon as it is published.
+
+FIGURE_CACHE_SIZE = 64  # Figures kept in memory
+
+PLATFORMS = {
+    "AMAZ": "Amazon",
+    "FNAC": "FNAC",
+    "RAK": "Rakuten",
+    "LECL": "E.Leclerc",
+    "CARR": "Carrefour",
+    "DART": "Darty",
+    "CDIS": "Cdiscount",
+}
+
+# Columns read for the price comparison view
+VIEW_COLUMNS = ["pfid", "idsmartphone", "timestamp", "price"]
+
+smartphone_names = get_registry().names
+
+snapshot = SnapshotReader()
+
+# Version of the data: the published snapshot version, or the dataset files when no snapshot is published
+def dataset_version():
+    version = snapshot.version
+    if version is not None:
+        return version
+    paths = glob.glob(os.path.join(OFFERS_DATASET, "pfid=*")) + [path for path, _ in LEGACY_OFFER_FILES.values()]
+    return tuple(os.stat(path).st_mtime_ns for path in paths if os.path.exists(path))
+
+# Offers for the selected filters, from the memory-mapped snapshot or from the Parquet files
+def load_offers(columns, **filters):
+    table = snapshot.scan(columns, **filters)
+    return table if table is not None else scan_offers(columns, **filters)
+
+# Best price per (product, platform, bucket) for the selected filters
+def load_best_prices(platforms, products, sellers, start, end):
+    table = load_offers(VIEW_COLUMNS, pfids=platforms, idsmartphones=products, sellers=sellers, start=start, end=end)
+    data = table.to_pandas()
+    data = data[data['price'].notnull() & data['timestamp'].notnull()]
+    if data.empty:
+        return data, None
+    data['timestamp'] = local_datetime(data['timestamp'])  # Converted once per scraping run and product
+    if start and end and end - start <= FULL_RESOLUTION_SPAN:
+        # Zoomed in: one point per scraping run instead of time buckets
+        granularity = "raw"
+        data['bucket'] = data['timestamp']
+    else:
+        granularity = select_granularity(start or data['timestamp'].min(), end or data['timestamp'].max())
+        data['bucket'] = data['timestamp'].dt.floor(granularity)
+    best = data.groupby(['idsmartphone', 'pfid', 'bucket'], observed=True)['price'].agg(['min', 'median', 'size'])
+    best = best.reset_index().rename(columns={'size': 'offers'})
+    best[['min', 'median']] = best[['min', 'median']] / 100
+    best['platform'] = best['pfid'].map(PLATFORMS).fillna(best['pfid'])
+    best['product'] = best['idsmartphone'].map(smartphone_names).fillna(best['idsmartphone'])
+    return best.sort_values('bucket', kind='stable'), granularity
+
+# Function to create the figure
+def create_figure(best, granularity):
+    if granularity is None:
+        return px.line(title="No offers for the selected filters")
+    # Long series: LTTB downsampling of each (product, platform) series, WebGL rendering above a few thousand points
+    best = downsample(best, 'bucket', 'min', ['product', 'platform'])
+    mode = render_mode(best)
+    return px.line(
+        best,
+        x="bucket",
+        y="min",
+        color="platform",
+        facet_col="product",
+        facet_col_wrap=3,
+        render_mode=mode,
+        hover_data=["median", "offers"],
+        title=f"Best price per platform ({granularity} buckets)",
+        labels={"bucket": "Date", "min": "Best price (€)", "platform": "Platform", "product": "Smartphone"},
+        height=800
+    )
+
+# Initialize the Dash app
+app = Dash(__name__)
+server = app.server  # WSGI entry point for several workers: gunicorn visualise_offers:server
+
+# Define the layout of the app
+app.layout = html.Div([
+    html.H1("Smartphone prices across platforms", style={'textAlign': 'center'}),
+    html.Div([
+        dcc.Checklist(id='platform-filter', options=[{'label': label, 'value': pfid} for pfid, label in PLATFORMS.items()],
+                      value=list(PLATFORMS), inline=True),
+        dcc.Dropdown(id='product-filter', multi=True, placeholder="Smartphones",
+                     options=[{'label': name, 'value': idsmartphone} for idsmartphone, name in smartphone_names.items()]),
+        dcc.Dropdown(id='seller-filter', multi=True, placeholder="Sellers"),
+        dcc.DatePickerRange(id='date-filter', display_format='DD/MM/YYYY'),
+    ], style={'display': 'flex', 'gap': '10px', 'flexWrap': 'wrap'}),
+    dcc.Graph(id='price-comparison-graph')
+])
+
+# Sellers of the selected platforms and products (only the seller column is read)
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def cached_sellers(platforms, products, version):
+    table = load_offers(["seller"], pfids=list(platforms), idsmartphones=list(products))
+    return sorted(seller for seller in table['seller'].unique().to_pylist() if seller)
+
+@app.callback(
+    Output('seller-filter', 'options'),
+    Input('platform-filter', 'value'),
+    Input('product-filter', 'value')
+)
+def update_sellers(platforms, products):
+    if not products:
+        return []
+    return cached_sellers(tuple(sorted(platforms or [])), tuple(sorted(products)), dataset_version())
+
+# Figures cached by (filters, data version)
+@lru_cache(maxsize=FIGURE_CACHE_SIZE)
+def cached_figure(platforms, products, sellers, start, end, version):
+    best, granularity = load_best_prices(list(platforms), list(products), list(sellers), start, end)
+    return create_figure(best, granularity)
+
+# Callback to update the graph when the filters or the zoom change
+@app.callback(
+    Output('price-comparison-graph', 'figure'),
+    Input('platform-filter', 'value'),
+    Input('product-filter', 'value'),
+    Input('seller-filter', 'value'),
+    Input('date-filter', 'start_date'),
+    Input('date-filter', 'end_date'),
+    Input('price-comparison-graph', 'relayoutData')  # Zoom / pan on the date axis
+)
+def update_graph(platforms, products, sellers, start_date, end_date, relayout_data):
+    # Nothing is read until a product is selected: a view never loads the whole history
+    if not products or not platforms:
+        return px.line(title="Select at least one platform and one smartphone")
+    # A zoom on the graph takes precedence over the date picker
+    time_range = selected_range(relayout_data)
+    if time_range is None and start_date and end_date:
+        time_range = (pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(days=1))
+    start, end = (time_range[0].to_pydatetime(), time_range[1].to_pydatetime()) if time_range else (None, None)
+    return cached_figure(tuple(sorted(platforms)), tuple(sorted(products)), tuple(sorted(sellers or [])),
+                         start, end, dataset_version())
+
+# Run the app
+if __name__ == '__main__':
+    app.run(debug=True, host='157.159.195.72', port=8053)